@@ -0,0 +1,99 @@
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+
+from model import layer_util
+from model.graph_operators import GraphOperators, load_transformation_matrices
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Benchmarks the fused and the dense Chebyshev expansion against the concat based one")
+parser.add_argument("--computed-dir", default="computed",
+                    help="The directory holding the precomputed adjecency matrices (default is computed)")
+parser.add_argument("--batch-size", type=int, default=16, help="The batch size to be used (default is 16)")
+parser.add_argument("--num-features", type=int, default=16, help="The number of input features (default is 16)")
+parser.add_argument("--K", type=int, default=6, help="The polynomial order (default is 6)")
+parser.add_argument("--repetitions", type=int, default=50, help="The number of timed repetitions (default is 50)")
+
+
+def concat_expansion(L, x0, K):
+    """
+    The Chebyshev expansion as formerly done by cheb_conv, growing the stack by concatenation.
+    """
+    x = tf.expand_dims(x0, 0)
+    if K > 1:
+        x1 = tf.sparse.sparse_dense_matmul(L, x0)
+        x = tf.concat([x, tf.expand_dims(x1, 0)], axis=0)
+    for k in range(2, K):
+        x2 = 2 * tf.sparse.sparse_dense_matmul(L, x1) - x0
+        x = tf.concat([x, tf.expand_dims(x2, 0)], axis=0)
+        x0, x1 = x1, x2
+    return x
+
+
+def time_function(function, repetitions):
+    function()
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings)
+
+
+def benchmark_level(laplacian, num_columns, K, repetitions):
+    L = laplacian.L
+    x = tf.random.normal([laplacian.num_vertices, num_columns])
+    upstream = tf.random.normal([K, laplacian.num_vertices, num_columns])
+
+    def forward_backward(expansion):
+        @tf.function
+        def step():
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                y = expansion(x)
+                loss = tf.reduce_sum(y * upstream)
+            return y, tape.gradient(loss, x)
+
+        return step
+
+    reference_step = forward_backward(lambda x: concat_expansion(L, x, K))
+    fused_step = forward_backward(lambda x: layer_util.chebyshev_expansion(L, x, K, csr=laplacian.csr))
+    dense_step = forward_backward(
+        lambda x: layer_util.dense_chebyshev_expansion(laplacian.chebyshev_polynomials(K), x, K))
+
+    reference_y, reference_dx = reference_step()
+    errors = []
+    for step in [fused_step, dense_step]:
+        y, dx = step()
+        forward_error = np.max(np.abs(reference_y.numpy() - y.numpy()))
+        backward_error = np.max(np.abs(reference_dx.numpy() - dx.numpy())) / np.max(np.abs(reference_dx.numpy()))
+        errors.append((forward_error, backward_error))
+
+    timings = [time_function(lambda: step()[1].numpy(), repetitions)
+               for step in [reference_step, fused_step, dense_step]]
+    return errors, timings
+
+
+def main():
+    args = parser.parse_args()
+    operators = GraphOperators(*load_transformation_matrices(args.computed_dir))
+
+    num_columns = args.num_features * args.batch_size
+    date_print("K=" + str(args.K) + ", columns (features * batch size)=" + str(num_columns))
+    for laplacian in operators.laplacians:
+        errors, timings = benchmark_level(laplacian, num_columns, args.K, args.repetitions)
+        reference_time, fused_time, dense_time = timings
+        date_print("Vertices: " + str(laplacian.num_vertices).rjust(5) +
+                   " -- concat: " + "{:.3f}".format(1000 * reference_time) + "ms" +
+                   " -- fused: " + "{:.3f}".format(1000 * fused_time) + "ms" +
+                   " -- dense: " + "{:.3f}".format(1000 * dense_time) + "ms" +
+                   " -- fused speedup: " + "{:.2f}".format(reference_time / fused_time) + "x" +
+                   " -- dense speedup: " + "{:.2f}".format(reference_time / dense_time) + "x")
+        for name, (forward_error, backward_error) in zip(["fused", "dense"], errors):
+            date_print("    " + name + " max forward error: " + "{:.2e}".format(forward_error) +
+                       " -- max relative backward error: " + "{:.2e}".format(backward_error))
+
+
+if __name__ == '__main__':
+    main()
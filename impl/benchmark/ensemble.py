@@ -0,0 +1,53 @@
+import argparse
+import tensorflow as tf
+
+from model.ensemble import coma_ensemble, ensemble_loss
+from model.graph_operators import GraphOperators, load_transformation_matrices
+from benchmark.chebyshev import time_function
+from benchmark.layout import build_model, train_step_for, num_features, polynom_orders
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Compares training M separate models against a coma_ensemble of M "
+                                             "replicas")
+parser.add_argument("--computed-dir", default="computed",
+                    help="The directory holding the precomputed transformation matrices (default is computed)")
+parser.add_argument("--batch-size", type=int, default=16, help="The batch size to be used (default is 16)")
+parser.add_argument("--num-replicas", default="1,2,4,8",
+                    help="Comma separated list of the numbers of replicas to compare (default is 1,2,4,8)")
+parser.add_argument("--repetitions", type=int, default=20, help="The number of timed repetitions (default is 20)")
+
+
+def main():
+    args = parser.parse_args()
+    operators = GraphOperators(*load_transformation_matrices(args.computed_dir))
+    x = tf.random.normal([args.batch_size, operators.num_vertices[0], 3])
+    model = build_model(operators, vertex_major=False)
+    model(x)
+    separate_step = train_step_for(model, x)
+    separate_step()
+    single_time = time_function(lambda: separate_step()[0].numpy(), args.repetitions)
+
+    for num_replicas in [int(m) for m in args.num_replicas.split(",")]:
+        ensemble = coma_ensemble(num_replicas=num_replicas, num_input_features=3, num_features=num_features,
+                                 operators=operators, Ks=polynom_orders, num_latent=8, regularization=5e-4)
+        x_ensemble = tf.random.normal([args.batch_size, num_replicas, operators.num_vertices[0], 3])
+        ensemble(x_ensemble)
+
+        @tf.function
+        def ensemble_step():
+            with tf.GradientTape() as tape:
+                loss = tf.reduce_mean(ensemble_loss(x_ensemble, ensemble(x_ensemble))) + tf.add_n(ensemble.losses)
+            return loss, tape.gradient(loss, ensemble.trainable_variables)
+
+        ensemble_step()
+        ensemble_time = time_function(lambda: ensemble_step()[0].numpy(), args.repetitions)
+        # the separate models run one after another
+        separate_time = num_replicas * single_time
+        date_print(str(num_replicas).rjust(2) + " replicas -- separate: " +
+                   "{:.1f}".format(num_replicas * args.batch_size / separate_time) + " samples/s -- ensemble: " +
+                   "{:.1f}".format(num_replicas * args.batch_size / ensemble_time) + " samples/s -- speedup: " +
+                   "{:.2f}".format(separate_time / ensemble_time) + "x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from model.model import coma_ae
+from model.graph_operators import GraphOperators, load_transformation_matrices
+from benchmark.chebyshev import time_function
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Compares the batch major and the vertex major activation layout")
+parser.add_argument("--computed-dir", default="computed",
+                    help="The directory holding the precomputed transformation matrices (default is computed)")
+parser.add_argument("--batch-size", type=int, default=16, help="The batch size to be used (default is 16)")
+parser.add_argument("--repetitions", type=int, default=20, help="The number of timed repetitions (default is 20)")
+
+num_features = [16, 16, 16, 32]
+polynom_orders = [6, 6, 6, 6]
+
+
+def build_model(operators, vertex_major):
+    return coma_ae(num_input_features=3,
+                   num_features=num_features,
+                   operators=operators,
+                   Ks=polynom_orders,
+                   num_latent=8,
+                   regularization=5e-4,
+                   vertex_major=vertex_major)
+
+
+def train_step_for(model, x):
+    @tf.function
+    def train_step():
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_mean(tf.abs(model(x) - x)) + tf.add_n(model.losses)
+        return loss, tape.gradient(loss, model.trainable_variables)
+
+    return train_step
+
+
+def main():
+    args = parser.parse_args()
+    operators = GraphOperators(*load_transformation_matrices(args.computed_dir))
+    x = tf.random.normal([args.batch_size, operators.num_vertices[0], 3])
+
+    batch_major_model = build_model(operators, vertex_major=False)
+    vertex_major_model = build_model(operators, vertex_major=True)
+    batch_major_model(x)
+    vertex_major_model(x)
+    vertex_major_model.set_weights(batch_major_model.get_weights())
+
+    batch_major_step = train_step_for(batch_major_model, x)
+    vertex_major_step = train_step_for(vertex_major_model, x)
+
+    output_error = np.max(np.abs(batch_major_model(x).numpy() - vertex_major_model(x).numpy()))
+    batch_major_loss, batch_major_gradients = batch_major_step()
+    vertex_major_loss, vertex_major_gradients = vertex_major_step()
+    gradient_error = max(np.max(np.abs(a.numpy() - b.numpy()))
+                         for a, b in zip(batch_major_gradients, vertex_major_gradients))
+    date_print("Max output error: " + "{:.2e}".format(output_error) +
+               " -- loss difference: " + "{:.2e}".format(abs(batch_major_loss.numpy() - vertex_major_loss.numpy())) +
+               " -- max gradient error: " + "{:.2e}".format(gradient_error))
+
+    batch_major_time = time_function(lambda: batch_major_step()[0].numpy(), args.repetitions)
+    vertex_major_time = time_function(lambda: vertex_major_step()[0].numpy(), args.repetitions)
+    date_print("Train step, batch major: " + "{:.1f}".format(args.batch_size / batch_major_time) + " samples/s" +
+               " -- vertex major: " + "{:.1f}".format(args.batch_size / vertex_major_time) + " samples/s" +
+               " -- speedup: " + "{:.2f}".format(batch_major_time / vertex_major_time) + "x")
+
+
+if __name__ == '__main__':
+    main()
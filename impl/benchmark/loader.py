@@ -0,0 +1,91 @@
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+
+from data import meshdata
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Compares the peak memory and time of loading and normalizing a dataset "
+                                             "with MeshData in several configurations, each in a fresh process")
+parser.add_argument("--data-dir", default="data/sliced",
+                    help="Path to the data folder containing train.npy and test.npy (default is data/sliced)")
+parser.add_argument("--template-mesh", default="data/template.obj",
+                    help="Path to the template mesh (default is data/template.obj)")
+parser.add_argument("--configurations", default="original,float32,mmap,mmap-lazy",
+                    help="Comma separated configurations to compare, out of original (the former loading in float64 "
+                         "with a float32 copy), float32, mmap and mmap-lazy (default are all)")
+parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+
+
+def memory_status():
+    """
+    Returns the current and peak resident set size and the current anonymous and file backed resident memory in
+    bytes of this process.
+    """
+    status = dict()
+    with open("/proc/self/status") as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            if key in ["VmRSS", "VmHWM", "RssAnon", "RssFile"]:
+                status[key] = int(value.split()[0]) * 1024
+    return status
+
+
+def load_original(args):
+    """
+    The loading of MeshData as it used to be: float64, normalized by copies and copied to float32 by main.py.
+    """
+    vertices_train = np.load(args.data_dir + '/train.npy')
+    mean = np.mean(vertices_train, axis=0)
+    std = np.std(vertices_train, axis=0)
+    train = (vertices_train[:-100] - mean) / std
+    val = (vertices_train[-100:] - mean) / std
+    test = (np.load(args.data_dir + '/test.npy') - mean) / std
+    return train.astype('float32'), val.astype('float32'), test.astype('float32')
+
+
+def run(args):
+    baseline = memory_status()
+    start = time.time()
+    if args.run == "original":
+        data = load_original(args)
+    else:
+        mesh_data = meshdata.MeshData(number_val=100, train_file=args.data_dir + '/train.npy',
+                                      test_file=args.data_dir + '/test.npy',
+                                      reference_mesh_file=args.template_mesh,
+                                      mmap_mode='r' if args.run.startswith("mmap") else None,
+                                      lazy_normalization=args.run == "mmap-lazy")
+        data = mesh_data.vertices_train, mesh_data.vertices_val, mesh_data.vertices_test
+    duration = time.time() - start
+    status = memory_status()
+    print(json.dumps({"time": duration, "peak": status["VmHWM"] - baseline["VmRSS"],
+                      "anonymous": status["RssAnon"] - baseline["RssAnon"],
+                      "file": status["RssFile"] - baseline["RssFile"]}))
+    del data
+
+
+def main():
+    args = parser.parse_args()
+    if args.run is not None:
+        run(args)
+        return
+
+    size = sum(np.load(args.data_dir + "/" + name, mmap_mode='r').nbytes for name in ["train.npy", "test.npy"])
+    date_print("Dataset " + args.data_dir + ": " + "{:.1f}".format(size / 2 ** 20) + " MiB on disk")
+    for configuration in args.configurations.split(","):
+        output = subprocess.run([sys.executable, "-m", "benchmark.loader", "--data-dir", args.data_dir,
+                                 "--template-mesh", args.template_mesh, "--run", configuration],
+                                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        result = json.loads(output.strip().split("\n")[-1])
+        date_print(configuration.ljust(10) + " -- load time: " + "{:.3f}".format(result["time"]) + "s" +
+                   " -- peak RSS: " + "{:.1f}".format(result["peak"] / 2 ** 20) + " MiB" +
+                   " ({:.2f}x dataset)".format(result["peak"] / size) +
+                   " -- resident after loading: " + "{:.1f}".format(result["anonymous"] / 2 ** 20) +
+                   " MiB anonymous, " + "{:.1f}".format(result["file"] / 2 ** 20) + " MiB file backed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import argparse
+
+from model.model_util import report_activation_memory
+
+parser = argparse.ArgumentParser(description="Estimates the activation memory of a coma_ae train step per layer, "
+                                             "with and without gradient checkpointing")
+parser.add_argument("--batch-size", type=int, default=16, help="The batch size to be used (default is 16)")
+parser.add_argument("--num-features", default="16,16,16,32",
+                    help="Comma separated number of features per block (default is 16,16,16,32)")
+parser.add_argument("--polynom-orders", default="6,6,6,6",
+                    help="Comma separated polynomial orders per block (default is 6,6,6,6)")
+parser.add_argument("--num-vertices", default="5023,1256,314,79,20",
+                    help="Comma separated number of vertices per level of the mesh pyramid "
+                         "(default is 5023,1256,314,79,20)")
+parser.add_argument("--checkpoint-levels", default="0",
+                    help="Comma separated levels whose Chebyshev filters recompute their basis (default is 0)")
+parser.add_argument("--latent-vector-length", type=int, default=8, help="The size of the latent vector (default is 8)")
+parser.add_argument("--mixed-precision", action="store_true",
+                    help="Estimate for bfloat16 activations (default is False)")
+
+
+def parse_list(value):
+    return [int(x) for x in value.split(",") if x]
+
+
+def main():
+    args = parser.parse_args()
+    report_activation_memory(parse_list(args.num_vertices), args.batch_size, parse_list(args.num_features),
+                             parse_list(args.polynom_orders), checkpoint_levels=parse_list(args.checkpoint_levels),
+                             num_latent=args.latent_vector_length, dtype_size=2 if args.mixed_precision else 4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from data import meshdata
+from errors import calculate_error
+from model.model import coma_ae
+from model.graph_operators import GraphOperators, load_transformation_matrices
+import model.model_util as model_util
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Compares float32 and bfloat16 mixed precision training in speed and "
+                                             "reconstruction error")
+parser.add_argument("--computed-dir", default="computed",
+                    help="The directory holding the precomputed transformation matrices (default is computed)")
+parser.add_argument("--data-dir", default="data/sliced",
+                    help="Path to the data folder containing train.npy and test.npy (default is data/sliced)")
+parser.add_argument("--template-mesh", default="data/template.obj",
+                    help="Path to the template mesh (default is data/template.obj)")
+parser.add_argument("--batch-size", type=int, default=16, help="The batch size to be used (default is 16)")
+parser.add_argument("--num-epochs", type=int, default=10, help="The number of training epochs (default is 10)")
+parser.add_argument("--learning-rate", type=float, default=8e-3, help="The learning rate (default is 8e-3)")
+parser.add_argument("--random-seed", type=int, default=2, help="The random seed (default is 2)")
+
+num_features = [16, 16, 16, 32]
+polynom_orders = [6, 6, 6, 6]
+
+
+def build_model(policy, transformation_matrices, num_train, args):
+    keras.mixed_precision.set_global_policy(policy)
+    operators = GraphOperators(*transformation_matrices, dtype=keras.mixed_precision.global_policy().compute_dtype)
+    coma_model = coma_ae(num_input_features=3,
+                         num_features=num_features,
+                         operators=operators,
+                         Ks=polynom_orders,
+                         num_latent=8,
+                         regularization=5e-4)
+    coma_model.compile(loss=keras.losses.MeanAbsoluteError(),
+                       optimizer=keras.optimizers.SGD(
+                           learning_rate=model_util.get_learning_rate_decay_schedule(args.learning_rate, 0.99,
+                                                                                     num_train / args.batch_size),
+                           momentum=0.9))
+    keras.mixed_precision.set_global_policy("float32")
+    return coma_model
+
+
+def train_and_evaluate(coma_model, initial_weights, mesh_data, args):
+    """
+    Trains the model from the given initial weights and returns the training samples per second and the test errors
+    in millimeters, as computed by errors.py.
+    """
+    x_train = mesh_data.vertices_train.astype('float32', copy=False)
+    x_test = mesh_data.vertices_test.astype('float32', copy=False)
+    coma_model(x_train[:args.batch_size])
+    coma_model.set_weights(initial_weights)
+
+    tf.random.set_seed(args.random_seed)
+    start = time.perf_counter()
+    coma_model.fit(x_train, x_train, batch_size=args.batch_size, epochs=args.num_epochs, shuffle=True, verbose=0)
+    samples_per_second = args.num_epochs * x_train.shape[0] / (time.perf_counter() - start)
+
+    prediction = coma_model.predict(x_test, batch_size=args.batch_size, verbose=0)
+    predicted_vertices_mm = ((prediction * mesh_data.std) + mesh_data.mean) * 1000
+    original_vertices_mm = ((mesh_data.vertices_test * mesh_data.std) + mesh_data.mean) * 1000
+    _, error_mean, error_std, error_median = calculate_error(predicted_vertices_mm, original_vertices_mm)
+    return samples_per_second, error_mean, error_std, error_median
+
+
+def main():
+    args = parser.parse_args()
+    np.random.seed(args.random_seed)
+    tf.random.set_seed(args.random_seed)
+    transformation_matrices = load_transformation_matrices(args.computed_dir)
+    mesh_data = meshdata.MeshData(number_val=100, train_file=args.data_dir + '/train.npy',
+                                  test_file=args.data_dir + '/test.npy',
+                                  reference_mesh_file=args.template_mesh)
+    num_train = mesh_data.vertices_train.shape[0]
+
+    initial_weights = None
+    results = dict()
+    for policy in ["float32", "mixed_bfloat16"]:
+        coma_model = build_model(policy, transformation_matrices, num_train, args)
+        if initial_weights is None:
+            coma_model(mesh_data.vertices_train[:args.batch_size].astype('float32', copy=False))
+            initial_weights = coma_model.get_weights()
+        results[policy] = train_and_evaluate(coma_model, initial_weights, mesh_data, args)
+        samples_per_second, error_mean, error_std, error_median = results[policy]
+        date_print(policy.ljust(14) + " -- " + "{:.1f}".format(samples_per_second) + " samples/s" +
+                   " -- Error - Mean: " + "{:.4f}".format(error_mean) + "mm, Std: " + "{:.4f}".format(error_std) +
+                   "mm, Median: " + "{:.4f}".format(error_median) + "mm")
+
+    date_print("Mixed precision speedup: " +
+               "{:.2f}".format(results["mixed_bfloat16"][0] / results["float32"][0]) + "x" +
+               " -- mean error difference: " +
+               "{:+.4f}".format(results["mixed_bfloat16"][1] - results["float32"][1]) + "mm")
+
+
+if __name__ == '__main__':
+    main()
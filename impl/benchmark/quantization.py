@@ -0,0 +1,87 @@
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from data import meshdata
+from errors import calculate_error
+from model.model import coma_ae
+from model.graph_operators import GraphOperators, load_transformation_matrices
+from model.quantization import quantized_decoder, variable_bytes
+from benchmark.chebyshev import time_function
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Compares the int8 quantized decoder of a trained model against the "
+                                             "float32 decoder in accuracy, latency and memory")
+parser.add_argument("--name", required=True, help="The name of the trained run")
+parser.add_argument("--coma-model-dir", default="coma-model",
+                    help="The directory holding the checkpoints (default is coma-model)")
+parser.add_argument("--computed-dir", default="computed",
+                    help="The directory holding the precomputed transformation matrices (default is computed)")
+parser.add_argument("--data-dir", default="data/sliced",
+                    help="Path to the data folder containing train.npy and test.npy (default is data/sliced)")
+parser.add_argument("--template-mesh", default="data/template.obj",
+                    help="Path to the template mesh (default is data/template.obj)")
+parser.add_argument("--latent-vector-length", type=int, default=8, help="The size of the latent vector (default is 8)")
+parser.add_argument("--batch-size", type=int, default=64, help="The batch size to be used (default is 64)")
+parser.add_argument("--repetitions", type=int, default=20, help="The number of timed repetitions (default is 20)")
+
+num_features = [16, 16, 16, 32]
+polynom_orders = [6, 6, 6, 6]
+
+
+def encode(coma_model, vertices, batch_size):
+    return np.concatenate([coma_model.encode(vertices[i:i + batch_size]).numpy()
+                           for i in range(0, vertices.shape[0], batch_size)])
+
+
+def decode(decoder, latents, batch_size):
+    return np.concatenate([decoder(latents[i:i + batch_size]).numpy() for i in range(0, latents.shape[0], batch_size)])
+
+
+def main():
+    args = parser.parse_args()
+    operators = GraphOperators(*load_transformation_matrices(args.computed_dir))
+    mesh_data = meshdata.MeshData(number_val=100, train_file=args.data_dir + '/train.npy',
+                                  test_file=args.data_dir + '/test.npy',
+                                  reference_mesh_file=args.template_mesh)
+    coma_model = coma_ae(num_input_features=3,
+                         num_features=num_features,
+                         operators=operators,
+                         Ks=polynom_orders,
+                         num_latent=args.latent_vector_length,
+                         regularization=5e-4)
+    coma_model.load_weights(args.coma_model_dir + "/checkpoint/" + args.name + "/coma_model").expect_partial()
+
+    x_train = mesh_data.vertices_train.astype('float32', copy=False)
+    x_test = mesh_data.vertices_test.astype('float32', copy=False)
+    # creates the variables, restoring the checkpoint
+    coma_model(x_train[:1])
+    train_latents = encode(coma_model, x_train, args.batch_size)
+    test_latents = encode(coma_model, x_test, args.batch_size)
+
+    int8_decoder = quantized_decoder(coma_model.decoder)
+    int8_decoder.calibrate(train_latents, batch_size=args.batch_size)
+
+    original_vertices_mm = ((x_test * mesh_data.std) + mesh_data.mean) * 1000
+    predictions = dict()
+    for name, decoder in [("float32", coma_model.decoder), ("int8", int8_decoder)]:
+        prediction = decode(decoder, test_latents, args.batch_size)
+        predictions[name] = ((prediction * mesh_data.std) + mesh_data.mean) * 1000
+        _, error_mean, error_std, error_median = calculate_error(predictions[name], original_vertices_mm)
+
+        step = tf.function(decoder)
+        batch = tf.constant(test_latents[:args.batch_size])
+        latency = time_function(lambda: step(batch).numpy(), args.repetitions)
+        date_print(name.ljust(7) + " decoder -- Error - Mean: " + "{:.4f}".format(error_mean) + "mm, Std: " +
+                   "{:.4f}".format(error_std) + "mm, Median: " + "{:.4f}".format(error_median) + "mm" +
+                   " -- latency: " + "{:.3f}".format(1000 * latency) + "ms per batch of " + str(args.batch_size) +
+                   " -- weights: " + str(variable_bytes(decoder)) + " bytes")
+
+    deviation, deviation_mean, _, _ = calculate_error(predictions["int8"], predictions["float32"])
+    date_print("int8 vs float32 decoder -- mean deviation: " + "{:.4f}".format(deviation_mean) + "mm" +
+               ", max deviation: " + "{:.4f}".format(np.max(deviation)) + "mm" +
+               " -- sparse operators (kept in float32, shared): " + str(operators.memory()) + " bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from model.graph_operators import SamplingOperator, to_sparse_tensor, load_transformation_matrices
+from model.layer_util import sparse_sampling
+from benchmark.chebyshev import time_function
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Benchmarks the gather based sampling against the sparse matmul")
+parser.add_argument("--computed-dir", default="computed",
+                    help="The directory holding the precomputed sampling matrices (default is computed)")
+parser.add_argument("--batch-size", type=int, default=16, help="The batch size to be used (default is 16)")
+parser.add_argument("--num-features", type=int, default=16, help="The number of features (default is 16)")
+parser.add_argument("--repetitions", type=int, default=50, help="The number of timed repetitions (default is 50)")
+
+
+def benchmark_transformation(transformation, batch_size, num_features, repetitions):
+    x = tf.random.normal([batch_size, transformation.shape[1], num_features])
+    upstream = tf.random.normal([batch_size, transformation.shape[0], num_features])
+
+    operator = SamplingOperator(transformation)
+    D = to_sparse_tensor(transformation)
+
+    def step_for(function):
+        @tf.function
+        def step():
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                loss = tf.reduce_sum(function(x) * upstream)
+            # return the loss as well, so that the forward pass is not pruned
+            return loss, tf.convert_to_tensor(tape.gradient(loss, x))
+
+        return step
+
+    structured_step = step_for(operator)
+    sparse_step = step_for(lambda x: sparse_sampling(D, x))
+
+    error = np.max(np.abs(structured_step()[1].numpy() - sparse_step()[1].numpy()))
+    structured_time = time_function(lambda: structured_step()[1].numpy(), repetitions)
+    sparse_time = time_function(lambda: sparse_step()[1].numpy(), repetitions)
+    return operator.mode, error, sparse_time, structured_time
+
+
+def main():
+    args = parser.parse_args()
+    _, downsampling_matrices, upsampling_matrices = load_transformation_matrices(args.computed_dir)
+
+    for name, matrices in [("D", downsampling_matrices), ("U", upsampling_matrices)]:
+        for matrix in matrices:
+            mode, error, sparse_time, structured_time = benchmark_transformation(matrix, args.batch_size,
+                                                                                 args.num_features, args.repetitions)
+            date_print(name + " " + str(matrix.shape).ljust(12) +
+                       " -- sparse: " + "{:.3f}".format(1000 * sparse_time) + "ms" +
+                       " -- " + mode + ": " + "{:.3f}".format(1000 * structured_time) + "ms" +
+                       " -- speedup: " + "{:.2f}".format(sparse_time / structured_time) + "x" +
+                       " -- max gradient error: " + "{:.2e}".format(error))
+
+
+if __name__ == '__main__':
+    main()
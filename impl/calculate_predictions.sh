@@ -1,7 +1,11 @@
+#!/bin/bash
+# Additional arguments are passed on to main.py, e.g. --jit
+extra_args=("$@")
+
 calculate_predictions() {
 echo ---------- Calculating error for $1 ----------
 echo Running Coma for $1 on $2 data
-python main.py --coma-model-dir coma-model --name $1 --data-dir data/$2 --mode test
+python main.py --coma-model-dir coma-model --name $1 --data-dir data/$2 --mode test "${extra_args[@]}"
 echo Predictions for $1 on $2 saved
 echo ----------------------------------------------
 }
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import numpy as np
+import tensorflow as tf
+
+from model import graph_operators
+from util.log_util import date_print
+
+# bfloat16 is stored as the upper 16 bits of the float32 values, as numpy has no bfloat16 type
+storage_dtypes = {"float32": np.float32, "bfloat16": np.uint16}
+
+
+def to_bfloat16_bits(x):
+    """
+    Rounds the float32 array x to bfloat16 (to nearest even) and returns the bits as uint16.
+    """
+    bits = np.ascontiguousarray(x, dtype=np.float32).view(np.uint32)
+    rounding = np.uint32(0x7FFF) + ((bits >> 16) & 1)
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+def from_bfloat16_bits(bits):
+    """
+    Returns the bfloat16 values stored as uint16 by to_bfloat16_bits as float32 array.
+    """
+    return (bits.astype(np.uint32) << 16).view(np.float32)
+
+
+def cache_key(train_file, template_mesh_file, laplacian, K, dtype):
+    """
+    The key a basis cache is valid for: the training data, the template and its laplacian, K and the storage dtype.
+    The basis is always computed in float32, which the key records, as earlier caches were computed in the precision
+    of the operator.
+    """
+    laplacian_hash = hashlib.sha1()
+    for array in [laplacian.indptr, laplacian.indices, laplacian.data]:
+        laplacian_hash.update(np.ascontiguousarray(array).tobytes())
+    with open(template_mesh_file, 'rb') as file:
+        template_hash = hashlib.sha1(file.read()).hexdigest()
+    stat = os.stat(train_file)
+    return {"train_file": os.path.abspath(train_file), "train_size": stat.st_size, "train_mtime": stat.st_mtime,
+            "template": template_hash, "laplacian": laplacian_hash.hexdigest(), "K": K, "dtype": dtype,
+            "compute_dtype": "float32"}
+
+
+def cache_path(train_file, K, dtype):
+    """
+    The basis cache is stored next to the training data, e.g. data/sliced/train_basis_K6_float32.npy
+    """
+    return os.path.splitext(train_file)[0] + "_basis_K" + str(K) + "_" + dtype + ".npy"
+
+
+def chebyshev_basis(laplacian_operator, vertices, K, batch_size=64):
+    """
+    Yields the Chebyshev basis of the given vertices of shape [N, V, F] in batches of shape [B, V, F * K], in the
+    (feature, order) row order of the weights of cheb_conv. The basis is computed in float32 even if the operator runs
+    in a lower precision, e.g. for mixed precision, it is only rounded when it is stored.
+    """
+    if tf.as_dtype(laplacian_operator.dtype) != tf.float32:
+        laplacian_operator = graph_operators.LaplacianOperator(laplacian_operator.laplacian, laplacian_operator.strategy)
+    num_vertices, num_features = vertices.shape[1:]
+    for start in range(0, vertices.shape[0], batch_size):
+        x = tf.constant(vertices[start:start + batch_size], dtype=tf.float32)
+        batch = x.shape[0]
+        x0 = tf.reshape(tf.transpose(x, perm=[1, 2, 0]), [num_vertices, num_features * batch])
+        basis = tf.reshape(laplacian_operator.expand(x0, K), [K, num_vertices, num_features, batch])
+        basis = tf.transpose(basis, perm=[3, 1, 2, 0])
+        yield start, tf.reshape(basis, [batch, num_vertices, num_features * K]).numpy()
+
+
+def load_basis_cache(train_file, template_mesh_file, laplacian_operator, vertices, K, dtype="float32"):
+    """
+    Returns the Chebyshev basis of the first encoder layer for the given (normalized) training vertices as read only
+    memory mapped array of shape [N, V, F * K], computing it once if there is no cache for the training data, the
+    template and K yet.
+
+    :param train_file: The training data the vertices are loaded from, the cache is stored next to it
+    :param template_mesh_file: The template mesh the laplacian is built from
+    :param laplacian_operator: The LaplacianOperator of the full resolution mesh
+    :param vertices: The normalized training vertices of shape [N, V, F]
+    :param K: The polynomial order of the first encoder layer
+    :param dtype: The storage dtype, float32 or bfloat16
+    """
+    path = cache_path(train_file, K, dtype)
+    key_file = os.path.splitext(path)[0] + ".json"
+    key = cache_key(train_file, template_mesh_file, laplacian_operator.laplacian, K, dtype)
+    shape = (vertices.shape[0], vertices.shape[1], vertices.shape[2] * K)
+
+    if os.path.exists(path) and os.path.exists(key_file):
+        with open(key_file) as file:
+            if json.load(file) == key:
+                cache = np.load(path, mmap_mode='r')
+                if cache.shape == shape:
+                    date_print("Using the Chebyshev basis cache " + path)
+                    return cache
+
+    date_print("Computing the Chebyshev basis cache " + path + " of shape " + str(shape))
+    cache = np.lib.format.open_memmap(path, mode='w+', dtype=storage_dtypes[dtype], shape=shape)
+    for start, basis in chebyshev_basis(laplacian_operator, vertices, K):
+        cache[start:start + basis.shape[0]] = to_bfloat16_bits(basis) if dtype == "bfloat16" else basis
+    cache.flush()
+    del cache
+    # the key is written last, so that an interrupted computation is not mistaken for a valid cache
+    with open(key_file, 'w') as file:
+        json.dump(key, file)
+    return np.load(path, mmap_mode='r')
+
+
+def basis_dataset(basis, vertices, batch_size, seed=None):
+    """
+    Returns a tf.data.Dataset feeding the cached Chebyshev basis of the training vertices as input and the vertices
+    as target to keras fit, in a new random order every epoch.
+
+    :param basis: The (memory mapped) basis cache of shape [N, V, F * K], see load_basis_cache
+    :param vertices: The training vertices of shape [N, V, F]
+    :param batch_size: The batch size
+    :param seed: The random seed of the shuffling
+    """
+    random = np.random.RandomState(seed)
+
+    def batches():
+        order = random.permutation(vertices.shape[0])
+        for start in range(0, vertices.shape[0], batch_size):
+            # sorted rows read the memory mapped cache in file order
+            rows = np.sort(order[start:start + batch_size])
+            batch = basis[rows]
+            yield from_bfloat16_bits(batch) if batch.dtype == np.uint16 else batch, vertices[rows]
+
+    # consumed by a coma_ae with basis_input, whose train step passes the basis to encoder.call_basis
+    signature = (tf.TensorSpec([None] + list(basis.shape[1:]), tf.float32),
+                 tf.TensorSpec([None] + list(vertices.shape[1:]), tf.float32))
+    return tf.data.Dataset.from_generator(batches, output_signature=signature).prefetch(1)
@@ -1,26 +1,124 @@
 import numpy as np
 from psbody.mesh import Mesh, MeshViewer
 import time
-import random
-from copy import deepcopy
 import glob
 from sklearn.decomposition import PCA
 
+from data import statistics, pipeline
+from util import mesh_writer, ply_reader
+
+
+def normalized(vertices, mean, std, chunk_size=64):
+    """
+    Returns the vertices normalized by mean and std as float32 in a single pass. A writeable in-memory float32 array is
+    normalized in place, anything else (e.g. float64 or memory mapped data) is normalized chunk by chunk into a new
+    float32 array, without full size temporaries.
+    """
+    if isinstance(vertices, np.ndarray) and not isinstance(vertices, np.memmap) and \
+            vertices.dtype == np.float32 and vertices.flags.writeable:
+        result = vertices
+    else:
+        result = np.empty(vertices.shape, dtype=np.float32)
+    for start in range(0, vertices.shape[0], chunk_size):
+        chunk = result[start:start + chunk_size]
+        np.subtract(vertices[start:start + chunk_size], mean, out=chunk, casting='same_kind')
+        np.divide(chunk, std, out=chunk)
+    return result
+
+
+class NormalizedVertices(object):
+    """
+    Read only view of raw (e.g. memory mapped) vertices, which normalizes the vertices on access. Indexing returns
+    normalized float32 arrays, so that only the accessed samples are ever held in memory.
+
+    :param vertices: The raw vertices
+    :param mean: The mean to be subtracted
+    :param std: The standard deviation to be divided by
+    """
+
+    def __init__(self, vertices, mean, std):
+        self.vertices = vertices
+        self.mean = mean
+        self.std = std
+        self.shape = vertices.shape
+        self.dtype = np.dtype(np.float32)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        return ((self.vertices[index] - self.mean) / self.std).astype(np.float32, copy=False)
+
+
+class BatchSampler(object):
+    """
+    Draws random batches of vertices with replacement. The indices of a batch are drawn at once from a seeded numpy
+    Generator and the rows are gathered in a single fancy indexing call into a preallocated buffer, which is reused by
+    every batch. Iterating over the sampler yields an endless stream of batches.
+
+    The returned batch is overwritten by the next one, copy it to keep it.
+
+    :param vertices: The (normalized) vertices of shape [N, V, F], or NormalizedVertices, whose raw vertices are
+                     gathered and normalized in the buffer
+    :param batch_size: The number of samples per batch
+    :param seed: The random seed, the same seed draws the same batches
+    """
+
+    def __init__(self, vertices, batch_size, seed=None):
+        if isinstance(vertices, NormalizedVertices):
+            self.source, self.mean, self.std = vertices.vertices, vertices.mean, vertices.std
+        else:
+            self.source, self.mean, self.std = vertices, None, None
+        self.batch_size = batch_size
+        self.num_samples = self.source.shape[0]
+        self.random = np.random.default_rng(seed)
+        self.buffer = np.empty((batch_size,) + self.source.shape[1:], dtype=np.float32)
+        self.gathered = self.buffer if self.source.dtype == np.float32 else \
+            np.empty(self.buffer.shape, dtype=self.source.dtype)
+
+    def sample(self):
+        """
+        Returns the next random batch of shape [batch_size, V, F] as float32, held in the reused buffer.
+        """
+        indices = self.random.integers(0, self.num_samples, size=self.batch_size)
+        # mode clip writes directly into the buffer, the indices are in range anyway
+        np.take(self.source, indices, axis=0, out=self.gathered, mode='clip')
+        if self.mean is not None:
+            np.subtract(self.gathered, self.mean, out=self.buffer, casting='same_kind')
+            np.divide(self.buffer, self.std, out=self.buffer)
+        elif self.gathered is not self.buffer:
+            self.buffer[...] = self.gathered
+        return self.buffer
+
+    def __iter__(self):
+        while True:
+            yield self.sample()
+
 
 class MeshData(object):
     def __init__(self, number_val: int, train_file: str, test_file: str, reference_mesh_file: str, num_pca_components=8,
-                 fit_pca=False):
+                 fit_pca=False, mmap_mode=None, lazy_normalization=False):
         """
         Constructor; create a new Mesh Dataset, consisting of train, validation and test set.
 
+        The vertices are held in float32. The validation set is a view of the training data, the normalization runs in
+        a single pass, in place where possible.
+
         :param number_val: The number of validation samples from the training dataset
         :param train_file: The file containing the training samples
         :param test_file: The file containing the test samples
         :param reference_mesh_file: The path to the reference mesh file
+        :param mmap_mode: The mmap_mode the data is loaded with, e.g. 'r' to memory map train.npy and test.npy instead
+                          of reading them
+        :param lazy_normalization: Whether the vertices are normalized on access instead of on loading, see
+                                   NormalizedVertices. Together with mmap_mode this keeps only the accessed samples in
+                                   memory.
         """
         self.number_val = number_val
         self.train_file = train_file
         self.test_file = test_file
+        self.mmap_mode = mmap_mode
+        self.lazy_normalization = lazy_normalization
         self.vertices_train = None
         self.vertices_val = None
         self.vertices_test = None
@@ -28,6 +126,7 @@ class MeshData(object):
         self.n_vertex = None
         self.mean = None
         self.std = None
+        self.default_sampler = None
 
         self.load()
         self.reference_mesh = Mesh(filename=reference_mesh_file)
@@ -44,39 +143,58 @@ class MeshData(object):
         Load the mesh data from the train_file and test_file. The train_file will be split into training and validation
         by splitting the train_file, according to the numer of validation samples.
         """
-        vertices_train = np.load(self.train_file)
-        self.mean = np.mean(vertices_train, axis=0)
-        self.std = np.std(vertices_train, axis=0)
+        self.vertices_train_val = np.load(self.train_file, mmap_mode=self.mmap_mode)
+        # streamed over the memory mapped file once, later runs read them from the sidecar file
+        self.mean, self.std = statistics.cached_statistics(self.train_file)
 
-        # split in to train val
-        self.vertices_train = vertices_train[:-self.number_val]
-        self.vertices_val = vertices_train[-self.number_val:]
+        # split in to train val, as views of the training data
+        self.vertices_train = self.vertices_train_val[:-self.number_val]
+        self.vertices_val = self.vertices_train_val[-self.number_val:]
 
         self.n_vertex = self.vertices_train.shape[1]
 
-        self.vertices_test = np.load(self.test_file)
+        self.vertices_test = np.load(self.test_file, mmap_mode=self.mmap_mode)
 
     def normalize(self):
         """
         Normalizes the dataset by substracting the training set mean and dividing by the training
         set standard deviation.
         """
-        # train
-        self.vertices_train = self.vertices_train - self.mean
-        self.vertices_train = self.vertices_train / self.std
-
-        self.vertices_val = self.vertices_val - self.mean
-        self.vertices_val = self.vertices_val / self.std
-
-        self.vertices_test = self.vertices_test - self.mean
-        self.vertices_test = self.vertices_test / self.std
+        if self.lazy_normalization:
+            self.vertices_train_val = NormalizedVertices(self.vertices_train_val, self.mean, self.std)
+            self.vertices_train = NormalizedVertices(self.vertices_train_val.vertices[:-self.number_val], self.mean,
+                                                     self.std)
+            self.vertices_val = NormalizedVertices(self.vertices_train_val.vertices[-self.number_val:], self.mean,
+                                                   self.std)
+            self.vertices_test = NormalizedVertices(self.vertices_test, self.mean, self.std)
+        else:
+            self.vertices_train_val = normalized(self.vertices_train_val, self.mean, self.std)
+            self.vertices_train = self.vertices_train_val[:-self.number_val]
+            self.vertices_val = self.vertices_train_val[-self.number_val:]
+            self.vertices_test = normalized(self.vertices_test, self.mean, self.std)
 
         self.N = self.vertices_train.shape[0]
 
         if self.fit_pca:
-            self.pca.fit(np.reshape(self.vertices_train, (self.N, self.n_vertex*3)))
+            self.pca.fit(np.reshape(self.vertices_train[:], (self.N, self.n_vertex*3)))
 
+    def dataset(self, split, batch_size, shuffle_buffer=None, seed=None, targets=True):
+        """
+        Returns a tf.data.Dataset streaming the normalized vertices of the given split in batches, see
+        pipeline.vertex_dataset. Lazily normalized vertices are read raw and normalized on the tf.data threads.
 
+        :param split: train, val or test
+        :param batch_size: The batch size
+        :param shuffle_buffer: The size of the shuffle buffer (default is None, the split is streamed in order)
+        :param seed: The random seed of the shuffling
+        :param targets: Whether the batches are (x, x) pairs for fit and evaluate, or only x (default is True)
+        """
+        vertices = {"train": self.vertices_train, "val": self.vertices_val, "test": self.vertices_test}[split]
+        if isinstance(vertices, NormalizedVertices):
+            return pipeline.vertex_dataset(vertices.vertices, batch_size, mean=self.mean, std=self.std,
+                                           shuffle_buffer=shuffle_buffer, seed=seed, targets=targets)
+        return pipeline.vertex_dataset(vertices, batch_size, shuffle_buffer=shuffle_buffer, seed=seed,
+                                       targets=targets)
 
     def show(self, ids):
         """
@@ -93,27 +211,32 @@ class MeshData(object):
             time.sleep(0.5)
         return 0
 
-    def sample(self, BATCH_SIZE=64):
+    def sampler(self, batch_size, seed=None):
         """
-        Randomly samples the training vertices given the batch size
+        Returns a BatchSampler drawing random batches of the normalized training vertices, e.g. for custom training
+        loops and benchmarks.
+
+        :param batch_size: The number of samples per batch
+        :param seed: The random seed of the sampler
         """
-        samples = np.zeros((BATCH_SIZE, self.vertices_train.shape[1] * self.vertices_train.shape[2]))
-        for i in range(BATCH_SIZE):
-            randint = random.randint(0, self.N - 1)
-            samples[i] = ((deepcopy(self.vertices_train[randint]) - self.mean) / self.std).reshape(-1)
+        return BatchSampler(self.vertices_train, batch_size, seed=seed)
 
-        return samples
+    def sample(self, BATCH_SIZE=64):
+        """
+        Randomly samples the normalized training vertices given the batch size, flattened to [BATCH_SIZE, V * 3]
+        """
+        if self.default_sampler is None or self.default_sampler.batch_size != BATCH_SIZE:
+            self.default_sampler = self.sampler(BATCH_SIZE)
+        return self.default_sampler.sample().reshape(BATCH_SIZE, -1).copy()
 
-    def save_meshes(self, filename, meshes):
+    def save_meshes(self, filename, meshes, file_format="ply", num_threads=8):
         """
-        Stores the given meshes after de-normalizing it.
+        Stores the given meshes after de-normalizing it, see mesh_writer.write_meshes.
 
-        Filepath pattern: filename + '-' + str(i).zfill(3) + 'ply'
+        Filepath pattern: filename + '-' + str(i).zfill(3) + '.ply'
         """
-        for i in range(meshes.shape[0]):
-            vertices = meshes[i].reshape((self.n_vertex, 3)) * self.std + self.mean
-            mesh = Mesh(v=vertices, f=self.reference_mesh.f)
-            mesh.write_ply(filename + '-' + str(i).zfill(3) + '.ply')
+        mesh_writer.write_meshes(filename, meshes, self.reference_mesh.f, mean=self.mean, std=self.std,
+                                 file_format=file_format, num_threads=num_threads)
         return 0
 
     def show_mesh(self, viewer, mesh_vecs, figsize):
@@ -137,11 +260,13 @@ def meshPlay(folder, every=100, wait=0.05):
     """"
     Displays the meshes in the given folder in a MeshViewer
     """
-    files = glob.glob(folder + '/*')
+    files = glob.glob(folder + '/*.ply')
     files.sort()
     files = files[-1000:]
+    # the meshes share the faces of the first one, only the vertices of the others are read
+    first, faces = ply_reader.read_ply(files[0])
     view = MeshViewer()
     for i in range(0, len(files), every):
-        mesh = Mesh(filename=files[i])
+        mesh = Mesh(v=ply_reader.read_ply_vertices(files[i], len(first)), f=faces)
         view.dynamic_meshes = [mesh]
         time.sleep(wait)
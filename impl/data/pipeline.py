@@ -0,0 +1,57 @@
+import numpy as np
+import tensorflow as tf
+
+
+def gather_rows(shards, offsets, indices):
+    """
+    Returns the rows of the given global indices from the shards, read in file order from each shard.
+
+    :param shards: A list of (memory mapped) arrays, concatenated along the first axis
+    :param offsets: The global index of the first row of every shard, followed by the total number of rows
+    :param indices: The global indices of the rows
+    """
+    indices = np.sort(indices)
+    rows = np.empty((indices.shape[0],) + shards[0].shape[1:], dtype=shards[0].dtype)
+    shard_ids = np.searchsorted(offsets, indices, side='right') - 1
+    for shard_id in np.unique(shard_ids):
+        mask = shard_ids == shard_id
+        rows[mask] = shards[shard_id][indices[mask] - offsets[shard_id]]
+    return rows
+
+
+def vertex_dataset(shards, batch_size, mean=None, std=None, shuffle_buffer=None, seed=None,
+                   num_parallel_calls=tf.data.AUTOTUNE, prefetch=tf.data.AUTOTUNE, targets=True):
+    """
+    Returns a tf.data.Dataset streaming batches of vertices from in memory, memory mapped or sharded data. Only the
+    indices are shuffled, the rows of a batch are read and normalized on the parallel map threads of tf.data, so that
+    only the batches in flight are held in memory and the input work overlaps with the training step.
+
+    :param shards: The vertices of shape [N, V, F], or a list of such arrays concatenated along the first axis
+    :param batch_size: The batch size
+    :param mean: The mean the raw vertices are normalized with (default is None, the vertices are normalized already)
+    :param std: The standard deviation the raw vertices are normalized with
+    :param shuffle_buffer: The size of the shuffle buffer of the indices (default is None, no shuffling)
+    :param seed: The random seed of the shuffling, the order is the same for the same seed
+    :param num_parallel_calls: The number of batches read and normalized in parallel (default is AUTOTUNE)
+    :param prefetch: The number of batches prefetched (default is AUTOTUNE)
+    :param targets: Whether the batches are (x, x) pairs for fit and evaluate, or only x (default is True)
+    """
+    shards = list(shards) if isinstance(shards, (list, tuple)) else [shards]
+    offsets = np.cumsum([0] + [shard.shape[0] for shard in shards])
+    sample_shape = list(shards[0].shape[1:])
+    raw_dtype = tf.as_dtype(shards[0].dtype)
+
+    def load(indices):
+        batch = tf.numpy_function(lambda i: gather_rows(shards, offsets, i), [indices], raw_dtype)
+        batch.set_shape([None] + sample_shape)
+        if mean is not None:
+            batch = (batch - tf.constant(mean, dtype=raw_dtype)) / tf.constant(std, dtype=raw_dtype)
+        return tf.cast(batch, tf.float32)
+
+    dataset = tf.data.Dataset.range(int(offsets[-1]))
+    if shuffle_buffer is not None:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size).map(load, num_parallel_calls=num_parallel_calls, deterministic=True)
+    if targets:
+        dataset = dataset.map(lambda x: (x, x))
+    return dataset.prefetch(prefetch)
@@ -0,0 +1,400 @@
+import os
+import time
+import glob
+import re
+import json
+import hashlib
+import itertools
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from tqdm import tqdm
+
+from util import ply_reader
+from util.log_util import date_print, hint_print
+
+
+def listing_order(folders):
+    """
+    Returns the position of every registered mesh of the given folders, laid out as subject/expression/frame.ply, in
+    the order glob lists them, which is the order the sliced split of the original preprocessing counts in.
+    """
+    paths = []
+    for folder in folders:
+        paths += glob.glob(folder + '/*/*/*.ply')
+    return {path: position for position, path in enumerate(paths)}
+
+
+def gather_paths(folders):
+    """
+    Returns the sorted paths of all registered meshes of the given folders, laid out as subject/expression/frame.ply
+    """
+    return sorted(listing_order(folders))
+
+
+def index_entry(path):
+    """
+    The metadata of a registered mesh, parsed from its path subject/expression/frame.ply
+    """
+    subject, expression, frame = path.split('/')[-3:]
+    return {"subject": subject, "expression": expression, "frame": os.path.splitext(frame)[0], "path": path}
+
+
+def parse_meshes(paths, num_workers=1, executor="thread", max_in_flight=None, num_vertices=None):
+    """
+    Parses the meshes at the given paths on a pool of workers and yields their vertices in the order of the paths. At
+    most max_in_flight meshes are submitted ahead of the one yielded next, which bounds the memory of the results
+    waiting to be consumed. The progress is shown and the throughput is reported at the end.
+
+    :param paths: The paths of the meshes
+    :param num_workers: The number of threads or processes parsing in parallel (default is 1)
+    :param executor: thread or process, threads suffice while parsing waits on the disk (default is thread)
+    :param max_in_flight: The maximum number of submitted meshes (default is 4 * num_workers)
+    :param num_vertices: The number of vertices of the template every mesh is checked against (default is None)
+    """
+    if not paths:
+        return
+    max_in_flight = max_in_flight if max_in_flight is not None else 4 * num_workers
+    pool_type = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}[executor]
+    start = time.time()
+    num_bytes = 0
+    with pool_type(max_workers=num_workers) as pool:
+        remaining = iter(paths)
+        in_flight = collections.deque(pool.submit(ply_reader.read_ply_vertices, path, num_vertices)
+                                      for path in itertools.islice(remaining, max_in_flight))
+        for path in tqdm(paths):
+            vertices = in_flight.popleft().result()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                in_flight.append(pool.submit(ply_reader.read_ply_vertices, next_path, num_vertices))
+            num_bytes += os.path.getsize(path)
+            yield vertices
+    duration = max(time.time() - start, 1e-9)
+    date_print("Parsed " + str(len(paths)) + " meshes in " + "{:.1f}".format(duration) + "s -- " +
+               "{:.1f}".format(len(paths) / duration) + " files/s, " +
+               "{:.1f}".format(num_bytes / 2 ** 20 / duration) + " MB/s (" + str(num_workers) + " " + executor +
+               (" workers)" if num_workers > 1 else " worker)"))
+
+
+def open_vertex_store(path, num_meshes, num_vertices):
+    """
+    Preallocates a float32 .npy file of shape [num_meshes, num_vertices, 3] and returns it memory mapped for writing,
+    so that meshes are written straight into their rows and never collected in memory.
+    """
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(num_meshes, num_vertices, 3))
+
+
+def copy_rows(path, vertices, rows, chunk_size=256):
+    """
+    Writes the given rows of the (memory mapped) vertices to a preallocated float32 file at path in chunks, so that
+    only a chunk of the rows is held in memory.
+    """
+    output = open_vertex_store(path, len(rows), vertices.shape[1])
+    for start in range(0, len(rows), chunk_size):
+        output[start:start + chunk_size] = vertices[rows[start:start + chunk_size]]
+    output.flush()
+    return output
+
+
+def manifest_entry(path, content_hash=False):
+    """
+    The index entry of a registered mesh together with the size and modification time of its file and, with
+    content_hash, the sha1 of its content, which tell whether the file changed since it was ingested.
+    """
+    entry = index_entry(path)
+    stat = os.stat(path)
+    entry["size"] = stat.st_size
+    entry["mtime"] = stat.st_mtime
+    if content_hash:
+        with open(path, 'rb') as file:
+            entry["hash"] = hashlib.sha1(file.read()).hexdigest()
+    return entry
+
+
+def is_unchanged(ingested, current):
+    """
+    Whether the file of a mesh is the one it was ingested from, by its hash if both have one, else by size and mtime.
+    """
+    if "hash" in ingested and "hash" in current:
+        return ingested["hash"] == current["hash"]
+    return ingested.get("size") == current["size"] and ingested.get("mtime") == current["mtime"]
+
+
+def invalidated(entry):
+    """
+    The entry of a mesh whose row is being overwritten, which is_unchanged never takes for an ingested file.
+    """
+    entry = dict(entry, size=None, mtime=None)
+    if "hash" in entry:
+        entry["hash"] = None
+    return entry
+
+
+def check_meshes(paths, num_vertices=None):
+    """
+    Checks the headers of the meshes at the given paths before any of them is parsed, see ply_reader.check_ply, and
+    raises a single ValueError listing the malformed files.
+    """
+    errors = []
+    for path in paths:
+        try:
+            ply_reader.check_ply(path, num_vertices)
+        except (ValueError, IndexError) as error:
+            errors.append(str(error))
+    if errors:
+        raise ValueError(str(len(errors)) + " malformed meshes, the ingest cache is unchanged:\n" +
+                         "\n".join(errors[:10]) + ("\n..." if len(errors) > 10 else ""))
+
+
+def write_index(index_file, index):
+    """
+    Writes the index to a temporary file first, which replaces the index once it is complete.
+    """
+    temporary_file = index_file + '.tmp'
+    with open(temporary_file, 'w') as file:
+        json.dump(index, file)
+    os.replace(temporary_file, index_file)
+
+
+def plan_ingest(folders, cache_dir, content_hash=False):
+    """
+    Compares the registered meshes of the given folders with the manifest of the ingest cache. Ingested meshes keep
+    their relative order, removed meshes are dropped and new meshes are appended in sorted order, so that the ingested
+    vertices are copied in chunks. The rows are only the storage order, the splits do not depend on them.
+
+    :return: The new index and for every row of it the row of the ingested vertices it is copied from, or None if the
+             mesh has to be parsed, and the new, changed and removed paths
+    """
+    index_file = os.path.join(cache_dir, 'index.json')
+    ingested = []
+    if os.path.exists(index_file) and os.path.exists(os.path.join(cache_dir, 'vertices.npy')):
+        with open(index_file) as file:
+            ingested = json.load(file)
+
+    positions = listing_order(folders)
+    paths = sorted(positions)
+    index, sources, changed, removed = [], [], [], []
+    for row, entry in enumerate(ingested):
+        if entry["path"] not in positions:
+            removed.append(entry["path"])
+            continue
+        # the hash of an ingested mesh is only computed again if the manifest has one
+        current_entry = manifest_entry(entry["path"], content_hash or "hash" in entry)
+        current_entry["position"] = positions[entry["path"]]
+        unchanged = is_unchanged(entry, current_entry)
+        index.append(current_entry)
+        sources.append(row if unchanged else None)
+        if not unchanged:
+            changed.append(entry["path"])
+    ingested_paths = set(entry["path"] for entry in ingested)
+    new = [path for path in paths if path not in ingested_paths]
+    for path in new:
+        index.append(dict(manifest_entry(path, content_hash), position=positions[path]))
+        sources.append(None)
+    return index, sources, new, changed, removed
+
+
+def rebuild_store(vertices_file, num_meshes, num_vertices, sources, parse_rows, parsed):
+    """
+    Writes a new master vertex array next to the old one, into which the unchanged meshes are copied from the old one
+    in chunks, which is much cheaper than parsing them again, and the parsed meshes are written in their rows.
+
+    :param vertices_file: The master vertex array, which is left unchanged
+    :param num_meshes: The number of meshes of the new array
+    :param num_vertices: The number of vertices of every mesh
+    :param sources: For every row the row of the old array it is copied from, or None
+    :param parse_rows: The rows of the parsed meshes
+    :param parsed: The vertices of the parsed meshes, see parse_meshes
+    :return: The path of the new master vertex array
+    """
+    old_vertices = np.load(vertices_file, mmap_mode='r') if os.path.exists(vertices_file) else None
+    temporary_file = os.path.splitext(vertices_file)[0] + '.tmp.npy'
+    vertices = open_vertex_store(temporary_file, num_meshes, num_vertices)
+    for mesh_vertices, row in zip(parsed, parse_rows):
+        vertices[row] = mesh_vertices
+    copies = np.array([(row, source) for row, source in enumerate(sources) if source is not None],
+                      dtype=np.int64).reshape(-1, 2)
+    for start in range(0, copies.shape[0], 256):
+        chunk = copies[start:start + 256]
+        vertices[chunk[:, 0]] = old_vertices[chunk[:, 1]]
+    vertices.flush()
+    del vertices, old_vertices
+    return temporary_file
+
+
+def ingest(folders, cache_dir, num_workers=1, executor="thread", num_vertices=None, content_hash=False,
+           dry_run=False):
+    """
+    Parses every registered mesh of the given folders exactly once into a master float32 vertex array
+    cache_dir/vertices.npy of shape [N, V, 3], with the metadata index cache_dir/index.json beside it, whose entries
+    (subject, expression, frame, path, size, mtime and optionally hash) are in the order of the rows. The index is the
+    manifest of the ingested files: later runs only parse new or changed meshes, see plan_ingest.
+
+    :param folders: The folders holding the registered meshes
+    :param cache_dir: The directory of the ingest cache
+    :param num_workers: The number of workers parsing the meshes, see parse_meshes (default is 1)
+    :param executor: thread or process (default is thread)
+    :param num_vertices: The number of vertices of the template every mesh is checked against (default is None)
+    :param content_hash: Whether changes are detected by the sha1 of the files instead of their size and mtime, which
+                         reads every file (default is False)
+    :param dry_run: Only report what would change, the vertices returned are None (default is False)
+    :return: The read only memory mapped vertices and the index
+    """
+    vertices_file = os.path.join(cache_dir, 'vertices.npy')
+    index_file = os.path.join(cache_dir, 'index.json')
+    index, sources, new, changed, removed = plan_ingest(folders, cache_dir, content_hash)
+    if not index:
+        raise ValueError("No meshes found in " + ", ".join(folders))
+    if not new and not changed and not removed:
+        date_print("Using the ingest cache " + cache_dir + " of " + str(len(index)) + " meshes, nothing changed")
+    else:
+        date_print(("Would ingest " if dry_run else "Ingesting ") + str(len(new)) + " new and " + str(len(changed)) +
+                   " changed meshes into " + cache_dir + ", " + str(len(removed)) + " removed, " +
+                   str(len(index) - sources.count(None)) + " unchanged")
+    for label, paths in [("new", new), ("changed", changed), ("removed", removed)]:
+        for path in paths[:10] if dry_run else []:
+            hint_print(label + ": " + path)
+        if dry_run and len(paths) > 10:
+            hint_print("... and " + str(len(paths) - 10) + " more " + label)
+    if dry_run:
+        return None, index
+    if not new and not changed and not removed:
+        # the manifest is still updated, e.g. for touched files with an unchanged hash
+        write_index(index_file, index)
+        return np.load(vertices_file, mmap_mode='r'), index
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    parse_rows = [row for row, source in enumerate(sources) if source is None]
+    parse_paths = [index[row]["path"] for row in parse_rows]
+    if num_vertices is None:
+        # the store is preallocated, so the meshes are checked against the ingested ones or the first parsed one
+        num_vertices = np.load(vertices_file, mmap_mode='r').shape[1] if len(parse_rows) < len(index) else \
+            ply_reader.read_ply_header(parse_paths[0]).element("vertex")[1]
+    # a malformed mesh fails here, before the store or the index are touched
+    check_meshes(parse_paths, num_vertices)
+    parsed = parse_meshes(parse_paths, num_workers, executor, num_vertices=num_vertices)
+
+    if not new and not removed:
+        # only changed meshes, which are overwritten in place. Their entries are invalidated first, so that an
+        # interrupted run only parses them again
+        stale = set(parse_rows)
+        write_index(index_file, [invalidated(entry) if row in stale else entry for row, entry in enumerate(index)])
+        vertices = np.load(vertices_file, mmap_mode='r+')
+        for mesh_vertices, row in zip(parsed, parse_rows):
+            vertices[row] = mesh_vertices
+        vertices.flush()
+        del vertices
+        write_index(index_file, index)
+    else:
+        # the new store is built next to the old one and swapped in together with its index. An interruption in
+        # between leaves no index, which is never mistaken for a valid cache
+        temporary_file = rebuild_store(vertices_file, len(index), num_vertices, sources, parse_rows, parsed)
+        with open(index_file + '.tmp', 'w') as file:
+            json.dump(index, file)
+        if os.path.exists(index_file):
+            os.remove(index_file)
+        os.replace(temporary_file, vertices_file)
+        os.replace(index_file + '.tmp', index_file)
+    return np.load(vertices_file, mmap_mode='r'), index
+
+
+def path_order(index):
+    """
+    The rows of the index sorted by the paths of their meshes. The rows of the master vertices depend on the order the
+    meshes were ingested in, the splits are stored in an order of their meshes so that they do not depend on it.
+    """
+    return np.array(sorted(range(len(index)), key=lambda row: index[row]["path"]), dtype=np.int64)
+
+
+def frame_numbers(index):
+    """
+    The number of every frame within its sequence, e.g. 17 for bareteeth.000017, or its position in the sorted
+    sequence for a frame name without a number.
+    """
+    numbers = np.empty(len(index), dtype=np.int64)
+    positions = collections.Counter()
+    for row in path_order(index):
+        entry = index[row]
+        sequence = (entry["subject"], entry["expression"])
+        number = re.search(r'\d+$', entry["frame"])
+        numbers[row] = int(number.group()) if number else positions[sequence]
+        positions[sequence] += 1
+    return numbers
+
+
+def sliced_split(index, rule="index"):
+    """
+    Returns the train and test rows of the sliced time split, which tests 10 of every 100 consecutive meshes.
+
+    :param index: The index of the master vertices, see ingest
+    :param rule: index, the split of the original preprocessing, which counts all meshes in the order glob lists them
+                 (in which the rows are returned as well), or frame, which counts the frame numbers of each sequence,
+                 so that a mesh keeps its split when other meshes are added or removed (default is index)
+    """
+    if rule == "index":
+        rows = np.array(sorted(range(len(index)), key=lambda row: index[row]["position"]), dtype=np.int64)
+        test = np.array([index[row]["position"] for row in rows], dtype=np.int64) % 100 < 10
+    elif rule == "frame":
+        rows = path_order(index)
+        test = frame_numbers(index)[rows] % 100 < 10
+    else:
+        raise ValueError("Unknown sliced split rule " + rule + ", expected index or frame")
+    return rows[~test], rows[test]
+
+
+def crossval_split(index, key, value):
+    """
+    Returns the train and test rows of a cross validation split, which tests all meshes whose key (expression or
+    subject) equals value.
+    """
+    rows = path_order(index)
+    test = np.array([index[row][key] == value for row in rows], dtype=bool)
+    return rows[~test], rows[test]
+
+
+def split_key(index, train_rows, test_rows):
+    """
+    Identifies the content of a split by the paths and the hashes (or sizes and mtimes) of its train and test meshes.
+    """
+    def identity(entry):
+        return [entry["path"], entry["hash"]] if "hash" in entry else [entry["path"], entry["size"], entry["mtime"]]
+
+    key = [[identity(index[row]) for row in rows] for rows in [train_rows, test_rows]]
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def save_split(vertices, train_rows, test_rows, dataset_name, index=None, dry_run=False):
+    """
+    Stores the given rows of the master vertices as dataset_name/train.npy and dataset_name/test.npy. With the index,
+    the key of the split is stored in dataset_name/split.json and a split whose meshes did not change is skipped.
+
+    :param vertices: The master vertices, see ingest
+    :param train_rows: The rows of the training meshes
+    :param test_rows: The rows of the test meshes
+    :param dataset_name: The directory of the split
+    :param index: The index of the master vertices (default is None, the split is always stored)
+    :param dry_run: Only report whether the split would be stored (default is False)
+    """
+    key_file = os.path.join(dataset_name, 'split.json')
+    key = split_key(index, train_rows, test_rows) if index is not None else None
+    if key is not None and os.path.exists(key_file) and \
+            all(os.path.exists(os.path.join(dataset_name, name + ".npy")) for name in ["train", "test"]):
+        with open(key_file) as file:
+            if json.load(file)["key"] == key:
+                print("Up to date ... ", dataset_name)
+                return
+    if dry_run:
+        print("Would save ... ", dataset_name + " of size: ", len(train_rows), len(test_rows))
+        return
+
+    if not os.path.exists(dataset_name):
+        os.makedirs(dataset_name)
+    if os.path.exists(key_file):
+        os.remove(key_file)
+    for name, rows in [("train", train_rows), ("test", test_rows)]:
+        copy_rows(os.path.join(dataset_name, name + ".npy"), vertices, rows)
+        print("Saving ... ", os.path.join(dataset_name, name) + " of size: ", len(rows))
+    if key is not None:
+        with open(key_file, 'w') as file:
+            json.dump({"key": key}, file)
@@ -1,15 +1,18 @@
 import glob
 import os
 import numpy as np
-from psbody.mesh import Mesh, MeshViewer, MeshViewers
 import time
 from copy import deepcopy
 import random
 from sklearn.decomposition import PCA
-from tqdm import tqdm
+
+from data.prep import ingest
+from util import ply_reader
 
 class FaceData():
     def __init__ (self, nVal, train_file, test_file, reference_mesh_file, pca_n_comp=8, fitpca=False):
+        # psbody is only needed to show meshes, the preprocessing reads the meshes with ply_reader
+        from psbody.mesh import Mesh
         self.nVal = nVal
         self.train_file = train_file
         self.test_file = test_file
@@ -105,160 +108,43 @@ class FaceData():
         def get_normalized_meshes(self, mesh_paths):
             meshes = []
             for mesh_path in mesh_paths:
-                mesh = Mesh(filename=mesh_path)
-                mesh_v = (mesh.v - self.mean) / self.std
+                mesh_v = (ply_reader.read_ply_vertices(mesh_path, self.n_vertex) - self.mean) / self.std
             meshes.append(mesh_v)
             return np.array(meshes)
 
 def meshPlay(folder,every=100,wait=0.05):
-	files = glob.glob(folder+'/*')
+	from psbody.mesh import Mesh, MeshViewer
+	files = glob.glob(folder+'/*.ply')
 	files.sort()
 	files = files[-1000:]
+	# the registered meshes share the faces of the first one
+	first, faces = ply_reader.read_ply(files[0])
 	view = MeshViewer()
 	for i in range(0,len(files),every):
-		mesh = Mesh(filename=files[i])
+		mesh = Mesh(v=ply_reader.read_ply_vertices(files[i], len(first)), f=faces)
 		view.dynamic_meshes = [mesh]
 		time.sleep(wait)
 
-class MakeSlicedTimeDataset(object):
-	"""docstring for FaceMesh"""
-	def __init__(self, folders, dataset_name):
-		self.facial_motion_dirs = folders
-		self.dataset_name = dataset_name
-
-		self.train_datapaths = self.gather_paths("train")
-		self.test_datapaths = self.gather_paths("test")
-
-		self.train_vertices = self.gather_data(self.train_datapaths)
-		self.test_vertices = self.gather_data(self.test_datapaths)
-		self.save_vertices()
-
-	def gather_paths(self, opt):
-		datapaths = []
-		for i in range(len(self.facial_motion_dirs)):
-			print(self.facial_motion_dirs[i])
-			datapaths += glob.glob(self.facial_motion_dirs[i]+'/*/*/*.ply')
-
-		trainpaths = []
-		testpaths = []
-		for i in range(len(datapaths)):
-			if (i%100) < 10:
-				testpaths += [datapaths[i]]
-				#print(datapaths[i])
-			else:
-				trainpaths += [datapaths[i]]
-
-		if opt=="train":
-			print (opt+" data of size: ", len(trainpaths))
-			#print(trainpaths[:10])
-			return trainpaths
-		if opt=="test":
-			print (opt+" data of size: ", len(testpaths))
-			return testpaths
-
-	def gather_data(self, datapaths):
-		vertices = []
-		for p in tqdm(datapaths):
-			mesh_file = p
-			#print "Loading ", mesh_file
-			face_mesh = Mesh(filename=mesh_file)
-			#print "Loaded ", mesh_file
-			vertices.append(face_mesh.v)
-		return np.array(vertices)
-
-	def save_vertices(self):
-		if not os.path.exists(self.dataset_name):
-			os.makedirs(self.dataset_name)
-		np.save(self.dataset_name+'/train', self.train_vertices)
-		np.save(self.dataset_name+'/test', self.test_vertices)
-
-		print ("Saving ... ", self.dataset_name+'/train')
-		print ("Saving ... ", self.dataset_name+'/test')
-		return 0
-
-class MakeIdentityExpressionDataset(object):
-	"""docstring for FaceMesh"""
-	def __init__(self, folders, test_exp, dataset_name,crossval="expression", use_templates=0):
-		self.facial_motion_dirs = folders
-		self.dataset_name = dataset_name
-		self.test_exp = test_exp
-		self.crossval = crossval
-
-
-		self.train_datapaths = self.gather_paths("train")
-		self.test_datapaths = self.gather_paths("test")
-
-		self.train_vertices = self.gather_data(self.train_datapaths)
-		self.test_vertices = self.gather_data(self.test_datapaths)
-		self.save_vertices()
-
-	def gather_paths(self, opt):
-		datapaths = []
-		for i in range(len(self.facial_motion_dirs)):
-			print(self.facial_motion_dirs[i])
-			datapaths += glob.glob(self.facial_motion_dirs[i]+'/*/*/*.ply')
-
-		trainpaths = []
-		testpaths = []
-
-		if self.crossval=="expression":
-			path_flagger = -2
-		if self.crossval == "identity":
-			path_flagger = -3
-
-		for i in range(len(datapaths)):
-			p = datapaths[i]
-			if p.split('/')[path_flagger] == self.test_exp:
-				testpaths += [datapaths[i]]
-				#print(datapaths[i])
-			else:
-				trainpaths += [datapaths[i]]
-
-		if opt=="train":
-			print (opt+" data of size: ", len(trainpaths))
-			#print(trainpaths[:10])
-			return trainpaths
-		if opt=="test":
-			print (opt+" data of size: ", len(testpaths))
-			return testpaths
-
-	def gather_data(self, datapaths):
-		vertices = []
-		labels = []
-		for p in tqdm(datapaths):
-			mesh_file = p
-			#print "Loading ", mesh_file
-			face_mesh = Mesh(filename=mesh_file)
-			face_mesh_v = face_mesh.v
-			vertices.append(face_mesh_v)
-		return np.array(vertices)
-
-	def save_vertices(self):
-		if not os.path.exists(self.dataset_name):
-			os.makedirs(self.dataset_name)
-		np.save(self.dataset_name+'/train', self.train_vertices)
-		np.save(self.dataset_name+'/test', self.test_vertices)
-
-		print ("Saving ... ", self.dataset_name+'/train')
-		print ("Saving ... ", self.dataset_name+'/test')
-		return 0
-
-def generateSlicedTimeDataSet(data_path, save_path):
-	MakeSlicedTimeDataset(folders=[data_path], dataset_name=os.path.join(save_path, 'sliced'))
+def generateSlicedTimeDataSet(vertices, index, save_path, dry_run=False, rule="index"):
+	# the meshes are parsed once into the ingest cache, all splits are built from its index, see ingest.ingest
+	train_rows, test_rows = ingest.sliced_split(index, rule)
+	ingest.save_split(vertices, train_rows, test_rows, os.path.join(save_path, 'sliced'), index, dry_run)
 	return 0
 
-def generateExpressionDataSet(data_path, save_path):
+def generateExpressionDataSet(vertices, index, save_path, dry_run=False):
 	test_exps = ['bareteeth','cheeks_in','eyebrow','high_smile','lips_back','lips_up','mouth_down',
 				'mouth_extreme','mouth_middle','mouth_open','mouth_side','mouth_up']
 
 	for exp in test_exps:
-		fm = MakeIdentityExpressionDataset(folders=[data_path], test_exp=exp, dataset_name=os.path.join(save_path, exp), use_templates=0)
+		train_rows, test_rows = ingest.crossval_split(index, "expression", exp)
+		ingest.save_split(vertices, train_rows, test_rows, os.path.join(save_path, exp), index, dry_run)
 
-def generateIdentityDataset(data_path, save_path):
+def generateIdentityDataset(vertices, index, save_path, dry_run=False):
 	test_ids = ['FaceTalk_170725_00137_TA',  'FaceTalk_170731_00024_TA',  'FaceTalk_170811_03274_TA',
 	  			'FaceTalk_170904_00128_TA',  'FaceTalk_170908_03277_TA',  'FaceTalk_170913_03279_TA',
 				'FaceTalk_170728_03272_TA',  'FaceTalk_170809_00138_TA',  'FaceTalk_170811_03275_TA',
 				'FaceTalk_170904_03276_TA',  'FaceTalk_170912_03278_TA',  'FaceTalk_170915_00223_TA']
 
 	for ids in test_ids:
-		fm = MakeIdentityExpressionDataset(folders=[data_path], test_exp=ids, dataset_name=os.path.join(save_path,ids), crossval="identity", use_templates=0)
+		train_rows, test_rows = ingest.crossval_split(index, "subject", ids)
+		ingest.save_split(vertices, train_rows, test_rows, os.path.join(save_path, ids), index, dry_run)
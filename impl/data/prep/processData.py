@@ -1,23 +1,47 @@
 import argparse
 import os
 from data.prep.objectmesh import *
+from data.prep import ingest
+from util import ply_reader
 
 parser = argparse.ArgumentParser(description="Preprocessing data for CoMA")
 
 parser.add_argument('--source', dest='source', type=str, required=True, help='path to the data directory')
 parser.add_argument('--destination', dest='destination', type= str, required=True, default='source', help='path where the processed data will be saved')
+parser.add_argument('--num-workers', type=int, default=os.cpu_count(),
+                    help='The number of workers parsing the meshes in parallel (default is the number of cpus)')
+parser.add_argument('--template-mesh', default='data/template.obj',
+                    help='The template every registered mesh is checked to have the vertex count of (default is '
+                         'data/template.obj)')
+parser.add_argument('--executor', default='thread', choices=['thread', 'process'],
+                    help='Whether the meshes are parsed on threads or processes (default is thread)')
+parser.add_argument('--hash', action='store_true',
+                    help='Detect changed meshes by the sha1 of their content instead of their size and modification '
+                         'time, which reads every file (default is False)')
+parser.add_argument('--sliced-split', default='index', choices=['index', 'frame'],
+                    help='index tests 10 of every 100 meshes in the order they are listed, as the original split, '
+                         'frame tests 10 of every 100 frame numbers of each sequence, which keeps the split of a mesh '
+                         'when other meshes are added or removed (default is index)')
+parser.add_argument('--dry-run', action='store_true',
+                    help='Only report the new, changed and removed meshes and the splits which would be regenerated '
+                         '(default is False)')
 
 def main():
     args = parser.parse_args()
     destination_path = args.destination
-    if not os.path.exists(destination_path):
+    num_vertices = ply_reader.template_vertex_count(args.template_mesh)
+    if not os.path.exists(destination_path) and not args.dry_run:
         os.makedirs(destination_path)
 
+    # the meshes are parsed once, both datasets are built from the same ingest cache
+    vertices, index = ingest.ingest([args.source], os.path.join(destination_path, 'ingest'), args.num_workers,
+                                    args.executor, num_vertices, args.hash, args.dry_run)
+
     print("Preprocessing Slice Time Data")
-    generateSlicedTimeDataSet(args.source, destination_path)
+    generateSlicedTimeDataSet(vertices, index, destination_path, args.dry_run, args.sliced_split)
 
     print("preprocessing Expression Cross Validation")
-    generateExpressionDataSet(args.source, destination_path)
+    generateExpressionDataSet(vertices, index, destination_path, args.dry_run)
 
 if __name__  == '__main__':
     main()
\ No newline at end of file
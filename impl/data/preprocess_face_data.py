@@ -1,5 +1,6 @@
 import os
 from data.prep.objectmesh import *
+from data.prep import ingest
 
 SOURCE = "/media/oole/Storage/Msc/example-data/registered-data/COMA_data"
 DESTINATION = "/media/oole/Storage/Msc/processed-data"
@@ -9,11 +10,14 @@ def main():
     if not os.path.exists(DESTINATION):
         os.makedirs(DESTINATION)
 
+    # the meshes are parsed once, both datasets are built from the same ingest cache
+    vertices, index = ingest.ingest([SOURCE], os.path.join(DESTINATION, 'ingest'), num_workers=os.cpu_count())
+
     print("Preprocessing Slice Time Data")
-    generateSlicedTimeDataSet(SOURCE, DESTINATION)
+    generateSlicedTimeDataSet(vertices, index, DESTINATION)
 
     print("preprocessing Expression Cross Validation")
-    generateExpressionDataSet(SOURCE, DESTINATION)
+    generateExpressionDataSet(vertices, index, DESTINATION)
 
 if __name__  == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from util.log_util import date_print
+
+# the size of the blocks at the beginning and the end of a file hashed for its key
+hash_block_size = 2 ** 20
+
+
+def file_key(path):
+    """
+    Identifies the content of a dataset file by its size, modification time and a hash of its first and last block,
+    without reading the whole file.
+    """
+    stat = os.stat(path)
+    content_hash = hashlib.sha1()
+    with open(path, 'rb') as file:
+        content_hash.update(file.read(hash_block_size))
+        if stat.st_size > hash_block_size:
+            file.seek(max(hash_block_size, stat.st_size - hash_block_size))
+            content_hash.update(file.read())
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime,
+            "hash": content_hash.hexdigest()}
+
+
+def streaming_statistics(shards, chunk_size=64):
+    """
+    Computes the mean and standard deviation over the first axis of the given shards in a single pass, chunk by chunk.
+    The statistics of each chunk are merged into the running ones with the parallel variant of Welford's algorithm
+    (Chan et al.), which is numerically stable and only ever holds a single float64 chunk in memory.
+
+    :param shards: A list of (memory mapped) arrays of the same shape apart from the first axis
+    :param chunk_size: The number of samples per chunk
+    :return: The number of samples, the mean and the standard deviation as float64
+    """
+    count = 0
+    mean = np.zeros(shards[0].shape[1:], dtype=np.float64)
+    m2 = np.zeros(shards[0].shape[1:], dtype=np.float64)
+    for shard in shards:
+        for start in range(0, shard.shape[0], chunk_size):
+            chunk = np.array(shard[start:start + chunk_size], dtype=np.float64)
+            chunk_count = chunk.shape[0]
+            chunk_mean = np.mean(chunk, axis=0)
+            chunk -= chunk_mean
+            chunk_m2 = np.einsum('i...,i...->...', chunk, chunk)
+
+            delta = chunk_mean - mean
+            total = count + chunk_count
+            mean += delta * (chunk_count / total)
+            m2 += chunk_m2 + np.square(delta) * (count * chunk_count / total)
+            count = total
+    return count, mean, np.sqrt(m2 / count)
+
+
+def sidecar_path(path):
+    """
+    The statistics of a dataset file are cached next to it, e.g. data/sliced/train_statistics.npz
+    """
+    return os.path.splitext(path)[0] + "_statistics.npz"
+
+
+def cached_statistics(files, sidecar=None, chunk_size=64):
+    """
+    Returns the mean and standard deviation over all samples of the given dataset files as float32. They are read from
+    the sidecar file if it matches the size, modification time and hash of every file, otherwise they are computed by
+    streaming_statistics over the memory mapped files and stored in the sidecar.
+
+    :param files: A dataset file, e.g. train.npy, or a list of shards
+    :param sidecar: The sidecar file (default is next to the first file, see sidecar_path)
+    :param chunk_size: The number of samples per chunk
+    """
+    files = [files] if isinstance(files, str) else list(files)
+    sidecar = sidecar if sidecar is not None else sidecar_path(files[0])
+    key = json.dumps([file_key(path) for path in files], sort_keys=True)
+
+    if os.path.exists(sidecar):
+        with np.load(sidecar) as cached:
+            if str(cached["key"]) == key:
+                return cached["mean"], cached["std"]
+
+    date_print("Computing the statistics of " + ", ".join(files))
+    count, mean, std = streaming_statistics([np.load(path, mmap_mode='r') for path in files], chunk_size=chunk_size)
+    mean = mean.astype(np.float32)
+    std = std.astype(np.float32)
+    # written to a temporary file first, so that an interrupted or concurrent run leaves no broken sidecar
+    temporary = sidecar + "." + str(os.getpid()) + ".tmp.npz"
+    np.savez(temporary, mean=mean, std=std, count=count, key=np.array(key))
+    os.replace(temporary, sidecar)
+    return mean, std
@@ -0,0 +1,137 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import subprocess
+
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Runs data parallel training with main.py on several worker processes. "
+                                             "Arguments after -- are passed on to main.py, e.g. "
+                                             "python distributed.py --num-workers 2 -- --name run --data-dir data/sliced")
+parser.add_argument("--num-workers", type=int, default=2, help="The number of workers per host (default is 2)")
+parser.add_argument("--hosts", default="localhost",
+                    help="Comma separated list of the hosts of the cluster, the launcher is started on each of them "
+                         "(default is localhost)")
+parser.add_argument("--host-index", type=int, default=0,
+                    help="The index of this host in the list of hosts (default is 0)")
+parser.add_argument("--port", type=int, default=23456,
+                    help="The port of the first worker on each host, further workers use the following ports "
+                         "(default is 23456)")
+parser.add_argument("--no-pinning", action="store_true",
+                    help="Do not pin the workers to NUMA nodes (default is False)")
+parser.add_argument("--scaling", action="store_true",
+                    help="Measure the training throughput with 1, 2, 4, ... up to --num-workers local workers and "
+                         "report the scaling efficiency (default is False)")
+
+
+def numa_nodes():
+    """
+    Returns the cpus of each NUMA node, or all cpus of the process as single node if there is no NUMA information.
+    """
+    nodes = []
+    for node in sorted(glob.glob("/sys/devices/system/node/node[0-9]*"), key=lambda path: int(path.split("node")[-1])):
+        with open(node + "/cpulist") as file:
+            cpus = set()
+            for part in file.read().strip().split(","):
+                if part:
+                    first, _, last = part.partition("-")
+                    cpus.update(range(int(first), int(last or first) + 1))
+        cpus &= os.sched_getaffinity(0)
+        if cpus:
+            nodes.append((int(node.split("node")[-1]), sorted(cpus)))
+    if not nodes:
+        nodes = [(None, sorted(os.sched_getaffinity(0)))]
+    return nodes
+
+
+def worker_pinning(num_workers):
+    """
+    Assigns the local workers round robin to the NUMA nodes. Workers sharing a node get disjoint parts of its cpus.
+
+    :return: The NUMA node and the cpus of each worker
+    """
+    nodes = numa_nodes()
+    pinning = []
+    for worker in range(num_workers):
+        node, cpus = nodes[worker % len(nodes)]
+        num_sharing = len(range(worker % len(nodes), num_workers, len(nodes)))
+        share = worker // len(nodes)
+        part = cpus[share * len(cpus) // num_sharing:(share + 1) * len(cpus) // num_sharing]
+        pinning.append((node, part if part else cpus))
+    return pinning
+
+
+def launch(num_workers, hosts, host_index, port, pin, main_args):
+    """
+    Starts the local workers of this host with a TF_CONFIG describing the whole cluster and waits for them.
+
+    :return: Whether all workers succeeded
+    """
+    cluster = {"worker": [host + ":" + str(port + i) for host in hosts for i in range(num_workers)]}
+    pinning = worker_pinning(num_workers) if pin else [(None, None)] * num_workers
+    numactl = shutil.which("numactl")
+
+    processes = []
+    for local_index, (node, cpus) in enumerate(pinning):
+        rank = host_index * num_workers + local_index
+        environment = dict(os.environ)
+        environment["TF_CONFIG"] = json.dumps({"cluster": cluster, "task": {"type": "worker", "index": rank}})
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")] + main_args
+        preexec_fn = None
+        if node is not None and numactl is not None:
+            # binds the memory to the node as well
+            command = [numactl, "--cpunodebind=" + str(node), "--membind=" + str(node)] + command
+        elif cpus is not None:
+            preexec_fn = (lambda cpus: lambda: os.sched_setaffinity(0, cpus))(cpus)
+        date_print("Starting worker " + str(rank) + (" on NUMA node " + str(node) if node is not None else "") +
+                   (" pinned to cpus " + str(cpus[0]) + "-" + str(cpus[-1]) if cpus else ""))
+        processes.append(subprocess.Popen(command, env=environment, preexec_fn=preexec_fn))
+
+    return all([process.wait() == 0 for process in processes])
+
+
+def measure_scaling(args, main_args):
+    """
+    Trains with 1, 2, 4, ... local workers and reports the throughput and scaling efficiency.
+    """
+    worker_counts = [2 ** i for i in range(args.num_workers.bit_length()) if 2 ** i < args.num_workers]
+    worker_counts.append(args.num_workers)
+    throughput = dict()
+    for num_workers in worker_counts:
+        throughput_file = "throughput-" + str(num_workers) + ".json"
+        if not launch(num_workers, ["localhost"], 0, args.port, not args.no_pinning,
+                      main_args + ["--throughput-file", throughput_file]):
+            date_print("Training with " + str(num_workers) + " workers failed")
+            return
+        with open(throughput_file) as file:
+            throughput[num_workers] = json.load(file)["samples_per_second"]
+        os.remove(throughput_file)
+
+    for num_workers in worker_counts:
+        efficiency = throughput[num_workers] / (num_workers * throughput[1])
+        date_print(str(num_workers).rjust(3) + " workers -- " + "{:.1f}".format(throughput[num_workers]) +
+                   " samples/s -- speedup: " + "{:.2f}".format(throughput[num_workers] / throughput[1]) + "x" +
+                   " -- scaling efficiency: " + "{:.0%}".format(efficiency))
+
+
+def main():
+    argv = sys.argv[1:]
+    main_args = []
+    if "--" in argv:
+        main_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    args = parser.parse_args(argv)
+    main_args = main_args + ["--mode", "train"]
+
+    if args.scaling:
+        measure_scaling(args, main_args)
+    elif not launch(args.num_workers, args.hosts.split(","), args.host_index, args.port, not args.no_pinning,
+                    main_args):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
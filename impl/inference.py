@@ -0,0 +1,55 @@
+import os
+import glob
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from util import ply_reader
+from util.log_util import date_print
+
+parser = argparse.ArgumentParser(description="Runs an exported CoMA model (see main.py --mode export) on vertices or "
+                                             "latent vectors stored as .npy")
+parser.add_argument("--export-dir", required=True, help="The directory of the exported SavedModel")
+parser.add_argument("--input", required=True,
+                    help="The .npy file holding the de-normalized vertices [N, V, 3], or latent vectors [N, L] for "
+                         "decode, or a .ply mesh or a directory of .ply meshes")
+parser.add_argument("--template-mesh", default=None,
+                    help="The template the vertex count of the .ply meshes is checked against (default is None)")
+parser.add_argument("--output", required=True, help="The .npy file the result is written to")
+parser.add_argument("--signature", default="reconstruct", help="The signature to run encode|decode|reconstruct "
+                                                               "(default is reconstruct)")
+parser.add_argument("--batch-size", type=int, default=64, help="The batch size to be used (default is 64)")
+
+
+def load_inputs(path, template_mesh=None):
+    """
+    Loads the inputs from a .npy file, a .ply mesh or a directory of .ply meshes (in sorted order) as float32.
+    """
+    if path.endswith(".npy"):
+        return np.load(path).astype('float32')
+    paths = sorted(glob.glob(os.path.join(path, "*.ply"))) if os.path.isdir(path) else [path]
+    num_vertices = ply_reader.template_vertex_count(template_mesh) if template_mesh is not None else None
+    return np.stack([ply_reader.read_ply_vertices(mesh_path, num_vertices) for mesh_path in paths])
+
+
+def main():
+    args = parser.parse_args()
+    start = time.time()
+    signature = tf.saved_model.load(args.export_dir).signatures[args.signature]
+    date_print("Loaded " + args.export_dir + " in " + "{:.3f}".format(time.time() - start) + "s")
+
+    inputs = load_inputs(args.input, args.template_mesh)
+    input_name = "latent" if args.signature == "decode" else "vertices"
+    output_name = "latent" if args.signature == "encode" else "vertices"
+
+    start = time.time()
+    results = [signature(**{input_name: tf.constant(inputs[i:i + args.batch_size])})[output_name].numpy()
+               for i in range(0, inputs.shape[0], args.batch_size)]
+    date_print("Ran " + args.signature + " on " + str(inputs.shape[0]) + " samples in " +
+               "{:.3f}".format(time.time() - start) + "s")
+    np.save(args.output, np.concatenate(results))
+
+
+if __name__ == '__main__':
+    main()
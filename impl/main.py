@@ -3,22 +3,7 @@ import json
 import numpy as np
 import argparse
 
-from util import mesh_sampling, mesh_util, latent_magic
 from util.log_util import date_print
-from psbody.mesh import MeshViewers, Mesh
-from data import meshdata
-import util.graph_util as graph
-from model.model import coma_ae
-import model.model_util as model_util
-from tensorflow import keras
-import tensorflow as tf
-import model.tboard as tboard
-
-## experimental config for memory growth on tf with gpu
-physical_devices = tf.config.list_physical_devices('GPU')
-tf.config.experimental.set_memory_growth(physical_devices[0], True)
-# prevent information messages from tensorflow (such as "cuda loaded" etc)
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
 parser = argparse.ArgumentParser(description="Convolutional Mesh Autoencoder written for Tensorflow 2")
 parser.add_argument("--name", default="coma-model-sliced",
@@ -34,7 +19,7 @@ parser.add_argument("--validation-frequency", type=int, default=10, help="The va
 parser.add_argument("--learning-rate", type=float, default=8e-3, help="The learning rate (default is 8e-3)")
 parser.add_argument("--random-seed", type=int, default=2, help="The random seed (default is 8)")
 parser.add_argument("--template-mesh", default="data/template.obj", help="Path to the template mesh (default is data/template.obj)")
-parser.add_argument("--mode", default="sample", help="The mode to run in train|test|latent (default is train)")
+parser.add_argument("--mode", default="sample", help="The mode to run in train|test|latent|export (default is train)")
 parser.add_argument("--sanity-check", type=bool, default=False, help="Whether or not sanity check should be performed (default is False)")
 parser.add_argument("--coma-model-dir", default="coma-model",
                     help="The directory holding checkpoints and tensorboard, such as coma-model/tensorboard or coma-model/checkpoint (default is coma-model)")
@@ -43,12 +28,86 @@ parser.add_argument("--visualize-during-training", type=bool, default=False,
 parser.add_argument("--page-through", type=bool, default=False,
                     help="Whether the test meshes should be opened in an interactive session (default is False)")
 parser.add_argument("--result-dir", default="results", help="The results directory for the tests (default is results)")
+parser.add_argument("--export-dir", default=None,
+                    help="The directory the SavedModel is written to in export mode (default is "
+                         "<coma-model-dir>/export/<name>)")
+parser.add_argument("--vertex-major", action="store_true",
+                    help="Keep the activations in vertex major layout between the blocks, which avoids transposes in "
+                         "every layer (default is False)")
+parser.add_argument("--dense-threshold", default="100",
+                    help="Levels with at most this many vertices compute the Chebyshev filters with precomputed dense "
+                         "polynomials, auto benchmarks both strategies per level (default is 100)")
+parser.add_argument("--jit", action="store_true",
+                    help="Compile the train step, prediction, encode and decode with XLA (default is False)")
+parser.add_argument("--mixed-precision", action="store_true",
+                    help="Run the activations and Chebyshev bases in bfloat16, weights, optimizer state and loss stay "
+                         "in float32 (default is False)")
+parser.add_argument("--xla-cache-dir", default=None,
+                    help="The persistent XLA compilation cache, which saves the compile time on later runs (default "
+                         "is <coma-model-dir>/xla-cache)")
+parser.add_argument("--checkpoint-levels", default="",
+                    help="Comma separated levels of the mesh pyramid, e.g. 0, whose Chebyshev filters recompute their "
+                         "basis in the backward pass instead of storing it, which allows larger batch sizes "
+                         "(default is none)")
+parser.add_argument("--basis-cache", default=None, choices=["float32", "bfloat16"],
+                    help="Train the first layer on the Chebyshev basis of the training vertices, computed once and "
+                         "stored in the given dtype next to train.npy (default is None, not used with several "
+                         "workers)")
+parser.add_argument("--mmap", action="store_true",
+                    help="Memory map train.npy and test.npy instead of reading them, the training vertices are "
+                         "normalized per batch (default is False)")
+parser.add_argument("--shuffle-buffer", type=int, default=None,
+                    help="The size of the shuffle buffer of the training indices, smaller buffers shuffle less "
+                         "thoroughly (default is the number of training samples)")
+parser.add_argument("--save-meshes", default=None, choices=["ply", "obj"],
+                    help="Write the de-normalized predictions of the test modes as meshes of the given format to "
+                         "<result-dir>/<name>/ (default is None)")
+parser.add_argument("--throughput-file", default=None,
+                    help="A json file the training throughput is written to, used by distributed.py (default is None)")
 
 args = parser.parse_args()
 
+if args.jit:
+    # TF_XLA_FLAGS is parsed once when tensorflow is loaded, so it has to be set before tensorflow and the modules
+    # using it are imported
+    xla_cache_dir = args.xla_cache_dir if args.xla_cache_dir is not None else args.coma_model_dir + "/xla-cache"
+    if not os.path.exists(xla_cache_dir):
+        os.makedirs(xla_cache_dir)
+    os.environ["TF_XLA_FLAGS"] = (os.environ.get("TF_XLA_FLAGS", "") +
+                                  " --tf_xla_persistent_cache_directory=" + xla_cache_dir).strip()
+    date_print("XLA compilation enabled, caching compiled programs in " + xla_cache_dir)
+
+from util import mesh_sampling, mesh_util, latent_magic
+from psbody.mesh import MeshViewers, Mesh
+from data import meshdata, basis_cache
+from model.model import coma_ae
+from model import graph_operators, export
+import model.model_util as model_util
+from tensorflow import keras
+import tensorflow as tf
+import model.tboard as tboard
+
+## experimental config for memory growth on tf with gpu
+physical_devices = tf.config.list_physical_devices('GPU')
+for physical_device in physical_devices:
+    tf.config.experimental.set_memory_growth(physical_device, True)
+# prevent information messages from tensorflow (such as "cuda loaded" etc)
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+# data parallel training on several workers, which are described by TF_CONFIG, see distributed.py
+# the strategy has to be created before any other tensorflow operation
+if "TF_CONFIG" in os.environ:
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    rank = json.loads(os.environ["TF_CONFIG"])["task"]["index"]
+else:
+    strategy = tf.distribute.get_strategy()
+    rank = 0
+num_workers = strategy.num_replicas_in_sync
+
 # Set parsed arguments
 run_name = args.name
-date_print("STARTING IN MODE: " + args.mode)
+date_print("STARTING IN MODE: " + args.mode + (" (worker " + str(rank) + " of " + str(num_workers) + ")"
+                                               if num_workers > 1 else ""))
 np.random.seed(args.random_seed)
 num_latent = args.latent_vector_length
 batch_size = args.batch_size
@@ -102,13 +161,9 @@ if not os.path.exists("computed/meshes-save.npy"):
     np.save("computed/upsampling_matrices-save.npy", upsampling_matrices)
 else:
     meshes = np.load("computed/meshes-save.npy", allow_pickle=True)
-    adjecency_matrices = np.load("computed/adjecency_matrcies-save.npy", allow_pickle=True)
-    downsampling_matrices = np.load("computed/downsampling_matrices-save.npy", allow_pickle=True)
-    upsampling_matrices = np.load("computed/upsampling_matrices-save.npy", allow_pickle=True)
 
-adjecency_matrices = [x.astype('float32') for x in adjecency_matrices]  # convertType(adjecency_matrices)
-downsampling_matrices = [x.astype('float32') for x in downsampling_matrices]
-upsampling_matrices = [x.astype('float32') for x in upsampling_matrices]
+adjecency_matrices, downsampling_matrices, upsampling_matrices = graph_operators.load_transformation_matrices(
+    "computed")
 p = [x.shape[0] for x in adjecency_matrices]
 
 # A: 5023x5023, 1256x1256, 314x314, 79x79, 20x20
@@ -116,38 +171,47 @@ p = [x.shape[0] for x in adjecency_matrices]
 # U: 5023x1256, 1256x314, 314x79, 79x20
 # p: 5023, 1256, 314, 79, 20
 
-# L Computed graph laplacians, computed for adjencency matrices a in A
-L_1 = graph.laplacian(list(adjecency_matrices)[0])
-laplacians = [graph.laplacian(matrix) for matrix in adjecency_matrices]
-# L same dimensions as adjecency_matrices
+if args.mixed_precision:
+    date_print("Using bfloat16 mixed precision")
+    keras.mixed_precision.set_global_policy("mixed_bfloat16")
+compute_dtype = keras.mixed_precision.global_policy().compute_dtype
+
+# L Computed graph laplacians, computed for adjencency matrices a in A, rescaled and shared with the sampling
+# operators by all layers on the same level
+date_print("Building graph operators")
+if args.dense_threshold == "auto":
+    operators = graph_operators.GraphOperators(adjecency_matrices, downsampling_matrices, upsampling_matrices,
+                                               xla=args.jit, dtype=compute_dtype, cache_csr=args.mode != "export")
+    operators.tune_strategies(K=max(polynom_orders), num_columns=batch_size * max(num_features))
+else:
+    operators = graph_operators.GraphOperators(adjecency_matrices, downsampling_matrices, upsampling_matrices,
+                                               dense_threshold=int(args.dense_threshold), xla=args.jit,
+                                               dtype=compute_dtype, cache_csr=args.mode != "export")
+operators.report()
+
+checkpoint_levels = [int(level) for level in args.checkpoint_levels.split(",") if level]
+if args.mode == "train":
+    model_util.report_activation_memory(p, batch_size, num_features, polynom_orders,
+                                        checkpoint_levels=checkpoint_levels,
+                                        num_latent=num_latent,
+                                        dtype_size=2 if args.mixed_precision else 4)
 # ----- Read dataset
 
 mesh_data = meshdata.MeshData(number_val=100, train_file=base_data_folder + '/train.npy',
                               test_file=base_data_folder + '/test.npy',
-                              reference_mesh_file=template_mesh_path)
+                              reference_mesh_file=template_mesh_path,
+                              mmap_mode='r' if args.mmap else None,
+                              lazy_normalization=args.mmap)
 
-x_train = mesh_data.vertices_train.astype('float32')
-x_val = mesh_data.vertices_val.astype('float32')
-x_test = mesh_data.vertices_test.astype('float32')
+# the vertices are float32 already, with --mmap the training vertices are normalized per batch
+x_train = mesh_data.vertices_train
+x_val = mesh_data.vertices_val[:]
+x_test = mesh_data.vertices_test[:]
 
 num_train = x_train.shape[0]
 date_print("Training shape:   \t" + str(x_train.shape))
 date_print("Validation shape: \t" + str(x_val.shape))
 date_print("Test shape:       \t" + str(x_test.shape))
-
-x_train_cut = (x_train.shape[0] % batch_size)
-if x_train_cut > 0:
-    x_train = x_train[:-x_train_cut]
-x_val_cut = (x_val.shape[0] % batch_size)
-if x_val_cut > 0:
-    x_val = x_val[:-x_val_cut]
-x_test_cut = (x_test.shape[0] % batch_size)
-if x_test_cut > 0:
-    x_test = x_test[:-x_test_cut]
-    
-date_print("Training shape:   \t" + str(x_train.shape))
-date_print("Validation shape: \t" + str(x_val.shape))
-date_print("Test shape:       \t" + str(x_test.shape))
 # ----- Parse Parameters
 parameters = dict()
 # Training configuration
@@ -156,25 +220,46 @@ num_input_features = int(x_train.shape[-1])
 # Training parameters and regularization:
 decay_rate = 0.99  # done
 momentum = 0.9  # done
-decay_steps = num_train / batch_size  # done
+decay_steps = num_train / (batch_size * num_workers)  # done
 regularization = 5e-4
 
 # Model configuration
 # model = models.coma(L=L, D=D, U=U, **parameters)
-coma_model = coma_ae(num_input_features=num_input_features,
-                     num_features=num_features,
-                     laplacians=laplacians,
-                     downsampling_transformations=downsampling_matrices,
-                     upsampling_transformations=upsampling_matrices,
-                     Ks=polynom_orders,
-                     num_latent=num_latent, batch_size=batch_size,
-                     regularization=regularization)
-
-coma_model.compile(loss=keras.losses.MeanAbsoluteError(reduction=keras.losses.Reduction.SUM_OVER_BATCH_SIZE),
-                   optimizer=keras.optimizers.SGD(
-                       learning_rate=model_util.get_learning_rate_decay_schedule(learning_rate, decay_rate,
-                                                                                 decay_steps),
-                       momentum=momentum), metrics=[keras.metrics.MeanAbsoluteError()])
+with strategy.scope():
+    coma_model = coma_ae(num_input_features=num_input_features,
+                         num_features=num_features,
+                         operators=operators,
+                         Ks=polynom_orders,
+                         num_latent=num_latent,
+                         regularization=regularization,
+                         vertex_major=args.vertex_major,
+                         jit_compile=args.jit,
+                         checkpoint_levels=checkpoint_levels,
+                         basis_input=args.mode == "train" and num_workers == 1 and args.basis_cache is not None)
+
+    loss = keras.losses.MeanAbsoluteError(reduction=keras.losses.Reduction.SUM_OVER_BATCH_SIZE)
+    coma_model.compile(loss=loss,
+                       optimizer=keras.optimizers.SGD(
+                           learning_rate=model_util.get_learning_rate_decay_schedule(learning_rate, decay_rate,
+                                                                                     decay_steps),
+                           momentum=momentum), metrics=[keras.metrics.MeanAbsoluteError()],
+                       jit_compile=args.jit)
+
+if args.jit:
+    def train_step(x):
+        with tf.GradientTape() as tape:
+            step_loss = loss(x, coma_model(x, training=True)) + tf.add_n(coma_model.losses)
+        return tape.gradient(step_loss, coma_model.trainable_variables)
+
+
+    x_example = x_train[:batch_size]
+    coma_model(x_example)
+    model_util.report_xla_support("Train step", train_step, x_example)
+    model_util.report_xla_support("Encode", coma_model.encoder, x_example)
+    model_util.report_xla_support("Decode", coma_model.decoder, coma_model.encoder(x_example))
+
+throughput_callback = tboard.ThroughputCallback(mode="xla" if args.jit else "graph",
+                                                log_dir=tensorboard_dir if args.mode == "train" and rank == 0 else None)
 
 if os.path.exists(load_checkpoint) and len(os.listdir(load_checkpoint)) > 1:
     date_print("Loading model checkpoint")
@@ -183,38 +268,43 @@ if os.path.exists(load_checkpoint) and len(os.listdir(load_checkpoint)) > 1:
 # mesh_util.pageThroughMeshes(mesh_data.vertices_train.astype('float32'), mesh_data)
 
 if args.mode == "train":
-    # store parameters
-    parameter_dir = base_coma_model_dir + "/model-parameters"
-    if not os.path.exists(parameter_dir):
-        os.makedirs(parameter_dir)
-    parameter_file = parameter_dir + "/" + args.name + "_parameters.json"
-    with open(parameter_file, 'w') as file:
-        save_params = dict()
-        save_params['batch_size'] = args.batch_size
-        save_params['name'] = args.name
-        save_params['num_epochs'] = args.num_epochs
-        save_params['validation-frequency'] = args.validation_frequency
-        save_params['num_filters'] = num_features
-        save_params["polynom-orders"] = polynom_orders
-        save_params['random-seed'] = args.random_seed
-        save_params['learning-rate'] = args.learning_rate
-        save_params['decay-steps'] = decay_steps
-        save_params['decay-rate'] = decay_rate
-        save_params['momentum'] = momentum
-        save_params['regularization'] = regularization
-        save_params['num-latent'] = num_latent
-        save_params['data-folder'] = base_data_folder
-        date_print(str(save_params))
-        json.dump(save_params, file)
+    if rank == 0:
+        # store parameters
+        parameter_dir = base_coma_model_dir + "/model-parameters"
+        if not os.path.exists(parameter_dir):
+            os.makedirs(parameter_dir)
+        parameter_file = parameter_dir + "/" + args.name + "_parameters.json"
+        with open(parameter_file, 'w') as file:
+            save_params = dict()
+            save_params['batch_size'] = args.batch_size
+            save_params['name'] = args.name
+            save_params['num_epochs'] = args.num_epochs
+            save_params['validation-frequency'] = args.validation_frequency
+            save_params['num_filters'] = num_features
+            save_params["polynom-orders"] = polynom_orders
+            save_params['random-seed'] = args.random_seed
+            save_params['learning-rate'] = args.learning_rate
+            save_params['decay-steps'] = decay_steps
+            save_params['decay-rate'] = decay_rate
+            save_params['momentum'] = momentum
+            save_params['regularization'] = regularization
+            save_params['num-latent'] = num_latent
+            save_params['mixed-precision'] = args.mixed_precision
+            save_params['num-workers'] = num_workers
+            save_params['data-folder'] = base_data_folder
+            date_print(str(save_params))
+            json.dump(save_params, file)
+    # all workers take part in saving, keras only keeps the checkpoint of worker 0
     save_callback = keras.callbacks.ModelCheckpoint(filepath=save_checkpoint + "/coma_model",
                                                     save_weights_only=True,
                                                     monitor='loss',
                                                     save_best_only=False,
                                                     verbose=1)
+    callbacks = [save_callback, throughput_callback]
+    if rank == 0:
+        callbacks.append(keras.callbacks.TensorBoard(log_dir=tensorboard_dir))
 
-    tensorboard_callback = keras.callbacks.TensorBoard(log_dir=tensorboard_dir)
-
-    if args.visualize_during_training:
+    if args.visualize_during_training and rank == 0:
         tensorboard_mesh_indices = [0, 82, 94, 109, 159, 227, 342, 373, 454, 553, 591, 617, 747, 880, 980, 1008, 1079,
                                     1223,
                                     1524, 1642, 1780, 1807, 1973, 2029, 2155, 2202, 2381, 2459, 2544, 2631, 2766, 2902,
@@ -226,36 +316,61 @@ if args.mode == "train":
         mesh_callback = tboard.MeshCallback(tb_meshes=tensorboard_meshes, template_mesh=template_mesh,
                                             batch_size=batch_size,
                                             log_dir=tensorboard_dir, mesh_data=mesh_data)
-
-        coma_model.fit(x_train, x_train,
-                       batch_size=batch_size,
+        callbacks.append(mesh_callback)
+
+    if num_workers > 1:
+        # each worker trains on its own shard of equal size, so that all workers run the same number of steps
+        shard_size = num_train // num_workers
+        x_shard = x_train[rank * shard_size:(rank + 1) * shard_size]
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+        train_dataset = tf.data.Dataset.from_tensor_slices((x_shard, x_shard)).shuffle(
+            shard_size, seed=args.random_seed + rank).batch(batch_size).with_options(options)
+        val_dataset = tf.data.Dataset.from_tensor_slices((x_val, x_val)).batch(batch_size).with_options(options)
+        date_print("Worker " + str(rank) + " trains on " + str(shard_size) + " samples, global batch size " +
+                   str(batch_size * num_workers))
+        coma_model.fit(train_dataset,
                        epochs=num_epochs,
-                       shuffle=True,
                        validation_freq=validation_frequency,
-                       validation_data=(x_val, x_val), callbacks=[save_callback, tensorboard_callback, mesh_callback],
+                       validation_data=val_dataset,
+                       callbacks=callbacks,
+                       initial_epoch=initial_epoch)
+    elif args.basis_cache is not None:
+        # the first layer consumes the cached Chebyshev basis of the training vertices instead of expanding them
+        basis = basis_cache.load_basis_cache(base_data_folder + '/train.npy', template_mesh_path,
+                                             operators.laplacians[0], x_train, polynom_orders[0], args.basis_cache)
+        coma_model.fit(basis_cache.basis_dataset(basis, x_train, batch_size, seed=args.random_seed),
+                       epochs=num_epochs,
+                       validation_freq=validation_frequency,
+                       validation_data=mesh_data.dataset("val", batch_size),
+                       callbacks=callbacks,
                        initial_epoch=initial_epoch)
     else:
-        coma_model.fit(x_train, x_train,
-                       batch_size=batch_size,
+        # shuffled with --random-seed, read (and with --mmap normalized) on the tf.data threads while training
+        shuffle_buffer = args.shuffle_buffer if args.shuffle_buffer is not None else num_train
+        coma_model.fit(mesh_data.dataset("train", batch_size, shuffle_buffer=shuffle_buffer, seed=args.random_seed),
                        epochs=num_epochs,
-                       shuffle=True,
                        validation_freq=validation_frequency,
-                       validation_data=(x_val, x_val), callbacks=[save_callback, tensorboard_callback],
+                       validation_data=mesh_data.dataset("val", batch_size),
+                       callbacks=callbacks,
                        initial_epoch=initial_epoch)
 
+    if args.throughput_file is not None and rank == 0:
+        with open(args.throughput_file, 'w') as file:
+            json.dump({"num_workers": num_workers,
+                       "samples_per_second": throughput_callback.mean_steps_per_second() * batch_size * num_workers},
+                      file)
+
 elif args.mode == "test":
     if not os.path.exists(args.result_dir):
         os.makedirs(args.result_dir)
 
-    metric_result = coma_model.evaluate(x=x_test, y=x_test, batch_size=batch_size)
+    metric_result = coma_model.evaluate(mesh_data.dataset("test", batch_size), callbacks=[throughput_callback])
     metric_names = coma_model.metrics_names
 
-    result = coma_model.predict(x_test, batch_size=batch_size)
+    result = coma_model.predict(mesh_data.dataset("test", batch_size, targets=False), callbacks=[throughput_callback])
     print(result.shape)
-    if x_test_cut > 0:
-        test_vertices = mesh_data.vertices_test[:-x_test_cut]
-    else:
-        test_vertices = mesh_data.vertices_test
+    test_vertices = x_test
 
     error = np.sqrt(np.sum((mesh_data.std * (result - test_vertices)) ** 2, axis=2))
     error_std = np.std(error)
@@ -270,20 +385,21 @@ elif args.mode == "test":
     date_print("Median error: " + str(median_error))
 
     np.save(args.result_dir + "/" + run_name + "_result", result)
+    if args.save_meshes is not None:
+        mesh_prefix = args.result_dir + "/" + run_name + "/prediction"
+        date_print("Writing " + str(result.shape[0]) + " meshes to " + mesh_prefix + "-*." + args.save_meshes)
+        mesh_data.save_meshes(mesh_prefix, result, file_format=args.save_meshes)
 
 elif args.mode == "test-val":
     if not os.path.exists(args.result_dir):
         os.makedirs(args.result_dir)
 
-    metric_result = coma_model.evaluate(x=x_val, y=x_val, batch_size=batch_size)
+    metric_result = coma_model.evaluate(mesh_data.dataset("val", batch_size), callbacks=[throughput_callback])
     metric_names = coma_model.metrics_names
 
-    result = coma_model.predict(x_test, batch_size=batch_size)
+    result = coma_model.predict(mesh_data.dataset("val", batch_size, targets=False), callbacks=[throughput_callback])
     print(result.shape)
-    if x_val_cut > 0:
-        test_vertices = mesh_data.vertices_val[:-x_val_cut]
-    else:
-        test_vertices = mesh_data.vertices_val
+    test_vertices = x_val
 
     error = np.sqrt(np.sum((mesh_data.std * (result - test_vertices)) ** 2, axis=2))
     error_std = np.std(error)
@@ -298,17 +414,26 @@ elif args.mode == "test-val":
     date_print("Median error: " + str(median_error))
 
     np.save(args.result_dir + "/" + run_name + "_result", result)
+    if args.save_meshes is not None:
+        mesh_prefix = args.result_dir + "/" + run_name + "/prediction"
+        date_print("Writing " + str(result.shape[0]) + " meshes to " + mesh_prefix + "-*." + args.save_meshes)
+        mesh_data.save_meshes(mesh_prefix, result, file_format=args.save_meshes)
 
 
 elif args.mode == "latent":
-    latent_magic.play_with_latent_space(model=coma_model, mesh_data=mesh_data, batch_size=batch_size)
+    latent_magic.play_with_latent_space(model=coma_model, mesh_data=mesh_data)
 
 elif args.mode == "sample":
-    latent_magic.sample_latent_space(model=coma_model, mesh_data=mesh_data, batch_size=batch_size)
+    latent_magic.sample_latent_space(model=coma_model, mesh_data=mesh_data)
+
+elif args.mode == "export":
+    export_dir = args.export_dir if args.export_dir is not None else base_coma_model_dir + "/export/" + run_name
+    date_print("Exporting model to " + export_dir)
+    export.export_model(coma_model, mesh_data.mean, mesh_data.std, export_dir)
 
 if args.sanity_check:
-    x_reference = np.full((batch_size, 5023, 3), mesh_data.reference_mesh.v)
-    x_result = coma_model.predict(x_reference, batch_size=batch_size)
+    x_reference = mesh_data.reference_mesh.v[np.newaxis].astype('float32')
+    x_result = coma_model.predict(x_reference)
     mesh_util.visualizeSideBySide(original=x_reference, prediction=x_result, number_of_meshes=1, mesh_data=mesh_data)
 
 if args.page_through:
@@ -0,0 +1,260 @@
+import os
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from model.model import coma_ae
+
+
+class ensemble_cheb_conv(layers.Layer):
+    """
+    Chebyshev convolution of M replicas with their own filter weights, applied to activations of shape [M, B, V, F].
+
+    The Chebyshev basis of all replicas is computed by a single expansion with the shared laplacian, the filter
+    weights are applied by one batched matmul over the replica axis.
+
+    :param num_replicas: The number of replicas M
+    :param K: Chebyshev filter size
+    :param input_features: Size of each input sample
+    :param output_features: The number of output features
+    :param laplacian: The LaplacianOperator of the input mesh, see GraphOperators
+    :param regularization: (optional) The L1 regularization of the filter weights, see cheb_conv
+    :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
+    """
+
+    def __init__(self, num_replicas, K, input_features, output_features, laplacian, regularization=None, **kwargs):
+        super(ensemble_cheb_conv, self).__init__(**kwargs)
+        self.num_replicas = num_replicas
+        self.K = K
+        self.input_features = input_features
+        self.output_features = output_features
+        self.laplacian = laplacian
+        self.regularization = regularization
+
+    def build(self, input_shape):
+        self.w = self.add_weight(
+            name='w',
+            shape=(self.num_replicas, self.input_features * self.K, self.output_features),
+            initializer=tf.keras.initializers.truncated_normal(mean=0.0, stddev=0.1),
+            trainable=True,
+            # the L1 norm of the stacked weights is the sum of the L1 norms of the replicas
+            regularizer=tf.keras.regularizers.L1(self.regularization) if self.regularization is not None else None
+        )
+
+    def call(self, input_tensor):
+        batch_size = tf.shape(input_tensor)[1]
+        mesh_size = tf.shape(input_tensor)[2]
+        x0 = tf.transpose(input_tensor, perm=[2, 0, 1, 3])
+        x0 = tf.reshape(x0, [mesh_size, self.num_replicas * batch_size * self.input_features])
+        x = self.laplacian.expand(x0, self.K)
+
+        # into the (feature, order) row order of the weights of cheb_conv
+        x = tf.reshape(x, [self.K, mesh_size, self.num_replicas, batch_size, self.input_features])
+        x = tf.transpose(x, perm=[2, 3, 1, 4, 0])
+        x = tf.reshape(x, [self.num_replicas, batch_size * mesh_size, self.input_features * self.K])
+        x = tf.matmul(x, self.w)
+
+        return tf.reshape(x, [self.num_replicas, batch_size, mesh_size, self.output_features])
+
+
+class ensemble_dense(layers.Layer):
+    """
+    Dense layer of M replicas with their own weights, applied to activations of shape [M, B, N], initialized and
+    regularized like the dense layers of coma_ae.
+
+    :param num_replicas: The number of replicas M
+    :param units: The number of output units
+    :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
+    """
+
+    def __init__(self, num_replicas, units, **kwargs):
+        super(ensemble_dense, self).__init__(**kwargs)
+        self.num_replicas = num_replicas
+        self.units = units
+
+    def build(self, input_shape):
+        self.kernel = self.add_weight(
+            name='kernel',
+            shape=(self.num_replicas, int(input_shape[-1]), self.units),
+            initializer=keras.initializers.truncated_normal(mean=0.0, stddev=0.1),
+            regularizer=keras.regularizers.L2(),
+            trainable=True)
+        self.bias = self.add_weight(
+            name='bias',
+            shape=(self.num_replicas, 1, self.units),
+            initializer=keras.initializers.constant(value=0.1),
+            regularizer=keras.regularizers.L2(),
+            trainable=True)
+
+    def call(self, input_tensor):
+        return tf.nn.relu(tf.matmul(input_tensor, self.kernel) + self.bias)
+
+
+class ensemble_bias_relu(layers.Layer):
+    """
+    bias_relu of M replicas, applied to activations of shape [M, B, V, F].
+
+    :param num_replicas: The number of replicas M
+    """
+
+    def __init__(self, num_replicas, **kwargs):
+        super(ensemble_bias_relu, self).__init__(**kwargs)
+        self.num_replicas = num_replicas
+
+    def build(self, input_shape):
+        self.b = self.add_weight(
+            name='bias',
+            shape=(self.num_replicas, 1, 1, int(input_shape[-1])),
+            initializer=tf.keras.initializers.constant(value=0.1),
+            trainable=True,
+        )
+
+    def call(self, input_tensor):
+        return tf.nn.relu(input_tensor + self.b)
+
+
+def ensemble_sampling(sampling_operator, x):
+    """
+    Applies the shared sampling operator to the activations of all replicas of shape [M, B, V, F].
+    """
+    shape = tf.shape(x)
+    x = sampling_operator(tf.reshape(x, [shape[0] * shape[1], shape[2], shape[3]]))
+    return tf.reshape(x, [shape[0], shape[1], sampling_operator.output_size, shape[3]])
+
+
+def ensemble_loss(y_true, y_pred):
+    """
+    The sum of the mean absolute errors of the replicas for inputs of shape [B, M, V, F], returned per sample. Averaged
+    over the batch, the gradient of each replica equals the gradient of the loss of main.py.
+    """
+    return tf.reduce_sum(tf.reduce_mean(tf.abs(y_true - y_pred), axis=[2, 3]), axis=1)
+
+
+class coma_ensemble(keras.Model):
+    """
+    M independent replicas of coma_ae, trained together in one graph.
+
+    The replicas share the graph operators, their weights are stacked along a leading replica axis, so that every
+    Chebyshev expansion and sampling runs once for all replicas and the weights are applied by batched matmuls.
+    The model takes and returns vertices of shape [B, M, V, F], each replica reconstructs its own slice of the batch.
+
+    :param num_replicas: The number of replicas M
+    :param num_input_features: The number of features of the vertices
+    :param num_features: A list of number of features for the blocks, see coma_ae
+    :param operators: The GraphOperators holding the laplacians and sampling operators of the mesh pyramid
+    :param Ks: A list of polynomial orders, see coma_ae
+    :param num_latent: The size of the latent representation of the meshes
+    :param regularization: The L1 regularization of the output filter weights, see coma_ae
+    :param **kwargs: (optional) additional arguments of :class: `tf.keras.Model`.
+    """
+
+    def __init__(self, num_replicas, num_input_features, num_features, operators, Ks, num_latent, regularization,
+                 **kwargs):
+        super(coma_ensemble, self).__init__(**kwargs)
+        self.num_replicas = num_replicas
+        self.num_input_features = num_input_features
+        self.num_features = num_features
+        self.operators = operators
+        self.Ks = Ks
+        self.num_latent = num_latent
+        self.regularization = regularization
+        levels = len(num_features)
+
+        self.encoder_cheb = []
+        self.encoder_bias_relu = []
+        for i in range(levels):
+            self.encoder_cheb.append(ensemble_cheb_conv(num_replicas, K=Ks[i],
+                                                        input_features=num_features[i - 1] if i > 0 else
+                                                        num_input_features,
+                                                        output_features=num_features[i],
+                                                        laplacian=operators.laplacians[i]))
+            self.encoder_bias_relu.append(ensemble_bias_relu(num_replicas))
+        self.encoder_dense = ensemble_dense(num_replicas, num_latent)
+
+        self.initial_size = operators.upsampling[-1].input_size
+        self.decoder_fc = ensemble_dense(num_replicas, self.initial_size * num_features[-1])
+        self.decoder_cheb = []
+        self.decoder_bias_relu = []
+        for i in range(levels):
+            self.decoder_cheb.append(ensemble_cheb_conv(num_replicas, K=Ks[-i - 1],
+                                                        input_features=num_features[-i] if i > 0 else
+                                                        num_features[-1],
+                                                        output_features=num_features[-i - 1],
+                                                        laplacian=operators.laplacians[levels - i - 1]))
+            self.decoder_bias_relu.append(ensemble_bias_relu(num_replicas))
+        self.decoder_output = ensemble_cheb_conv(num_replicas, K=Ks[0], input_features=num_features[0],
+                                                 output_features=num_input_features,
+                                                 laplacian=operators.laplacians[0], regularization=regularization)
+
+    def call(self, input_tensor):
+        x = tf.transpose(input_tensor, perm=[1, 0, 2, 3])
+        for i in range(len(self.encoder_cheb)):
+            x = self.encoder_cheb[i](x)
+            x = self.encoder_bias_relu[i](x)
+            x = ensemble_sampling(self.operators.downsampling[i], x)
+        shape = tf.shape(x)
+        x = self.encoder_dense(tf.reshape(x, [self.num_replicas, shape[1], shape[2] * shape[3]]))
+
+        x = self.decoder_fc(x)
+        x = tf.reshape(x, [self.num_replicas, shape[1], self.initial_size, self.num_features[-1]])
+        for i in range(len(self.decoder_cheb)):
+            x = ensemble_sampling(self.operators.upsampling[-i - 1], x)
+            x = self.decoder_cheb[i](x)
+            x = self.decoder_bias_relu[i](x)
+        x = self.decoder_output(x)
+        return tf.transpose(x, perm=[1, 0, 2, 3])
+
+    def replica_model(self):
+        """
+        Returns a built coma_ae with the configuration of the replicas, see assign_replica.
+        """
+        model = coma_ae(num_input_features=self.num_input_features,
+                        num_features=self.num_features,
+                        operators=self.operators,
+                        Ks=self.Ks,
+                        num_latent=self.num_latent,
+                        regularization=self.regularization)
+        model(tf.zeros([1, self.operators.num_vertices[0], self.num_input_features]))
+        return model
+
+    def assign_replica(self, replica, model):
+        """
+        Copies the weights of the given replica into the built coma_ae model.
+        """
+        encoder, decoder = model.encoder, model.decoder
+        pairs = [(encoder.dense.kernel, self.encoder_dense.kernel[replica]),
+                 (encoder.dense.bias, self.encoder_dense.bias[replica, 0]),
+                 (decoder.fc.kernel, self.decoder_fc.kernel[replica]),
+                 (decoder.fc.bias, self.decoder_fc.bias[replica, 0]),
+                 (decoder.decoder_output.w, self.decoder_output.w[replica])]
+        for i, block in enumerate(encoder.encoder_blocks):
+            pairs.append((block.cheb_1.w, self.encoder_cheb[i].w[replica]))
+            pairs.append((block.bias_relu_1.b, self.encoder_bias_relu[i].b[replica]))
+        for i, block in enumerate(decoder.decoder_blocks):
+            pairs.append((block.dec_cheb_1.w, self.decoder_cheb[i].w[replica]))
+            pairs.append((block.bias_relu_1.b, self.decoder_bias_relu[i].b[replica]))
+        for variable, value in pairs:
+            variable.assign(value)
+
+
+class SplitCheckpointCallback(keras.callbacks.Callback):
+    """
+    Splits the weights of a coma_ensemble after every epoch into ordinary coma_ae checkpoints, one per replica, which
+    can be loaded by main.py.
+
+    :param checkpoint_dirs: The checkpoint directory of each replica, e.g. coma-model/checkpoint/<name>
+    """
+
+    def __init__(self, checkpoint_dirs):
+        super(SplitCheckpointCallback, self).__init__()
+        self.checkpoint_dirs = checkpoint_dirs
+        self.replica_model = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.replica_model is None:
+            self.replica_model = self.model.replica_model()
+        for replica, checkpoint_dir in enumerate(self.checkpoint_dirs):
+            if not os.path.exists(checkpoint_dir):
+                os.makedirs(checkpoint_dir)
+            self.model.assign_replica(replica, self.replica_model)
+            self.replica_model.save_weights(checkpoint_dir + "/coma_model")
@@ -0,0 +1,67 @@
+import tensorflow as tf
+
+
+class ComaExport(tf.Module):
+    def __init__(self, coma_model, mean, std, **kwargs):
+        """
+        Self-contained inference module of a trained coma_ae.
+
+        The graph operators are captured as constants of the traced functions, the normalization of MeshData is held as
+        variables, so the exported SavedModel can be served without the template mesh, the precomputed matrices, scipy
+        or psbody.
+        All signatures take and return de-normalized vertices and support any batch size.
+
+        :param coma_model: The trained coma_ae
+        :param mean: The mean of the training vertices of shape [V, 3], see MeshData
+        :param std: The standard deviation of the training vertices of shape [V, 3], see MeshData
+        """
+        super(ComaExport, self).__init__(**kwargs)
+        num_vertices, num_features = mean.shape
+        num_latent = coma_model.encoder.dense.units
+        if not coma_model.built:
+            # creates the variables, restoring a pending checkpoint of load_weights
+            coma_model(tf.zeros([1, num_vertices, num_features]))
+
+        # only the variables are tracked instead of the keras model, which would add all of its layer functions to
+        # the SavedModel and slow down loading
+        object.__setattr__(self, "coma_model", coma_model)
+        self.model_variables = list(coma_model.variables)
+        self.mean = tf.Variable(mean, dtype=tf.float32, trainable=False, name="mean")
+        self.std = tf.Variable(std, dtype=tf.float32, trainable=False, name="std")
+
+        self.encode = tf.function(self._encode, input_signature=[
+            tf.TensorSpec([None, num_vertices, num_features], tf.float32, name="vertices")])
+        self.decode = tf.function(self._decode, input_signature=[
+            tf.TensorSpec([None, num_latent], tf.float32, name="latent")])
+        self.reconstruct = tf.function(self._reconstruct, input_signature=[
+            tf.TensorSpec([None, num_vertices, num_features], tf.float32, name="vertices")])
+
+    def _encode(self, vertices):
+        return {"latent": self.coma_model.encoder((vertices - self.mean) / self.std)}
+
+    def _decode(self, latent):
+        return {"vertices": self.coma_model.decoder(latent) * self.std + self.mean}
+
+    def _reconstruct(self, vertices):
+        latent = self._encode(vertices)["latent"]
+        return {"latent": latent, "vertices": self._decode(latent)["vertices"]}
+
+    def signatures(self):
+        return {"encode": self.encode, "decode": self.decode, "reconstruct": self.reconstruct,
+                "serving_default": self.reconstruct}
+
+
+def export_model(coma_model, mean, std, export_dir):
+    """
+    Writes the given trained coma_ae together with the normalization as SavedModel with the signatures encode, decode
+    and reconstruct (the default) to export_dir.
+
+    :param coma_model: The trained coma_ae
+    :param mean: The mean of the training vertices, see MeshData
+    :param std: The standard deviation of the training vertices, see MeshData
+    :param export_dir: The directory the SavedModel is written to
+    """
+    module = ComaExport(coma_model, mean, std)
+    # the custom gradients of the graph operators are only needed for training
+    tf.saved_model.save(module, export_dir, signatures=module.signatures(),
+                        options=tf.saved_model.SaveOptions(experimental_custom_gradients=False))
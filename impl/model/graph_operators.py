@@ -0,0 +1,293 @@
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from scipy import sparse
+
+from util import graph_util
+from util.log_util import date_print
+from model import layer_util
+
+
+def to_sparse_tensor(matrix, dtype=None):
+    """
+    Converts the given scipy matrix into a reordered tf.SparseTensor, optionally casting its values to dtype.
+    """
+    matrix = sparse.coo_matrix(matrix)
+    indices = np.column_stack((matrix.row, matrix.col))
+    values = matrix.data if dtype is None else tf.cast(matrix.data, dtype)
+    return tf.sparse.reorder(tf.SparseTensor(indices, values, matrix.shape))
+
+
+def tensor_bytes(tensor):
+    """
+    Returns the memory held by the given tensor or tf.SparseTensor in bytes.
+    """
+    if isinstance(tensor, tf.SparseTensor):
+        return tensor_bytes(tensor.indices) + tensor_bytes(tensor.values) + tensor_bytes(tensor.dense_shape)
+    return tensor.shape.num_elements() * tensor.dtype.size
+
+
+def load_transformation_matrices(directory="computed"):
+    """
+    Loads the adjecency, downsampling and upsampling matrices stored by main.py in the given directory.
+    """
+    adjecency_matrices = np.load(directory + "/adjecency_matrcies-save.npy", allow_pickle=True)
+    downsampling_matrices = np.load(directory + "/downsampling_matrices-save.npy", allow_pickle=True)
+    upsampling_matrices = np.load(directory + "/upsampling_matrices-save.npy", allow_pickle=True)
+    return ([x.astype('float32') for x in adjecency_matrices],
+            [x.astype('float32') for x in downsampling_matrices],
+            [x.astype('float32') for x in upsampling_matrices])
+
+
+def write_shared_matrices(directory, adjecency_matrices, downsampling_matrices, upsampling_matrices):
+    """
+    Writes the transformation matrices in CSR form as plain .npy arrays to directory, which can be memory mapped by
+    several processes, see map_shared_matrices.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    for name, matrices in [("A", adjecency_matrices), ("D", downsampling_matrices), ("U", upsampling_matrices)]:
+        for i, matrix in enumerate(matrices):
+            matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+            prefix = directory + "/" + name + "-" + str(i) + "-"
+            np.save(prefix + "data.npy", matrix.data)
+            np.save(prefix + "indices.npy", matrix.indices)
+            np.save(prefix + "indptr.npy", matrix.indptr)
+            np.save(prefix + "shape.npy", np.array(matrix.shape))
+
+
+def map_shared_matrices(directory):
+    """
+    Memory maps the transformation matrices written by write_shared_matrices read only, so that all processes share
+    the pages of a single copy.
+
+    :return: The adjecency, downsampling and upsampling matrices as scipy CSR matrices
+    """
+    matrices = dict()
+    for name in ["A", "D", "U"]:
+        matrices[name] = []
+        while os.path.exists(directory + "/" + name + "-" + str(len(matrices[name])) + "-shape.npy"):
+            prefix = directory + "/" + name + "-" + str(len(matrices[name])) + "-"
+            arrays = [np.load(prefix + part + ".npy", mmap_mode="r") for part in ["data", "indices", "indptr"]]
+            matrices[name].append(sparse.csr_matrix(tuple(arrays), shape=tuple(np.load(prefix + "shape.npy")),
+                                                    copy=False))
+    return matrices["A"], matrices["D"], matrices["U"]
+
+
+class LaplacianOperator(object):
+    def __init__(self, laplacian, strategy="sparse", xla=False, dtype=tf.float32, cache_csr=True):
+        """
+        Chebyshev filter operator for one level of the mesh pyramid.
+
+        The "sparse" strategy runs the Chebyshev recurrence with sparse matmuls. The "dense" strategy precomputes the
+        dense polynomials T_k(L) once and computes the basis by a single dense matmul, which pays off for small meshes.
+
+        :param laplacian: The rescaled scipy laplacian
+        :param strategy: The execution strategy, either "sparse" or "dense"
+        :param xla: Whether the operator is compiled by XLA, which requires the XLA compatible sparse matmul
+        :param dtype: The dtype of the activations, e.g. tf.bfloat16 for mixed precision. The CSR kernels of the sparse
+                      strategy only support float32, so without xla the sparse laplacian stays in float32.
+        :param cache_csr: Whether the CSR matrix of the laplacian is converted once and captured by the traced
+                          functions, instead of being converted on every expansion. The captured matrix cannot be
+                          written to a SavedModel, see export.
+        """
+        self.num_vertices = laplacian.shape[0]
+        self.laplacian = laplacian
+        self.dtype = dtype
+        self.L = to_sparse_tensor(laplacian, dtype=dtype if xla else None)
+        self.csr = layer_util.to_csr_matrix(self.L) if cache_csr and not xla else None
+        self.strategy = strategy
+        self.xla = xla
+        self.polynomials = dict()
+
+    def chebyshev_polynomials(self, K):
+        """
+        Returns the dense polynomials T_0(L), ..., T_{K-1}(L) stacked into a matrix of shape [K * V, V].
+        They are computed once per K.
+        """
+        if K not in self.polynomials:
+            identity = np.eye(self.num_vertices, dtype=self.laplacian.dtype)
+            T = layer_util.chebyshev(self.laplacian, identity, K)
+            # the polynomials are constants shared by all graphs, even if first requested while tracing
+            with tf.init_scope():
+                T = tf.constant(T.reshape((K * self.num_vertices, self.num_vertices)))
+                self.polynomials[K] = tf.cast(T, self.dtype)
+        return self.polynomials[K]
+
+    def expand(self, x, K):
+        """
+        Returns the Chebyshev basis of x of shape [V, N] as tensor of shape [K, V, N].
+        """
+        if self.strategy == "dense":
+            return layer_util.dense_chebyshev_expansion(self.chebyshev_polynomials(K), x, K)
+        return layer_util.chebyshev_expansion(self.L, x, K, xla=self.xla, csr=self.csr)
+
+    def memory(self):
+        """
+        Returns the memory held by the operator in bytes.
+        """
+        # the CSR matrix holds int32 row pointers and column indices besides the float32 values
+        csr_bytes = 4 * (self.num_vertices + 1 + 2 * self.laplacian.nnz) if self.csr is not None else 0
+        return tensor_bytes(self.L) + csr_bytes + sum(tensor_bytes(T) for T in self.polynomials.values())
+
+
+class SamplingOperator(object):
+    def __init__(self, transformation, max_taps=3, xla=False, dtype=tf.float32):
+        """
+        Up- or downsampling operator, built from a pre-computed sampling transformation.
+
+        A pure row selection (downsampling) is applied as an index gather, a transformation with at most max_taps
+        weights per row (upsampling) as a fixed width gather followed by a weighted sum. Any other transformation falls
+        back to a sparse matmul.
+
+        :param transformation: The scipy sparse transformation of shape [output_size, input_size]
+        :param max_taps: The maximum number of weights per row for which the gather based upsampling is used
+        :param xla: Whether the operator is compiled by XLA, which requires the XLA compatible sparse matmul
+        :param dtype: The dtype of the activations, the weights are cast once on construction
+        """
+        self.output_size, self.input_size = transformation.shape
+        self.xla = xla
+
+        indices = graph_util.selection_indices(transformation)
+        if indices is not None:
+            self.mode = "gather"
+            inverse_indices = np.full(self.input_size, self.output_size)
+            inverse_indices[indices] = np.arange(self.output_size)
+            self.indices = tf.constant(indices, dtype=tf.int32)
+            self.inverse_indices = tf.constant(inverse_indices, dtype=tf.int32)
+            return
+
+        D = sparse.csr_matrix(transformation)
+        taps = graph_util.fixed_width_taps(D, max_width=max_taps)
+        if taps is not None:
+            self.mode = "taps"
+            self.tap_indices = tf.constant(taps[0], dtype=tf.int32)
+            self.tap_weights = tf.cast(taps[1], dtype)
+            # the gradient applies the transposed transformation
+            self.D = to_sparse_tensor(D.T, dtype=dtype)
+        else:
+            self.mode = "sparse"
+            self.D = to_sparse_tensor(D, dtype=dtype)
+
+    def __call__(self, x, vertex_major=False):
+        """
+        Applies the operator to x of shape [B, input_size, F], or [input_size, B, F] in vertex major layout.
+        """
+        if self.mode == "gather":
+            return layer_util.gather_sampling(x, self.indices, self.inverse_indices, vertex_major=vertex_major)
+        if self.mode == "taps":
+            return layer_util.tap_sampling(x, self.tap_indices, self.tap_weights, self.D, vertex_major=vertex_major,
+                                           xla=self.xla)
+        return layer_util.sparse_sampling(self.D, x, vertex_major=vertex_major, xla=self.xla)
+
+    def tensors(self):
+        if self.mode == "gather":
+            return [self.indices, self.inverse_indices]
+        if self.mode == "taps":
+            return [self.tap_indices, self.tap_weights, self.D]
+        return [self.D]
+
+    def memory(self):
+        """
+        Returns the memory held by the operator in bytes.
+        """
+        return sum(tensor_bytes(tensor) for tensor in self.tensors())
+
+
+class GraphOperators(object):
+    def __init__(self, adjecency_matrices, downsampling_matrices, upsampling_matrices, max_taps=3,
+                 dense_threshold=100, xla=False, dtype=tf.float32, cache_csr=True):
+        """
+        Registry of the graph operators for each level of the mesh pyramid.
+
+        The rescaled laplacians and the sampling operators are built once from the output of
+        mesh_sampling.generate_transformation_matrices and shared by all layers working on the same level.
+
+        :param adjecency_matrices: The adjecency matrices for each level
+        :param downsampling_matrices: The downsampling transformations between the levels
+        :param upsampling_matrices: The upsampling transformations between the levels
+        :param max_taps: The maximum number of weights per row for which the gather based upsampling is used
+        :param dense_threshold: Levels with at most this many vertices use dense Chebyshev polynomials,
+                                see tune_strategies for choosing the strategies by a benchmark instead
+        :param xla: Whether the operators are compiled by XLA, see LaplacianOperator and SamplingOperator
+        :param dtype: The dtype of the activations, e.g. tf.bfloat16 for mixed precision. The operators are cast once
+                      on construction.
+        :param cache_csr: Whether the laplacians convert their CSR matrices once, which has to be disabled for models
+                          written to a SavedModel, see LaplacianOperator
+        """
+        start = time.time()
+        self.num_vertices = [matrix.shape[0] for matrix in adjecency_matrices]
+
+        self.laplacians = []
+        for matrix in adjecency_matrices:
+            L = graph_util.laplacian(matrix)
+            L = graph_util.rescale_laplacian(L, lmax=2)
+            strategy = "dense" if L.shape[0] <= dense_threshold else "sparse"
+            self.laplacians.append(LaplacianOperator(L, strategy=strategy, xla=xla, dtype=dtype, cache_csr=cache_csr))
+
+        self.downsampling = [SamplingOperator(matrix, max_taps=max_taps, xla=xla, dtype=dtype)
+                             for matrix in downsampling_matrices]
+        self.upsampling = [SamplingOperator(matrix, max_taps=max_taps, xla=xla, dtype=dtype)
+                           for matrix in upsampling_matrices]
+        self.build_time = time.time() - start
+
+    def tune_strategies(self, K, num_columns, repetitions=10, max_dense_vertices=1000):
+        """
+        Chooses the faster Chebyshev strategy for each level by timing the forward and backward pass of both.
+
+        :param K: The polynomial order
+        :param num_columns: The number of columns of the input (batch size * number of features)
+        :param repetitions: The number of timed repetitions
+        :param max_dense_vertices: Larger levels always use the sparse strategy, as their dense polynomials take
+                                   K * V^2 floats
+        """
+        for laplacian in self.laplacians:
+            if laplacian.num_vertices > max_dense_vertices:
+                laplacian.strategy = "sparse"
+                continue
+            x = tf.random.normal([laplacian.num_vertices, num_columns], dtype=laplacian.dtype)
+            timings = dict()
+            for strategy in ["sparse", "dense"]:
+                laplacian.strategy = strategy
+
+                @tf.function(jit_compile=laplacian.xla)
+                def step():
+                    with tf.GradientTape() as tape:
+                        tape.watch(x)
+                        loss = tf.reduce_sum(laplacian.expand(x, K))
+                    return loss, tape.gradient(loss, x)
+
+                step()
+                start = time.time()
+                for _ in range(repetitions):
+                    step()[1].numpy()
+                timings[strategy] = (time.time() - start) / repetitions
+            laplacian.strategy = min(timings, key=timings.get)
+            if laplacian.strategy == "sparse":
+                laplacian.polynomials.clear()
+            date_print("Level with " + str(laplacian.num_vertices) + " vertices -- sparse: " +
+                       "{:.3f}".format(1000 * timings["sparse"]) + "ms -- dense: " +
+                       "{:.3f}".format(1000 * timings["dense"]) + "ms -- using " + laplacian.strategy)
+
+    def memory(self):
+        """
+        Returns the memory held by all operators in bytes.
+        """
+        return (sum(laplacian.memory() for laplacian in self.laplacians) +
+                sum(operator.memory() for operator in self.downsampling + self.upsampling))
+
+    def report(self):
+        """
+        Prints the memory held by each operator and the time it took to build them.
+        """
+        for i in range(len(self.num_vertices)):
+            date_print("Level " + str(i) + " (" + str(self.num_vertices[i]) + " vertices) -- laplacian (" +
+                       self.laplacians[i].strategy + "): " + str(self.laplacians[i].memory()) + " bytes")
+        for name, operators in [("downsampling", self.downsampling), ("upsampling", self.upsampling)]:
+            for i, operator in enumerate(operators):
+                date_print("Level " + str(i) + " " + name + " " + str(operator.input_size) + " -> " +
+                           str(operator.output_size) + " (" + operator.mode + "): " + str(operator.memory()) +
+                           " bytes")
+        date_print("Graph operators: " + str(self.memory()) + " bytes, built in " +
+                   "{:.3f}".format(self.build_time) + "s")
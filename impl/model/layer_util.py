@@ -2,6 +2,8 @@ import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, regularizers
+# the CSR matrix wrapper of the CSR kernels, which tf does not export
+from tensorflow.python.ops.linalg.sparse import sparse_csr_matrix_ops
 
 def chebyshev(L, X, K):
     """
@@ -26,6 +28,107 @@ def chebyshev(L, X, K):
         Xt[k, ...] = 2 * L.dot(Xt[k-1, ...]) - Xt[k-2, ...]
     return Xt
 
+
+def segment_matmul(A, X):
+    """
+    Computes the product of the sparse matrix A and the dense matrix X as a gather of the rows of X followed by a
+    segment sum. Unlike tf.sparse.sparse_dense_matmul and the CSR kernels, this can be compiled by XLA.
+
+    :param A: The sparse matrix as tf.SparseTensor of shape [M, N]
+    :param X: The dense input of shape [N, F]
+    """
+    products = A.values[:, tf.newaxis] * tf.gather(X, A.indices[:, 1])
+    return tf.math.unsorted_segment_sum(products, A.indices[:, 0], num_segments=A.shape[0])
+
+
+def sparse_matmul(A, X, xla=False):
+    """
+    Computes the product of the sparse matrix A and the dense matrix X, with an XLA compatible kernel if xla is set.
+    """
+    if xla:
+        return segment_matmul(A, X)
+    return tf.sparse.sparse_dense_matmul(A, X)
+
+
+def to_csr_matrix(L):
+    """
+    Converts the tf.SparseTensor L into the CSR sparse matrix of the CSR matmul kernel. Converted eagerly, the matrix
+    keeps its shape and dtype, so that it can be captured by traced functions.
+    """
+    return sparse_csr_matrix_ops.CSRSparseMatrix(L)
+
+
+def chebyshev_expansion(L, X, K, xla=False, csr=None):
+    """
+    Returns the Chebyshev basis T_0(L)X, ..., T_{K-1}(L)X stacked into a tensor of shape [K, M, N].
+
+    Each term is written once into a preallocated tensor array, instead of concatenating it onto the growing stack.
+    The gradient runs the same recurrence in reverse. As the rescaled laplacian is symmetric (L^T = L), the backward
+    pass uses the same sparse matmul as the forward pass and never transposes L.
+    The CSR matmul kernel is used, as it is considerably faster than tf.sparse.sparse_dense_matmul. The CSR kernels
+    cannot be compiled by XLA, so with xla set the segment_matmul is used instead.
+
+    :param L: The rescaled (symmetric) laplacian as tf.SparseTensor of shape [M, M]
+    :param X: The dense input of shape [M, N]
+    :param K: The number of Chebyshev polynomials
+    :param xla: Whether the expansion is compiled by XLA
+    :param csr: (optional) L converted by to_csr_matrix, which is converted on every call otherwise
+    """
+    if X.dtype != L.dtype:
+        # e.g. bfloat16 activations with the float32 laplacian, which the CSR kernels require. The recurrence runs in
+        # the precision of L and the basis is cast once.
+        return tf.cast(chebyshev_expansion(L, tf.cast(X, L.dtype), K, xla=xla, csr=csr), X.dtype)
+    if xla:
+        def matmul(x):
+            return segment_matmul(L, x)
+    else:
+        if csr is None:
+            csr = to_csr_matrix(L)
+
+        def matmul(x):
+            return sparse_csr_matrix_ops.matmul(csr, x)
+
+    @tf.custom_gradient
+    def expansion(x0):
+        xt = tf.TensorArray(x0.dtype, size=K, element_shape=x0.shape)
+        xt = xt.write(0, x0)
+        if K > 1:
+            x1 = matmul(x0)
+            xt = xt.write(1, x1)
+        for k in range(2, K):
+            x2 = 2 * matmul(x1) - x0
+            xt = xt.write(k, x2)
+            x0, x1 = x1, x2
+
+        def grad(dy):
+            # T_k = 2 L T_{k-1} - T_{k-2}, so the gradient of T_k flows back as 2 L^T dT_k into T_{k-1}
+            # and as -dT_k into T_{k-2}.
+            dx = tf.unstack(dy, num=K)
+            for k in range(K - 1, 1, -1):
+                dx[k - 1] = dx[k - 1] + 2 * matmul(dx[k])
+                dx[k - 2] = dx[k - 2] - dx[k]
+            if K > 1:
+                dx[0] = dx[0] + matmul(dx[1])
+            return dx[0]
+
+        return xt.stack(), grad
+
+    return expansion(X)
+
+
+def dense_chebyshev_expansion(T, X, K):
+    """
+    Returns the Chebyshev basis T_0(L)X, ..., T_{K-1}(L)X stacked into a tensor of shape [K, M, N], given the
+    precomputed dense polynomials T_0(L), ..., T_{K-1}(L) stacked into a matrix of shape [K * M, M].
+    The whole basis is computed by a single dense matmul, which is faster than the recurrence for small meshes.
+
+    :param T: The dense Chebyshev polynomials of the laplacian
+    :param X: The dense input of shape [M, N]
+    :param K: The number of Chebyshev polynomials
+    """
+    return tf.reshape(tf.matmul(T, X), [K, T.shape[1], -1])
+
+
 def compute_loss(outputs, labels, loss, regularization, regularizers):
     if loss == "l1":
         data_loss = keras.losses.mean_absolute_error(y_true=labels, y_pred=outputs)
@@ -42,3 +145,86 @@ def compute_loss(outputs, labels, loss, regularization, regularizers):
     op_averages = averages.apply([data_loss, regularization, loss])
     loss_average = tf.identity(averages.average(loss), name='control')
     return loss, loss_average
+
+def sparse_sampling(D, X, vertex_major=False, xla=False):
+    """
+    Applies the sparse transformation D of shape [M, N] to each sample of X of shape [B, N, F], returning [B, M, F].
+    In vertex major layout X has shape [N, B, F] and the result [M, B, F], which requires no transposes.
+
+    :param D: The transformation as tf.SparseTensor
+    :param X: The dense input
+    :param vertex_major: Whether X is in vertex major layout
+    :param xla: Whether the sampling is compiled by XLA
+    """
+    num_features = X.shape[-1]
+    if vertex_major:
+        batch_size = tf.shape(X)[1]
+        x = tf.reshape(X, [D.shape[1], batch_size * num_features])
+        x = sparse_matmul(D, x, xla=xla)
+        return tf.reshape(x, [D.shape[0], batch_size, num_features])
+
+    batch_size = tf.shape(X)[0]
+    x = tf.transpose(X, perm=[1, 2, 0])
+    x = tf.reshape(x, [D.shape[1], num_features * batch_size])
+    x = sparse_matmul(D, x, xla=xla)
+    x = tf.reshape(x, [D.shape[0], num_features, batch_size])
+    return tf.transpose(x, perm=[2, 0, 1])
+
+
+def gather_sampling(X, indices, inverse_indices, vertex_major=False):
+    """
+    Selects the vertices given by indices from X of shape [B, N, F] ([N, B, F] in vertex major layout).
+
+    The gradient is gathered back from the upstream gradient, padded with a zero vertex, which the inverse indices of
+    all unselected vertices point to.
+
+    :param X: The dense input
+    :param indices: The selected vertex for each output vertex, of shape [M]
+    :param inverse_indices: The output vertex for each input vertex (M if it is not selected), of shape [N]
+    :param vertex_major: Whether X is in vertex major layout
+    """
+    axis = 0 if vertex_major else 1
+    padding = [[0, 1], [0, 0], [0, 0]] if vertex_major else [[0, 0], [0, 1], [0, 0]]
+
+    @tf.custom_gradient
+    def select(x):
+        def grad(dy):
+            dy = tf.pad(dy, padding)
+            return tf.gather(dy, inverse_indices, axis=axis)
+
+        return tf.gather(x, indices, axis=axis), grad
+
+    return select(X)
+
+
+def tap_sampling(X, tap_indices, tap_weights, transposed, vertex_major=False, xla=False):
+    """
+    Computes each output vertex as the weighted sum of a fixed number of input vertices of X of shape [B, N, F]
+    ([N, B, F] in vertex major layout).
+
+    The gradient is the sparse transposed transformation applied to the upstream gradient, which is cheaper than
+    scattering the gathered taps back.
+
+    :param X: The dense input
+    :param tap_indices: The input vertices for each output vertex, of shape [M, W]
+    :param tap_weights: The weights for each output vertex, of shape [M, W]
+    :param transposed: The transposed transformation as tf.SparseTensor of shape [N, M]
+    :param vertex_major: Whether X is in vertex major layout
+    :param xla: Whether the sampling is compiled by XLA
+    """
+    axis = 0 if vertex_major else 1
+    # broadcast the weights of each output vertex over the features (and the batch in vertex major layout)
+    weights = tap_weights[:, :, tf.newaxis, tf.newaxis] if vertex_major else tap_weights[:, :, tf.newaxis]
+
+    @tf.custom_gradient
+    def interpolate(x):
+        y = tf.gather(x, tap_indices[:, 0], axis=axis) * weights[:, 0]
+        for tap in range(1, tap_indices.shape[1]):
+            y += tf.gather(x, tap_indices[:, tap], axis=axis) * weights[:, tap]
+
+        def grad(dy):
+            return sparse_sampling(transposed, dy, vertex_major=vertex_major, xla=xla)
+
+        return y, grad
+
+    return interpolate(X)
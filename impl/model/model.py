@@ -11,47 +11,68 @@ class coma_ae(keras.Model):
 
     :param num_input_features: The number of output features of the last decoder block.
     :param num_features: A list of number of features for the decoding blocks
-    :param laplacians: A list of laplacians for the encoder and decoder
-    :param downsampling_transformations: A list of downsampling transformations to be applied by the encoder
-    :param upsampling_transformations: A list of upsampling transformations to be applied by the decoder
+    :param operators: The GraphOperators holding the laplacians and sampling operators of the mesh pyramid
     :param Ks: A list of polynomial orders to be applied by the decoding blocks
     :param num_latent: The size of the latent representation of the meshes
-    :param batch_size: The batch size
+    :param vertex_major: Whether the activations are kept in vertex major layout [V, B, F] between the blocks
+    :param jit_compile: Whether encode and decode are compiled by XLA, the operators have to be built with xla=True
+    :param checkpoint_levels: The levels of the mesh pyramid whose Chebyshev filters recompute their basis in the
+                              backward pass instead of storing it, e.g. [0] for the full resolution mesh, see
+                              model_util.activation_memory for the memory saved
+    :param basis_input: Whether fit trains on the precomputed Chebyshev basis of the first encoder layer instead of the
+                        vertices, see data.basis_cache. Evaluation and prediction always take the vertices
     :param **kwargs: (optional) additional arguments of :class: `tf.keras.Model`.
     """
 
     def __init__(self,
                  num_input_features,
                  num_features,
-                 laplacians,
-                 downsampling_transformations,
-                 upsampling_transformations,
+                 operators,
                  Ks,
                  num_latent,
-                 batch_size,
                  regularization,
+                 vertex_major=False,
+                 jit_compile=False,
+                 checkpoint_levels=(),
+                 basis_input=False,
                  **kwargs):
         super(coma_ae, self).__init__(**kwargs)
+        self.basis_input = basis_input
         self.encoder = encoder(num_input_features=num_input_features,
                                num_features=num_features,
-                               laplacians=laplacians,
-                               downsampling_transformations=downsampling_transformations,
+                               operators=operators,
                                Ks=Ks,
                                num_latent=num_latent,
-                               batch_size=batch_size)
+                               vertex_major=vertex_major,
+                               checkpoint_levels=checkpoint_levels)
         self.decoder = decoder(num_output_features=num_input_features,
                                num_features=num_features,
-                               laplacians=laplacians,
-                               upsampling_transformations=upsampling_transformations,
+                               operators=operators,
                                Ks=Ks,
-                               batch_size=batch_size,
-                               regularization=regularization)
+                               regularization=regularization,
+                               vertex_major=vertex_major,
+                               checkpoint_levels=checkpoint_levels)
+        if jit_compile:
+            # the train and predict steps are compiled by keras, see Model.compile(jit_compile=True)
+            self.encode = tf.function(self.encode, jit_compile=True, reduce_retracing=True)
+            self.decode = tf.function(self.decode, jit_compile=True, reduce_retracing=True)
 
-    def call(self, input_tensor):
-        x = self.encoder(input_tensor)
+    def call(self, input_tensor, basis=False):
+        x = self.encoder.call_basis(input_tensor) if basis else self.encoder(input_tensor)
         x = self.decoder(x)
         return x
 
+    def train_step(self, data):
+        if not self.basis_input:
+            return super(coma_ae, self).train_step(data)
+        # the input is the cached basis of the first encoder layer, the target are the vertices
+        x, y = data
+        with tf.GradientTape() as tape:
+            y_pred = self(x, training=True, basis=True)
+            loss = self.compute_loss(x, y, y_pred)
+        self.optimizer.minimize(loss, self.trainable_variables, tape=tape)
+        return self.compute_metrics(x, y, y_pred, None)
+
     def encode(self, input_tensor):
         x = self.encoder(input_tensor)
         return x
@@ -60,7 +81,7 @@ class coma_ae(keras.Model):
         x = self.decoder(input_tensor)
         return x
 
-    def model(self, input_shape, batch_size):
+    def model(self, input_shape, batch_size=None):
         x = keras.Input(shape=(input_shape[1], input_shape[2]), batch_size=batch_size)
         print(x.shape)
         return keras.Model(inputs=[x], outputs=self.call(x))
@@ -71,42 +92,47 @@ class encoder(keras.Model):
     Encoder model consisting of an encoder blocks.
 
     Concatenates a number of decoder blocks, depending on the length of the given list of num_features.
+    The input are the vertices of shape [B, V, F], call_basis takes the precomputed Chebyshev basis of the first block
+    of shape [B, V, F * K] instead, see data.basis_cache.
 
     :param num_input_features: The number of input features for the first encoder block
     :param num_features: A list of number of features for the decoding blocks
-    :param laplacians: A list of laplacians for the decoding blcks
-    :param downsampling_transformations: A list of downsampling transformations to be applied by the encoding blocks
+    :param operators: The GraphOperators holding the laplacians and downsampling operators for the encoding blocks
     :param Ks: A list of polynomial orders to be applied by the decoding blocks
-    :param batch_size: The batch size
+    :param vertex_major: Whether the activations are kept in vertex major layout [V, B, F] between the blocks
+    :param checkpoint_levels: The levels whose Chebyshev filters recompute their basis in the backward pass
     :param **kwargs: (optional) additional arguments of :class: `tf.keras.Model`.
     """
 
     def __init__(self,
                  num_input_features,
                  num_features,
-                 laplacians,
-                 downsampling_transformations,
+                 operators,
                  Ks,
                  num_latent,
-                 batch_size,
+                 vertex_major=False,
+                 checkpoint_levels=(),
                  **kwargs):
         super(encoder, self).__init__(**kwargs)
+        self.vertex_major = vertex_major
         self.encoder_blocks = []
         for i in range(len(num_features)):
             if i == 0:
-                self.encoder_blocks.append(encoder_block(laplacian=laplacians[i],
+                self.encoder_blocks.append(encoder_block(laplacian=operators.laplacians[i],
                                                          K=Ks[i],
                                                          input_features=num_input_features,
                                                          output_features=num_features[i],
-                                                         downsampling_transformation=downsampling_transformations[i],
-                                                         batch_size=batch_size))
+                                                         downsampling_operator=operators.downsampling[i],
+                                                         vertex_major=vertex_major,
+                                                         checkpointing=i in checkpoint_levels))
             else:
-                self.encoder_blocks.append(encoder_block(laplacian=laplacians[i],
+                self.encoder_blocks.append(encoder_block(laplacian=operators.laplacians[i],
                                                          K=Ks[i],
                                                          input_features=num_features[i - 1],
                                                          output_features=num_features[i],
-                                                         downsampling_transformation=downsampling_transformations[i],
-                                                         batch_size=batch_size))
+                                                         downsampling_operator=operators.downsampling[i],
+                                                         vertex_major=vertex_major,
+                                                         checkpointing=i in checkpoint_levels))
 
         self.flatten = tf.keras.layers.Flatten()
         self.dense = tf.keras.layers.Dense(num_latent,
@@ -119,13 +145,34 @@ class encoder(keras.Model):
 
     def call(self, input_tensor):
         x = input_tensor
-        for i in range(len(self.encoder_blocks)):
+        if self.vertex_major:
+            x = self.encoder_blocks[0](tf.transpose(x, perm=[1, 0, 2]))
+        else:
+            x = self.encoder_blocks[0](x)
+        return self.call_coarse(x)
+
+    def call_basis(self, basis):
+        """
+        Runs the encoder on the precomputed Chebyshev basis of the input of the first block of shape [B, V, F * K]
+        instead of the vertices, see data.basis_cache.
+        """
+        return self.call_coarse(self.encoder_blocks[0].call_basis(basis))
+
+    def call_coarse(self, x):
+        """
+        Runs the blocks after the first one and the dense layer on the output of the first block.
+        """
+        for i in range(1, len(self.encoder_blocks)):
             x = self.encoder_blocks[i](x)
+        if self.vertex_major:
+            # the dense layer flattens each sample, back to [B, V, F] on the (small) coarsest level
+            x = tf.transpose(x, perm=[1, 0, 2])
         x = self.flatten(x)
         x = self.dense(x)
-        return x
+        # under mixed precision the activations are bfloat16, the latent vector is returned in float32
+        return tf.cast(x, tf.float32)
 
-    def model(self, input_shape, batch_size):
+    def model(self, input_shape, batch_size=None):
         """
         Helper to enable model summary encoder.model(input_shape).summary()
         """
@@ -142,24 +189,25 @@ class decoder(keras.Model):
 
     :param num_output_features: The number of output features of the last decoder block.
     :param num_features: A list of number of features for the decoding blocks
-    :param laplacians: A list of laplacians for the decoding blcks
-    :param upsampling_transformations: A list of upsampling transformations to be applied by the decoding blocks
+    :param operators: The GraphOperators holding the laplacians and upsampling operators for the decoding blocks
     :param Ks: A list of polynomial orders to be applied by the decoding blocks
-    :param batch_size: The batch size
+    :param vertex_major: Whether the activations are kept in vertex major layout [V, B, F] between the blocks
+    :param checkpoint_levels: The levels whose Chebyshev filters recompute their basis in the backward pass
     :param **kwargs: (optional) additional arguments of :class: `tf.keras.Model`.
     """
 
     def __init__(self,
                  num_output_features,
                  num_features,
-                 laplacians,
-                 upsampling_transformations,
+                 operators,
                  Ks,
-                 batch_size,
                  regularization,
+                 vertex_major=False,
+                 checkpoint_levels=(),
                  **kwargs):
         super(decoder, self).__init__(**kwargs)
-        initial_size = upsampling_transformations[-1].shape[1]
+        self.vertex_major = vertex_major
+        initial_size = operators.upsampling[-1].input_size
         initial_num_features = num_features[-1]
         self.fc = keras.layers.Dense(initial_size * initial_num_features,
                                      activation=keras.activations.relu,
@@ -173,36 +221,46 @@ class decoder(keras.Model):
         self.decoder_blocks = []
         for i in range(len(num_features)):
             if i >= 1:
-                self.decoder_blocks.append(decoder_block(laplacian=laplacians[len(num_features) - i - 1],
+                self.decoder_blocks.append(decoder_block(laplacian=operators.laplacians[len(num_features) - i - 1],
                                                          K=Ks[-i - 1],
                                                          input_features=num_features[-i],
                                                          output_features=num_features[-i - 1],
-                                                         upsampling_transformation=upsampling_transformations[-i - 1],
-                                                         batch_size=batch_size))
+                                                         upsampling_operator=operators.upsampling[-i - 1],
+                                                         vertex_major=vertex_major,
+                                                         checkpointing=len(num_features) - i - 1 in
+                                                         checkpoint_levels))
             else:
-                self.decoder_blocks.append(decoder_block(laplacian=laplacians[len(num_features)-i - 1],
+                self.decoder_blocks.append(decoder_block(laplacian=operators.laplacians[len(num_features)-i - 1],
                                                          K=Ks[-i - 1],
                                                          input_features=num_features[-i - 1],
                                                          output_features=num_features[-i - 1],
-                                                         upsampling_transformation=upsampling_transformations[-i - 1],
-                                                         batch_size=batch_size))
+                                                         upsampling_operator=operators.upsampling[-i - 1],
+                                                         vertex_major=vertex_major,
+                                                         checkpointing=len(num_features) - i - 1 in
+                                                         checkpoint_levels))
         self.decoder_output = cheb_conv(
             input_features=num_features[0],
             output_features=num_output_features,
             K=Ks[0],
-            laplacian=laplacians[0],
-            batch_size=batch_size,
-            regularization=regularization)
+            laplacian=operators.laplacians[0],
+            regularization=regularization,
+            vertex_major=vertex_major,
+            checkpointing=0 in checkpoint_levels)
 
     def call(self, input_tensor):
         x = self.fc(input_tensor)
         x = self.reshape(x)
+        if self.vertex_major:
+            x = tf.transpose(x, perm=[1, 0, 2])
         for i in range(len(self.decoder_blocks)):
             x = self.decoder_blocks[i](x)
         x = self.decoder_output(x)
-        return x
+        if self.vertex_major:
+            x = tf.transpose(x, perm=[1, 0, 2])
+        # under mixed precision the activations are bfloat16, the loss is computed on the float32 output
+        return tf.cast(x, tf.float32)
 
-    def model(self, input_shape, batch_size):
+    def model(self, input_shape, batch_size=None):
         """
             Helper to enable model summary decoder.model(input_shape).summary()
         """
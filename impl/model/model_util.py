@@ -1,5 +1,9 @@
+import re
+import numpy as np
 import tensorflow as tf
 
+from util.log_util import date_print, hint_print
+
 
 def get_learning_rate_decay_schedule(initial_learning_rate, decay_rate,
                                      decay_steps) -> tf.keras.optimizers.schedules.ExponentialDecay:
@@ -9,3 +13,94 @@ def get_learning_rate_decay_schedule(initial_learning_rate, decay_rate,
         decay_rate=decay_rate,
         staircase=True)
     return lr_schedule
+
+
+def report_xla_support(name, function, *args):
+    """
+    Tries to compile the given function with XLA for the given arguments and reports the operations which XLA cannot
+    compile.
+
+    :param name: The name of the function to be reported
+    :param function: The function to be compiled
+    :param args: Example arguments of the function
+    :return: Whether the function can be compiled by XLA
+    """
+    try:
+        tf.function(function, jit_compile=True).experimental_get_compiler_ir(*args)(stage="hlo")
+    except (tf.errors.OpError, ValueError) as error:
+        unsupported = sorted(set(re.findall(r"(\w+) \(No registered", str(error))))
+        if unsupported:
+            hint_print(name + " cannot be compiled by XLA, unsupported operations: " + ", ".join(unsupported))
+        else:
+            hint_print(name + " cannot be compiled by XLA: " + str(error).split("\n")[0])
+        return False
+    date_print(name + " compiles with XLA")
+    return True
+
+
+def activation_memory(num_vertices, batch_size, num_features, polynom_orders, num_input_features=3, num_latent=8,
+                      checkpoint_levels=(), dtype_size=4):
+    """
+    Estimates the activations each layer of coma_ae keeps alive for the backward pass of a train step.
+
+    A Chebyshev filter keeps its basis of K times its input for the weight gradient, the relu of the following bias
+    keeps its output. With checkpointing, the filter only keeps its input and recomputes the basis in the backward pass,
+    where it exists together with its gradient for a single layer at a time. The sampling operators keep nothing.
+    The peak is reached in the backward pass of the layer with the largest transient memory on top of the activations
+    kept by it and all layers before it.
+
+    :param num_vertices: The number of vertices of each level of the mesh pyramid
+    :param batch_size: The batch size
+    :param num_features: A list of number of features for the blocks, see coma_ae
+    :param polynom_orders: A list of polynomial orders, see coma_ae
+    :param num_input_features: The number of features of the vertices
+    :param num_latent: The size of the latent vector
+    :param checkpoint_levels: The levels whose Chebyshev filters recompute their basis, see coma_ae
+    :param dtype_size: The size of an activation in bytes, e.g. 2 for mixed precision
+    :return: A list of (layer, kept bytes, transient bytes in the backward pass) and the estimated peak in bytes
+    """
+    levels = len(num_features)
+    layers = []
+
+    def cheb_conv(name, level, K, input_features, output_features):
+        basis = batch_size * num_vertices[level] * input_features * K * dtype_size
+        output = batch_size * num_vertices[level] * output_features * dtype_size
+        if level in checkpoint_levels:
+            kept = batch_size * num_vertices[level] * input_features * dtype_size
+            # the recomputed basis and its gradient
+            layers.append((name + " (level " + str(level) + ", checkpointed)", kept + output, 2 * basis))
+        else:
+            layers.append((name + " (level " + str(level) + ")", basis + output, basis))
+
+    for i in range(levels):
+        cheb_conv("encoder block " + str(i), i, polynom_orders[i],
+                  num_features[i - 1] if i > 0 else num_input_features, num_features[i])
+    flat = batch_size * num_vertices[levels] * num_features[-1] * dtype_size
+    layers.append(("encoder dense", flat + batch_size * num_latent * dtype_size, flat))
+    layers.append(("decoder fc", batch_size * num_latent * dtype_size + flat, flat))
+    for i in range(levels):
+        cheb_conv("decoder block " + str(i), levels - i - 1, polynom_orders[-i - 1],
+                  num_features[-i] if i > 0 else num_features[-1], num_features[-i - 1])
+    cheb_conv("decoder output", 0, polynom_orders[0], num_features[0], num_input_features)
+
+    # the backward pass releases the kept activations of each layer once it is done with it
+    kept = np.cumsum([layer[1] for layer in layers])
+    peak = max(kept[-1], max(kept[i] + layers[i][2] for i in range(len(layers))))
+    return layers, int(peak)
+
+
+def report_activation_memory(num_vertices, batch_size, num_features, polynom_orders, checkpoint_levels=(), **kwargs):
+    """
+    Prints the activation memory of each layer without and with checkpointing the given levels, see activation_memory.
+    """
+    configurations = [("without checkpointing", ())]
+    if checkpoint_levels:
+        configurations.append(("checkpointing levels " + str(list(checkpoint_levels)), checkpoint_levels))
+    for name, levels in configurations:
+        layers, peak = activation_memory(num_vertices, batch_size, num_features, polynom_orders,
+                                         checkpoint_levels=levels, **kwargs)
+        date_print("Activation memory for batch size " + str(batch_size) + " " + name + ":")
+        for layer, kept, transient in layers:
+            date_print("  " + layer.ljust(44) + "kept: " + "{:.1f}".format(kept / 2 ** 20).rjust(8) + " MiB" +
+                       " -- backward: " + "{:.1f}".format(transient / 2 ** 20).rjust(8) + " MiB")
+        date_print("  estimated peak: " + "{:.1f}".format(peak / 2 ** 20) + " MiB")
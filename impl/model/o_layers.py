@@ -1,8 +1,5 @@
 import tensorflow as tf
 from tensorflow.keras import layers
-from util import graph_util
-from scipy import sparse
-import numpy as np
 
 class cheb_conv(layers.Layer):
     """
@@ -13,30 +10,30 @@ class cheb_conv(layers.Layer):
     :param input_features: Size of each input sample
     :param output_features: The number of output features
     :param K: Chebyshev filter size
-    :param laplacian: The laplacian for the input mesh
-    :param batch_size: The batch_size
+    :param laplacian: The LaplacianOperator of the input mesh, see GraphOperators
+    :param vertex_major: Whether the activations are in vertex major layout [V, B, F] instead of [B, V, F]
+    :param checkpointing: Whether the Chebyshev basis is recomputed in the backward pass instead of being kept alive
+                          for the weight gradient, which saves K times the input activations at the cost of a second
+                          expansion
     :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
     """
 
-    def __init__(self, K, input_features, output_features, laplacian, batch_size, regularization=None,  **kwargs):
+    def __init__(self, K, input_features, output_features, laplacian, regularization=None, vertex_major=False,
+                 checkpointing=False, **kwargs):
         super(cheb_conv, self).__init__(**kwargs)
         self.K = K
         self.input_features = input_features
         self.output_features = output_features
         self.laplacian = laplacian
-        self.batch_size = batch_size
         self.regularization = regularization
+        self.vertex_major = vertex_major
+        self.checkpointing = checkpointing
+        if checkpointing:
+            # only the input is kept for the backward pass, which runs the filter again
+            self.checkpointed_filter = tf.recompute_grad(self.filter)
 
     def build(self, input_shape):
         # build layer weights
-        L = sparse.csr_matrix(self.laplacian)
-        L = graph_util.rescale_laplacian(L, lmax=2)
-        L = L.tocoo()
-        indices = np.column_stack((L.row, L.col))
-        L = tf.SparseTensor(indices, L.data, L.shape)
-        L = tf.sparse.reorder(L)
-        self.L = L
-
         if self.regularization is None:
             self.w = self.add_weight(
                 name='w',
@@ -58,73 +55,100 @@ class cheb_conv(layers.Layer):
             )
 
     def call(self, input_tensor):
+        if self.checkpointing:
+            return self.checkpointed_filter(input_tensor)
+        return self.filter(input_tensor)
+
+    def filter(self, input_tensor):
+        if self.vertex_major:
+            return self.call_vertex_major(input_tensor)
+
         # tansform input to chebyshev basis
+        # the batch dimension is dynamic, so that the same layer serves any batch size
+        batch_size = tf.shape(input_tensor)[0]
+        mesh_size = tf.shape(input_tensor)[1]
         x0 = tf.transpose(input_tensor, perm=[1, 2, 0])
-        x0 = tf.reshape(x0, [tf.shape(input_tensor)[1], self.input_features * self.batch_size])
-        x = tf.expand_dims(x0, 0)
-        if self.K > 1:
-            x1 = tf.sparse.sparse_dense_matmul(self.L, x0)
-            x = tf.concat([x, tf.expand_dims(x1, 0)], axis=0)
-
-        for k in range(2, self.K):
-            x2 = 2 * tf.sparse.sparse_dense_matmul(self.L, x1) - x0
-            x = tf.concat([x, tf.expand_dims(x2, 0)], axis=0)
-            x0, x1 = x1, x2
+        x0 = tf.reshape(x0, [mesh_size, self.input_features * batch_size])
+        x = self.laplacian.expand(x0, self.K)
 
-        x = tf.reshape(x, [self.K, tf.shape(input_tensor)[1], self.input_features, self.batch_size])
+        x = tf.reshape(x, [self.K, mesh_size, self.input_features, batch_size])
 
         x = tf.transpose(x, perm=[3, 1, 2, 0])
 
-        x = tf.reshape(x, [self.batch_size * tf.shape(input_tensor)[1], self.input_features * self.K])
+        x = tf.reshape(x, [batch_size * mesh_size, self.input_features * self.K])
         # compute conv
-        x = tf.matmul(x, self.w)
-
-        return tf.reshape(x, [self.batch_size, tf.shape(input_tensor)[1], self.output_features])
+        x = self.apply_weights(x)
+
+        return tf.reshape(x, [batch_size, mesh_size, self.output_features])
+
+    def apply_weights(self, x):
+        """
+        Applies the filter weights to the Chebyshev basis x of shape [B * V, Fin * K].
+        """
+        # the weights are cast explicitly, the checkpointed filter is run again outside of the autocast scope of keras
+        return tf.matmul(x, tf.cast(self.w, x.dtype))
+
+    def apply_basis(self, basis):
+        """
+        Applies the filter weights to a precomputed Chebyshev basis of the input of shape [B, V, Fin * K] and returns
+        the output of shape [B, V, Fout], see data.basis_cache.
+        """
+        if not self.built:
+            # the basis bypasses __call__, which builds the layer on its first input
+            self.build(tf.TensorShape([None, None, self.input_features]))
+            self.built = True
+        batch_size = tf.shape(basis)[0]
+        mesh_size = tf.shape(basis)[1]
+        x = tf.reshape(tf.cast(basis, self.compute_dtype), [batch_size * mesh_size, self.input_features * self.K])
+        x = self.apply_weights(x)
+        return tf.reshape(x, [batch_size, mesh_size, self.output_features])
+
+    def call_vertex_major(self, input_tensor):
+        # [V, B, F] is already a [V, B * F] matrix, so the input needs no transpose
+        mesh_size = tf.shape(input_tensor)[0]
+        batch_size = tf.shape(input_tensor)[1]
+        x0 = tf.reshape(input_tensor, [mesh_size, batch_size * self.input_features])
+        x = self.laplacian.expand(x0, self.K)
+
+        # compute conv, one matmul per polynomial order instead of transposing the basis into the (feature, order)
+        # row order of the weights
+        x = tf.reshape(x, [self.K, mesh_size * batch_size, self.input_features])
+        w = tf.transpose(tf.reshape(tf.cast(self.w, x.dtype), [self.input_features, self.K, self.output_features]), perm=[1, 0, 2])
+        x = tf.reduce_sum(tf.matmul(x, w), axis=0)
+
+        return tf.reshape(x, [mesh_size, batch_size, self.output_features])
 
 
 class sampling(layers.Layer):
     """
     Sampling layer.
 
-    :param sampling_transformation: The pre-computed up- or downsampling transformation that should be applied
+    :param sampling_operator: The up- or downsampling operator that should be applied, see GraphOperators
     :param input_features: The number of input features
-    :param batch_size: The batch size
+    :param vertex_major: Whether the activations are in vertex major layout [V, B, F] instead of [B, V, F]
     :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
     """
-    def __init__(self, sampling_transformation, input_features, batch_size, **kwargs):
+    def __init__(self, sampling_operator, input_features, vertex_major=False, **kwargs):
         super(sampling, self).__init__(**kwargs)
-        self.sampling_transformation = sampling_transformation
+        self.sampling_operator = sampling_operator
         self.input_features = input_features
-        self.batch_size = batch_size
-
-    def build(self, input_shape):
-        self.input_mesh_size = self.sampling_transformation.shape[1]
-        self.output_mesh_size = self.sampling_transformation.shape[0]
-        D = sparse.csr_matrix(self.sampling_transformation)
-        D = D.tocoo()
-        indices = np.column_stack((D.row, D.col))
-        D = tf.SparseTensor(indices, D.data, D.shape)
-        self.D = tf.sparse.reorder(D)
+        self.vertex_major = vertex_major
 
     def call(self, input_tensor):
-        x = tf.transpose(input_tensor, perm=[1, 2, 0])
-        x = tf.reshape(x, [self.input_mesh_size, self.input_features * self.batch_size])
-        x = tf.sparse.sparse_dense_matmul(self.D, x)
-        x = tf.reshape(x, [self.output_mesh_size, self.input_features, self.batch_size])
-        x = tf.transpose(x, perm=[2, 0, 1])
-        return x
+        return self.sampling_operator(input_tensor, vertex_major=self.vertex_major)
 
 
 class encoder_block(layers.Layer):
     """
     Encoder block consisting of a chebychev convolution layer followed by a downsampling layer
 
-    :param laplacian: The laplacian for the chebyshev filter
+    :param laplacian: The LaplacianOperator for the chebyshev filter
     :param K: The polynomial order to be used by the chebyshev filter
     :param input_features: The number of input features
     :param output_features: The number of output features
-    :param downsampling tansformation: The downsampling transformation to be applied
-    :param batch_size: The batch size
+    :param downsampling_operator: The downsampling operator to be applied
+    :param vertex_major: Whether the activations are in vertex major layout [V, B, F] instead of [B, V, F]
+    :param checkpointing: Whether the chebyshev filter recomputes its basis in the backward pass, see cheb_conv
     :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
     """
     def __init__(self,
@@ -132,18 +156,20 @@ class encoder_block(layers.Layer):
                  K,
                  input_features,
                  output_features,
-                 downsampling_transformation,
-                 batch_size, **kwargs):
+                 downsampling_operator,
+                 vertex_major=False,
+                 checkpointing=False, **kwargs):
         super(encoder_block, self).__init__(**kwargs)
         self.cheb_1 = cheb_conv(input_features=input_features,
                                 output_features=output_features,
                                 K=K,
                                 laplacian=laplacian,
-                                batch_size=batch_size)
+                                vertex_major=vertex_major,
+                                checkpointing=checkpointing)
         self.bias_relu_1 = bias_relu()
-        self.downsampling_1 = sampling(sampling_transformation=downsampling_transformation,
+        self.downsampling_1 = sampling(sampling_operator=downsampling_operator,
                                        input_features=output_features,
-                                       batch_size=batch_size)
+                                       vertex_major=vertex_major)
 
     def call(self, input_tensor):
         x = self.cheb_1(input_tensor)
@@ -151,31 +177,46 @@ class encoder_block(layers.Layer):
         x = self.downsampling_1(x)
         return x
 
+    def call_basis(self, basis):
+        """
+        Runs the block on the precomputed Chebyshev basis of its input of shape [B, V, Fin * K], see
+        data.basis_cache. The output is in the layout of the block.
+        """
+        x = self.cheb_1.apply_basis(basis)
+        if self.cheb_1.vertex_major:
+            x = tf.transpose(x, perm=[1, 0, 2])
+        x = self.bias_relu_1(x)
+        x = self.downsampling_1(x)
+        return x
+
 
 class decoder_block(layers.Layer):
     """
     Decoder block consisting of an upsampling layer followed by a chebyshev convolution.
 
-    :param laplacian: The laplacian for the chebyshev filter
+    :param laplacian: The LaplacianOperator for the chebyshev filter
     :param K: The polynomial order to be used by the chebyshev filter
     :param input_features: The number of input features
     :param output_features: The number of output features
-    :param downsampling tansformation: The upsampling transformation to be applied
-    :param batch_size: The batch size
+    :param upsampling_operator: The upsampling operator to be applied
+    :param vertex_major: Whether the activations are in vertex major layout [V, B, F] instead of [B, V, F]
+    :param checkpointing: Whether the chebyshev filter recomputes its basis in the backward pass, see cheb_conv
     :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
     """
-    def __init__(self, laplacian, K, input_features, output_features, upsampling_transformation, batch_size, **kwargs):
+    def __init__(self, laplacian, K, input_features, output_features, upsampling_operator,
+                 vertex_major=False, checkpointing=False, **kwargs):
         super(decoder_block, self).__init__(**kwargs)
-        self.upsampling_1 = sampling(sampling_transformation=upsampling_transformation,
+        self.upsampling_1 = sampling(sampling_operator=upsampling_operator,
                                      input_features=input_features,
-                                     batch_size=batch_size)
+                                     vertex_major=vertex_major)
 
         self.dec_cheb_1 = cheb_conv(
             input_features=input_features,
             output_features=output_features,
             K=K,
             laplacian=laplacian,
-            batch_size=batch_size)
+            vertex_major=vertex_major,
+            checkpointing=checkpointing)
         self.bias_relu_1 = bias_relu()
 
     def call(self, input_tensor):
@@ -188,12 +229,15 @@ class decoder_block(layers.Layer):
 class bias_relu(layers.Layer):
     """
     Custom relu layer that adds a bias.
+
+    The bias broadcasts over the leading two dimensions, so the layer works in both, the [B, V, F] and the vertex major
+    [V, B, F] layout.
     """
     def __init__(self, **kwargs):
         super(bias_relu, self).__init__(**kwargs)
 
     def build(self, input_shape):
-        _, mesh_size, num_features = input_shape
+        num_features = input_shape[-1]
         self.b = self.add_weight(
             name='bias',
             shape=(1, 1, num_features),
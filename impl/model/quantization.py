@@ -0,0 +1,162 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from model.o_layers import cheb_conv, sampling
+
+
+def quantize_weights(w):
+    """
+    Symmetric int8 quantization of the weight matrix w of shape [N, M] with one scale per output channel.
+
+    :return: The int8 weights of shape [N, M] and the float32 scales of shape [M]
+    """
+    w = np.asarray(w, dtype=np.float32)
+    scale = np.max(np.abs(w), axis=0) / 127
+    scale[scale == 0] = 1
+    return np.round(w / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def variable_bytes(model):
+    """
+    Returns the memory held by the variables of the given model in bytes.
+    """
+    return sum(variable.shape.num_elements() * variable.dtype.size for variable in model.variables)
+
+
+class int8_matmul(layers.Layer):
+    """
+    Multiplies the input with a trained weight matrix, quantized to int8 per output channel.
+
+    The input is quantized to int8 with a single scale, calibrated as the maximum absolute input observed while
+    calibrating. The product is accumulated in int32 and scaled back to float32. While calibrating, the float32
+    weights are used.
+
+    :param kernel: The trained float32 weight matrix of shape [N, M]
+    :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
+    """
+
+    def __init__(self, kernel, **kwargs):
+        super(int8_matmul, self).__init__(**kwargs)
+        w, scale = quantize_weights(kernel)
+        self.float_kernel = tf.constant(kernel, dtype=tf.float32)
+        self.w = self.add_weight(name='w', shape=w.shape, dtype=tf.int8, trainable=False,
+                                 initializer=keras.initializers.Constant(w))
+        self.w_scale = self.add_weight(name='w_scale', shape=scale.shape, trainable=False,
+                                       initializer=keras.initializers.Constant(scale))
+        self.input_max = self.add_weight(name='input_max', shape=(), trainable=False,
+                                         initializer=keras.initializers.Zeros())
+        self.calibrating = True
+
+    def finish_calibration(self):
+        self.calibrating = False
+        self.float_kernel = None
+
+    def call(self, input_tensor):
+        if self.calibrating:
+            self.input_max.assign(tf.maximum(self.input_max, tf.reduce_max(tf.abs(input_tensor))))
+            return tf.matmul(input_tensor, self.float_kernel)
+
+        input_scale = tf.maximum(self.input_max, 1e-8) / 127
+        x = tf.clip_by_value(tf.round(input_tensor / input_scale), -127, 127)
+        x = tf.matmul(tf.cast(x, tf.int8), self.w, output_type=tf.int32)
+        return tf.cast(x, tf.float32) * (input_scale * self.w_scale)
+
+
+class quantized_dense(layers.Layer):
+    """
+    int8 version of a trained keras Dense layer, the bias stays in float32.
+
+    :param dense: The trained keras.layers.Dense
+    :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
+    """
+
+    def __init__(self, dense, **kwargs):
+        super(quantized_dense, self).__init__(**kwargs)
+        self.matmul = int8_matmul(dense.kernel.numpy())
+        self.bias = self.add_weight(name='bias', shape=dense.bias.shape, trainable=False,
+                                    initializer=keras.initializers.Constant(dense.bias.numpy()))
+        self.activation = dense.activation
+
+    def call(self, input_tensor):
+        return self.activation(self.matmul(input_tensor) + self.bias)
+
+
+class quantized_cheb_conv(cheb_conv):
+    """
+    int8 version of a trained cheb_conv. The Chebyshev basis is computed in float32 with the sparse operators, only
+    the product with the filter weights is quantized.
+
+    :param conv: The trained cheb_conv
+    :param **kwargs: (optional) additional arguments of :class: `tf.keras.layers.Layer`.
+    """
+
+    def __init__(self, conv, **kwargs):
+        super(quantized_cheb_conv, self).__init__(K=conv.K,
+                                                  input_features=conv.input_features,
+                                                  output_features=conv.output_features,
+                                                  laplacian=conv.laplacian,
+                                                  **kwargs)
+        self.matmul = int8_matmul(conv.w.numpy())
+
+    def build(self, input_shape):
+        # the weights are held by the int8_matmul
+        self.built = True
+
+    def apply_weights(self, x):
+        return self.matmul(x)
+
+
+class quantized_decoder(keras.Model):
+    """
+    int8 version of a trained decoder, quantizing the fc layer and the filter weights of all Chebyshev convolutions.
+    The sampling operators, laplacians and biases are kept in float32. The activations are in [B, V, F] layout,
+    regardless of the layout of the trained decoder.
+
+    The decoder has to be calibrated before use, see calibrate.
+
+    :param decoder: The trained (and built) decoder of a coma_ae
+    :param **kwargs: (optional) additional arguments of :class: `tf.keras.Model`.
+    """
+
+    def __init__(self, decoder, **kwargs):
+        super(quantized_decoder, self).__init__(**kwargs)
+        self.fc = quantized_dense(decoder.fc)
+        self.reshape = keras.layers.Reshape(decoder.reshape.target_shape)
+        self.upsampling = []
+        self.cheb = []
+        self.bias_relu = []
+        for block in decoder.decoder_blocks:
+            self.upsampling.append(sampling(sampling_operator=block.upsampling_1.sampling_operator,
+                                            input_features=block.upsampling_1.input_features))
+            self.cheb.append(quantized_cheb_conv(block.dec_cheb_1))
+            # the float32 biases are shared with the trained decoder
+            self.bias_relu.append(block.bias_relu_1)
+        self.decoder_output = quantized_cheb_conv(decoder.decoder_output)
+
+    def int8_matmuls(self):
+        return [self.fc.matmul, self.decoder_output.matmul] + [conv.matmul for conv in self.cheb]
+
+    def calibrate(self, latents, batch_size=64):
+        """
+        Calibrates the input scales of all quantized layers on the given latent vectors, e.g. the encoded training set.
+
+        :param latents: The latent vectors of shape [N, num_latent]
+        :param batch_size: The batch size used for calibration
+        """
+        for matmul in self.int8_matmuls():
+            matmul.calibrating = True
+        for i in range(0, latents.shape[0], batch_size):
+            self(latents[i:i + batch_size])
+        for matmul in self.int8_matmuls():
+            matmul.finish_calibration()
+
+    def call(self, input_tensor):
+        x = self.fc(input_tensor)
+        x = self.reshape(x)
+        for i in range(len(self.cheb)):
+            x = self.upsampling[i](x)
+            x = self.cheb[i](x)
+            x = self.bias_relu[i](x)
+        return self.decoder_output(x)
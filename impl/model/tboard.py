@@ -1,8 +1,11 @@
+import time
 import tensorflow as tf
 import tensorflow.keras as keras
 from tensorboard.plugins.mesh import summary_v2 as mesh_summary
 import numpy as np
 
+from util.log_util import date_print
+
 
 class MeshCallback(keras.callbacks.Callback):
     """
@@ -49,3 +52,96 @@ class MeshCallback(keras.callbacks.Callback):
             # faces = np.expand_dims(np.vstack((prediction_one.f, tb_mesh_one.v)), 0)
 
             # visualize error....
+
+
+class StepTimer(object):
+    """
+    Times the steps of one training epoch, evaluation or prediction. The rate is measured from the end of the first
+    step to the end of the last one, so that it excludes the tracing of the first step and whatever runs after the last
+    step, such as the validation at the end of an epoch.
+    """
+
+    def __init__(self):
+        self.start = None
+        self.first_step = None
+        self.last_step = None
+        self.steps = 0
+
+    def begin(self):
+        self.start = time.perf_counter()
+        self.first_step = None
+        self.last_step = None
+        self.steps = 0
+
+    def batch_end(self):
+        self.steps += 1
+        self.last_step = time.perf_counter()
+        if self.first_step is None:
+            self.first_step = self.last_step
+
+    def end(self, name, mode):
+        first_step_time = self.first_step - self.start if self.first_step is not None else 0.0
+        steps_per_second = (self.steps - 1) / (self.last_step - self.first_step) if self.steps > 1 else 0.0
+        date_print(name + " (" + mode + "): " + "{:.2f}".format(steps_per_second) + " steps/s over " +
+                   str(self.steps) + " steps, first step " + "{:.3f}".format(first_step_time) + "s")
+        return steps_per_second
+
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """
+    Logs the steps per second of each training epoch, evaluation and prediction. Each of them is timed by its own
+    StepTimer, so that the validation of an epoch does not reset the training steps.
+
+    The first step of each run is timed separately, as it includes tracing and (with XLA) compilation, which the
+    persistent compilation cache saves on later runs.
+
+    :param mode: The name of the execution mode to be logged, such as "xla" or "graph"
+    :param log_dir: (optional) The tensorboard directory the training steps per second are written to
+    """
+
+    def __init__(self, mode, log_dir=None):
+        super(ThroughputCallback, self).__init__()
+        self.mode = mode
+        self.writer = tf.summary.create_file_writer(log_dir + "throughput") if log_dir is not None else None
+        self.train_timer = StepTimer()
+        self.test_timer = StepTimer()
+        self.predict_timer = StepTimer()
+        self.epoch_steps_per_second = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.train_timer.begin()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.train_timer.batch_end()
+
+    def on_epoch_end(self, epoch, logs=None):
+        steps_per_second = self.train_timer.end("Epoch " + str(epoch + 1), self.mode)
+        self.epoch_steps_per_second.append(steps_per_second)
+        if self.writer is not None:
+            with self.writer.as_default():
+                tf.summary.scalar("steps_per_second", steps_per_second, step=epoch)
+
+    def mean_steps_per_second(self):
+        """
+        Returns the mean training steps per second over all epochs but the first, which includes the compilation.
+        """
+        epochs = self.epoch_steps_per_second[1:] or self.epoch_steps_per_second
+        return sum(epochs) / len(epochs) if epochs else 0.0
+
+    def on_test_begin(self, logs=None):
+        self.test_timer.begin()
+
+    def on_test_batch_end(self, batch, logs=None):
+        self.test_timer.batch_end()
+
+    def on_test_end(self, logs=None):
+        self.test_timer.end("Evaluation", self.mode)
+
+    def on_predict_begin(self, logs=None):
+        self.predict_timer.begin()
+
+    def on_predict_batch_end(self, batch, logs=None):
+        self.predict_timer.batch_end()
+
+    def on_predict_end(self, logs=None):
+        self.predict_timer.end("Prediction", self.mode)
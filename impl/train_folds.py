@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import shutil
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from distributed import worker_pinning
+from util.log_util import date_print, hint_print
+
+parser = argparse.ArgumentParser(description="Trains the cross validation folds of train_models.sh concurrently on a "
+                                             "fixed pool of worker processes. The transformation matrices are loaded "
+                                             "once and shared by memory mapping, each worker builds the graph "
+                                             "operators once for all of its folds. Finished folds are skipped, "
+                                             "interrupted folds continue from their last epoch.")
+parser.add_argument("--folds", default=None,
+                    help="Comma separated list of the folds to train as name:data-subdir, e.g. "
+                         "lr8e3_eyebrow_coma:eyebrow (default are the folds of train_models.sh)")
+parser.add_argument("--num-workers", type=int, default=2,
+                    help="The number of worker processes training folds at the same time (default is 2)")
+parser.add_argument("--no-pinning", action="store_true",
+                    help="Do not pin the workers to disjoint cpus (default is False)")
+parser.add_argument("--data-root", default="data", help="The folder holding the data folder of each fold (default "
+                                                        "is data)")
+parser.add_argument("--computed-dir", default="computed",
+                    help="The directory holding the precomputed transformation matrices (default is computed)")
+parser.add_argument("--shared-dir", default=None,
+                    help="The directory the shared transformation matrices are written to (default is a folder in "
+                         "/dev/shm if available, otherwise in <coma-model-dir>)")
+parser.add_argument("--coma-model-dir", default="coma-model",
+                    help="The directory holding checkpoints and tensorboard (default is coma-model)")
+parser.add_argument("--template-mesh", default="data/template.obj",
+                    help="Path to the template mesh (default is data/template.obj)")
+parser.add_argument("--batch-size", type=int, default=16, help="The batch size to be used (default is 16)")
+parser.add_argument("--num-epochs", type=int, default=300, help="The number of training epochs (default is 300)")
+parser.add_argument("--latent-vector-length", type=int, default=8, help="The size of the latent vector (default is 8)")
+parser.add_argument("--validation-frequency", type=int, default=10, help="The validation frequency (default is 10)")
+parser.add_argument("--learning-rate", type=float, default=8e-3, help="The learning rate (default is 8e-3)")
+parser.add_argument("--random-seed", type=int, default=2, help="The random seed (default is 2)")
+parser.add_argument("--dense-threshold", type=int, default=100,
+                    help="Levels with at most this many vertices compute the Chebyshev filters with precomputed dense "
+                         "polynomials (default is 100)")
+parser.add_argument("--vertex-major", action="store_true",
+                    help="Keep the activations in vertex major layout between the blocks (default is False)")
+parser.add_argument("--ensemble", action="store_true",
+                    help="Train all pending folds in this process as replicas of a single model, which shares the "
+                         "graph operators and batches the weight matmuls over the replicas (default is False)")
+
+# the folds trained by train_models.sh
+default_folds = ["lr8e3_bareteeth_coma:bareteeth", "lr8e3_cheeks_in_coma:cheeks_in", "lr8e3_eyebrow_coma:eyebrow",
+                 "lr8e3_high_smile_coma:high_smile", "lr8e3_lips_back_coma:lips_back", "lr8e3_lips_up_coma:lips_up",
+                 "lr8e3_mouth_down_coma:mouth_down", "lr8e3_mouth_extreme_coma:mouth_extreme",
+                 "lr8e3_mouth_middle_coma:mouth_middle", "lr8e3_mouth_open_coma:mouth_open",
+                 "lr8e3_mouth_side_coma:mouth_side", "lr8e3_mouth_up_coma:mouth_up"]
+
+# same configuration as main.py, so that the checkpoints can be used with main.py --mode test
+num_features = [16, 16, 16, 32]
+polynom_orders = [6, 6, 6, 6]
+decay_rate = 0.99
+momentum = 0.9
+regularization = 5e-4
+
+# marks a fold as trained for all epochs, stored next to its checkpoint
+complete_file = "fold-complete.json"
+
+# state of the worker process, set up once by init_worker
+worker = dict()
+
+
+def init_worker(args, shared_dir, cpu_queue):
+    """
+    Sets up a worker process: pins it to its cpus, imports tensorflow and builds the graph operators from the shared
+    transformation matrices once for all folds trained by the worker.
+    """
+    cpus = cpu_queue.get() if cpu_queue is not None else None
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    import tensorflow as tf
+    from model import graph_operators
+
+    if cpus is not None:
+        tf.config.threading.set_intra_op_parallelism_threads(len(cpus))
+    start = time.time()
+    matrices = graph_operators.map_shared_matrices(shared_dir)
+    worker["operators"] = graph_operators.GraphOperators(*matrices, dense_threshold=args.dense_threshold)
+    worker["args"] = args
+    date_print("Worker " + str(os.getpid()) + (" pinned to cpus " + str(cpus) if cpus is not None else "") +
+               " built the graph operators in " + "{:.3f}".format(time.time() - start) + "s")
+
+
+def train_fold(fold):
+    """
+    Trains a single fold in the worker process, continuing an interrupted run from its last epoch.
+
+    :param fold: The name of the run and the data folder of the fold
+    :return: The name of the fold, whether it was trained successfully and the training time in seconds
+    """
+    name, data_dir = fold
+    args = worker["args"]
+    start = time.time()
+    try:
+        _train_fold(name, data_dir, args, worker["operators"])
+    except Exception as exception:
+        hint_print("Fold " + name + " failed: " + repr(exception))
+        return name, False, time.time() - start
+    return name, True, time.time() - start
+
+
+def _train_fold(name, data_dir, args, operators):
+    import tensorflow as tf
+    from tensorflow import keras
+    from data import meshdata
+    from model.model import coma_ae
+    import model.model_util as model_util
+
+    keras.backend.clear_session()
+    np.random.seed(args.random_seed)
+    tf.random.set_seed(args.random_seed)
+
+    checkpoint_dir = args.coma_model_dir + "/checkpoint/" + name
+    backup_dir = args.coma_model_dir + "/backup/" + name
+    tensorboard_dir = args.coma_model_dir + "/tensorboard/" + name + "/"
+
+    mesh_data = meshdata.MeshData(number_val=100, train_file=data_dir + '/train.npy',
+                                  test_file=data_dir + '/test.npy',
+                                  reference_mesh_file=args.template_mesh)
+    num_train = mesh_data.vertices_train.shape[0]
+    decay_steps = num_train / args.batch_size
+
+    coma_model = coma_ae(num_input_features=int(mesh_data.vertices_train.shape[-1]),
+                         num_features=num_features,
+                         operators=operators,
+                         Ks=polynom_orders,
+                         num_latent=args.latent_vector_length,
+                         regularization=regularization,
+                         vertex_major=args.vertex_major)
+    loss = keras.losses.MeanAbsoluteError(reduction=keras.losses.Reduction.SUM_OVER_BATCH_SIZE)
+    coma_model.compile(loss=loss,
+                       optimizer=keras.optimizers.SGD(
+                           learning_rate=model_util.get_learning_rate_decay_schedule(args.learning_rate, decay_rate,
+                                                                                     decay_steps),
+                           momentum=momentum), metrics=[keras.metrics.MeanAbsoluteError()])
+
+    write_parameters(name, data_dir, decay_steps, args)
+
+    # the backup holds the epoch and optimizer state of an interrupted run, it is removed once training finishes
+    callbacks = [keras.callbacks.BackupAndRestore(backup_dir=backup_dir),
+                 keras.callbacks.ModelCheckpoint(filepath=checkpoint_dir + "/coma_model", save_weights_only=True,
+                                                 monitor='loss', save_best_only=False),
+                 keras.callbacks.TensorBoard(log_dir=tensorboard_dir)]
+    # the same tf.data input pipeline as main.py, shuffled over the whole training set with --random-seed
+    history = coma_model.fit(mesh_data.dataset("train", args.batch_size, shuffle_buffer=num_train,
+                                               seed=args.random_seed),
+                             epochs=args.num_epochs,
+                             validation_freq=args.validation_frequency,
+                             validation_data=mesh_data.dataset("val", args.batch_size),
+                             callbacks=callbacks,
+                             verbose=0)
+
+    mark_complete(checkpoint_dir, args, history.history["loss"][-1] if history.history.get("loss") else None)
+
+
+def train_ensemble(folds, args):
+    """
+    Trains the given folds together as replicas of a single coma_ensemble in this process. Each replica trains on a
+    stream of its own data, the weights are split into the checkpoints of the folds after every epoch.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    from data import meshdata
+    from model import graph_operators, ensemble
+    import model.model_util as model_util
+
+    np.random.seed(args.random_seed)
+    tf.random.set_seed(args.random_seed)
+    operators = graph_operators.GraphOperators(*graph_operators.load_transformation_matrices(args.computed_dir),
+                                               dense_threshold=args.dense_threshold)
+
+    x_train = []
+    x_val = []
+    for name, data_dir in folds:
+        mesh_data = meshdata.MeshData(number_val=100, train_file=data_dir + '/train.npy',
+                                      test_file=data_dir + '/test.npy',
+                                      reference_mesh_file=args.template_mesh)
+        x_train.append(mesh_data.vertices_train.astype('float32', copy=False))
+        x_val.append(mesh_data.vertices_val.astype('float32', copy=False))
+    # an epoch covers the largest training set, smaller ones are repeated in a new order
+    steps_per_epoch = max(x.shape[0] for x in x_train) // args.batch_size
+    streams = tuple(tf.data.Dataset.from_tensor_slices(x).shuffle(x.shape[0], seed=args.random_seed + replica)
+                    .repeat().batch(args.batch_size, drop_remainder=True) for replica, x in enumerate(x_train))
+    train_dataset = tf.data.Dataset.zip(streams).map(lambda *x: (tf.stack(x, axis=1), tf.stack(x, axis=1)))
+    num_val = min(x.shape[0] for x in x_val)
+    x_val = np.stack([x[:num_val] for x in x_val], axis=1)
+
+    decay_steps = steps_per_epoch
+    coma_ensemble = ensemble.coma_ensemble(num_replicas=len(folds),
+                                           num_input_features=int(x_train[0].shape[-1]),
+                                           num_features=num_features,
+                                           operators=operators,
+                                           Ks=polynom_orders,
+                                           num_latent=args.latent_vector_length,
+                                           regularization=regularization)
+    coma_ensemble.compile(loss=ensemble.ensemble_loss,
+                          optimizer=keras.optimizers.SGD(
+                              learning_rate=model_util.get_learning_rate_decay_schedule(args.learning_rate,
+                                                                                        decay_rate, decay_steps),
+                              momentum=momentum))
+    # a short name which is the same for the same folds, joining the fold names exceeds the file name limit
+    names = [name for name, _ in folds]
+    ensemble_name = "ensemble-" + hashlib.sha1(",".join(names).encode("utf-8")).hexdigest()[:12]
+    for name, data_dir in folds:
+        write_parameters(name, data_dir, decay_steps, args, ensemble=(ensemble_name, names))
+
+    checkpoint_dirs = [args.coma_model_dir + "/checkpoint/" + name for name, _ in folds]
+    callbacks = [keras.callbacks.BackupAndRestore(backup_dir=args.coma_model_dir + "/backup/" + ensemble_name),
+                 ensemble.SplitCheckpointCallback(checkpoint_dirs),
+                 keras.callbacks.TensorBoard(log_dir=args.coma_model_dir + "/tensorboard/" + ensemble_name + "/")]
+    date_print("Training " + str(len(folds)) + " folds as one ensemble")
+    start = time.time()
+    history = coma_ensemble.fit(train_dataset,
+                                steps_per_epoch=steps_per_epoch,
+                                epochs=args.num_epochs,
+                                validation_freq=args.validation_frequency,
+                                validation_data=(x_val, x_val),
+                                validation_batch_size=args.batch_size,
+                                callbacks=callbacks,
+                                verbose=0)
+    for checkpoint_dir in checkpoint_dirs:
+        mark_complete(checkpoint_dir, args, None)
+    date_print("Trained " + str(len(folds)) + " folds in " + "{:.1f}".format(time.time() - start) + "s, final "
+               "summed loss: " + "{:.4f}".format(history.history["loss"][-1] if history.history.get("loss") else
+                                                 float("nan")))
+
+
+def write_parameters(name, data_dir, decay_steps, args, ensemble=None):
+    """
+    Stores the parameters of a fold like main.py. A fold trained in an ensemble also stores the name of the ensemble,
+    which names its backup and tensorboard directories, and the folds trained with it.
+    """
+    parameter_dir = args.coma_model_dir + "/model-parameters"
+    if not os.path.exists(parameter_dir):
+        os.makedirs(parameter_dir)
+    parameters = {'batch_size': args.batch_size, 'name': name, 'num_epochs': args.num_epochs,
+                  'validation-frequency': args.validation_frequency, 'num_filters': num_features,
+                  'polynom-orders': polynom_orders, 'random-seed': args.random_seed,
+                  'learning-rate': args.learning_rate, 'decay-steps': decay_steps, 'decay-rate': decay_rate,
+                  'momentum': momentum, 'regularization': regularization, 'num-latent': args.latent_vector_length,
+                  'mixed-precision': False, 'num-workers': 1, 'data-folder': data_dir}
+    if ensemble is not None:
+        parameters['ensemble'] = ensemble[0]
+        parameters['ensemble-folds'] = ensemble[1]
+    with open(parameter_dir + "/" + name + "_parameters.json", 'w') as file:
+        json.dump(parameters, file)
+
+
+def mark_complete(checkpoint_dir, args, loss):
+    with open(checkpoint_dir + "/" + complete_file, 'w') as file:
+        json.dump({"num_epochs": args.num_epochs, "loss": loss}, file)
+
+
+def parse_folds(folds, data_root):
+    return [(fold.split(":")[0], data_root + "/" + fold.split(":")[1]) for fold in folds]
+
+
+def is_complete(fold, args):
+    """
+    Whether the given fold has been trained for the requested number of epochs by an earlier sweep.
+    """
+    path = args.coma_model_dir + "/checkpoint/" + fold[0] + "/" + complete_file
+    if not os.path.exists(path):
+        return False
+    with open(path) as file:
+        return json.load(file)["num_epochs"] >= args.num_epochs
+
+
+def main():
+    args = parser.parse_args()
+    folds = parse_folds(args.folds.split(",") if args.folds is not None else default_folds, args.data_root)
+    pending = [fold for fold in folds if not is_complete(fold, args)]
+    for fold in folds:
+        if fold not in pending:
+            date_print("Skipping finished fold " + fold[0])
+    if not pending:
+        date_print("All folds are trained")
+        return
+
+    if args.ensemble:
+        train_ensemble(pending, args)
+        return
+
+    # the workers only need the plain CSR arrays of the pyramid, which they map read only instead of each loading
+    # the pickled matrices
+    from model import graph_operators
+    shared_dir = args.shared_dir
+    if shared_dir is None:
+        shared_root = "/dev/shm" if os.path.isdir("/dev/shm") else args.coma_model_dir
+        shared_dir = shared_root + "/coma-pyramid-" + str(os.getpid())
+    graph_operators.write_shared_matrices(shared_dir, *graph_operators.load_transformation_matrices(
+        args.computed_dir))
+
+    num_workers = min(args.num_workers, len(pending))
+    context = multiprocessing.get_context("spawn")
+    cpu_queue = None
+    if not args.no_pinning:
+        cpu_queue = context.Queue()
+        for _, cpus in worker_pinning(num_workers):
+            cpu_queue.put(cpus)
+
+    date_print("Training " + str(len(pending)) + " folds on " + str(num_workers) + " workers")
+    start = time.time()
+    failed = []
+    try:
+        with context.Pool(num_workers, initializer=init_worker, initargs=(args, shared_dir, cpu_queue)) as pool:
+            for name, success, duration in pool.imap_unordered(train_fold, pending):
+                if success:
+                    date_print("Finished fold " + name + " in " + "{:.1f}".format(duration) + "s")
+                else:
+                    failed.append(name)
+    finally:
+        if args.shared_dir is None:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
+    date_print("Trained " + str(len(pending) - len(failed)) + " folds in " + "{:.1f}".format(time.time() - start) +
+               "s" + (" -- failed: " + ", ".join(failed) if failed else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
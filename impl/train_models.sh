@@ -1,7 +1,11 @@
+#!/bin/bash
+# Additional arguments are passed on to main.py, e.g. --jit
+extra_args=("$@")
+
 train_model() {
 echo ---------- Training model for $1 ----------
 echo Running Coma for $1 on $2 data
-python main.py --coma-model-dir coma-model --name $1 --data-dir data/$2 --mode train
+python main.py --coma-model-dir coma-model --name $1 --data-dir data/$2 --mode train "${extra_args[@]}"
 
 echo ----------------------------------------------
 }
@@ -31,4 +31,37 @@ def rescale_laplacian(L, lmax=2):
     I = scipy.sparse.identity(M, format='csr', dtype=L.dtype)
     L /= lmax / 2
     L -= I
-    return L
\ No newline at end of file
+    return L
+
+
+def selection_indices(M):
+    """
+    Returns the selected column for each row, if the given matrix is a pure row selection (a single 1 per row, each
+    column selected at most once). Returns None otherwise.
+    """
+    M = scipy.sparse.csr_matrix(M, copy=True)
+    M.eliminate_zeros()
+    if np.any(np.diff(M.indptr) != 1) or np.any(M.data != 1) or len(np.unique(M.indices)) != M.shape[0]:
+        return None
+    return M.indices.copy()
+
+
+def fixed_width_taps(M, max_width=3):
+    """
+    Returns the non-zero entries of each row as column indices and weights of shape [rows, width], where width is
+    the largest number of non-zeros in a row. Rows with fewer entries are padded with zero weights.
+    Returns None if any row has more than max_width non-zero entries.
+    """
+    M = scipy.sparse.csr_matrix(M, copy=True)
+    M.eliminate_zeros()
+    counts = np.diff(M.indptr)
+    width = max(int(counts.max(initial=0)), 1)
+    if width > max_width:
+        return None
+    rows = np.repeat(np.arange(M.shape[0]), counts)
+    positions = np.arange(M.nnz) - np.repeat(M.indptr[:-1], counts)
+    indices = np.zeros((M.shape[0], width), dtype=M.indices.dtype)
+    weights = np.zeros((M.shape[0], width), dtype=M.dtype)
+    indices[rows, positions] = M.indices
+    weights[rows, positions] = M.data
+    return indices, weights
@@ -6,13 +6,13 @@ import model.model
 from util import mesh_util
 
 
-def play_with_latent_space(model: model.model.coma_ae, mesh_data, batch_size, mesh=None):
+def play_with_latent_space(model: model.model.coma_ae, mesh_data, mesh=None):
     if mesh is not None:
         # use specified mesh
         print("TODO")
     else:
         # use template mesh
-        x_reference = np.full((batch_size, 5023, 3), mesh_data.reference_mesh.v)
+        x_reference = mesh_data.reference_mesh.v[np.newaxis].astype('float32')
 
     latent_representation = model.encode(x_reference).numpy()
     viewer = MeshViewers(shape=(1, 1), titlebar="Interactive Latent Representation")
@@ -67,14 +67,14 @@ def play_with_latent_space(model: model.model.coma_ae, mesh_data, batch_size, me
         viewer[0][0].set_dynamic_meshes([mesh_data.vec2mesh(decoded[0])])
 
 
-def sample_latent_space(model: model.model.coma_ae, mesh_data, batch_size, mesh=None):
+def sample_latent_space(model: model.model.coma_ae, mesh_data, mesh=None):
     date_print("SAMPLING LATENT SPACE")
     if mesh is not None:
-        mesh = np.full((batch_size, 5023, 3), mesh)
+        mesh = mesh[np.newaxis].astype('float32')
         # use specified mesh
     else:
         # use template mesh
-        mesh = np.full((batch_size, 5023, 3), mesh_data.reference_mesh.v)
+        mesh = mesh_data.reference_mesh.v[np.newaxis].astype('float32')
 
     latent_representation = model.encode(mesh).numpy()[0]
     samples = []
@@ -87,13 +87,9 @@ def sample_latent_space(model: model.model.coma_ae, mesh_data, batch_size, mesh=
         component_samples = np.array(component_samples)
         samples.append(component_samples)
     samples = np.array(samples)
-    decoded = []
-    for lat in samples:
-        element = []
-        for rep in lat:
-            element.append(model.decode(np.full((batch_size, 8), rep)).numpy()[0])
-        decoded.append(np.array(element))
-    decoded = np.array(decoded)
+    # decode all samples at once, the model does not require a fixed batch size
+    decoded = model.decode(samples.reshape((-1, samples.shape[-1]))).numpy()
+    decoded = decoded.reshape(samples.shape[:2] + decoded.shape[1:])
 
     # TODO iterate over size of latent space,
     # then iterate over j and visualize the meshes paged.
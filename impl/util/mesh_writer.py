@@ -0,0 +1,108 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# every binary PLY face is stored as its vertex count followed by the vertex indices
+ply_face_dtype = np.dtype([('count', 'u1'), ('indices', '<i4', (3,))])
+
+
+def ply_header(num_vertices, num_faces):
+    """
+    The header of a binary PLY file with float vertices and triangle faces, as written by psbody.
+    """
+    return ("ply\n"
+            "format binary_little_endian 1.0\n"
+            "element vertex " + str(num_vertices) + "\n"
+            "property float x\n"
+            "property float y\n"
+            "property float z\n"
+            "element face " + str(num_faces) + "\n"
+            "property list uchar int vertex_indices\n"
+            "end_header\n").encode("ascii")
+
+
+def ply_face_block(faces):
+    """
+    Encodes the triangles of shape [F, 3] as binary PLY face element, which is the same for all meshes of a template.
+    """
+    block = np.empty(faces.shape[0], dtype=ply_face_dtype)
+    block['count'] = 3
+    block['indices'] = faces
+    return block.tobytes()
+
+
+def obj_face_block(faces):
+    """
+    Encodes the triangles of shape [F, 3] as OBJ face lines, with the 1-based indices of OBJ.
+    """
+    return ("f %d %d %d\n" * faces.shape[0] % tuple((faces + 1).ravel())).encode("ascii")
+
+
+class MeshEncoder(object):
+    """
+    Serializes meshes sharing the faces of a template as binary PLY or OBJ. The header and the face block are encoded
+    once, only the vertices are encoded per mesh.
+
+    :param faces: The triangles of the template of shape [F, 3]
+    :param num_vertices: The number of vertices of the meshes
+    :param file_format: ply or obj
+    """
+
+    def __init__(self, faces, num_vertices, file_format="ply"):
+        if file_format not in ["ply", "obj"]:
+            raise ValueError("Unknown mesh format " + file_format + ", expected ply or obj")
+        faces = np.asarray(faces, dtype=np.int64)
+        self.file_format = file_format
+        self.num_vertices = num_vertices
+        if file_format == "ply":
+            self.header = ply_header(num_vertices, faces.shape[0])
+            self.face_block = ply_face_block(faces)
+        else:
+            self.header = b""
+            self.face_block = obj_face_block(faces)
+            self.vertex_format = "v %.6f %.6f %.6f\n" * num_vertices
+
+    def encode(self, vertices):
+        """
+        Returns the file content of the mesh with the given vertices of shape [V, 3].
+        """
+        if self.file_format == "ply":
+            vertex_block = np.ascontiguousarray(vertices, dtype='<f4').tobytes()
+        else:
+            vertex_block = (self.vertex_format % tuple(np.asarray(vertices, dtype=np.float64).ravel())).encode("ascii")
+        return self.header + vertex_block + self.face_block
+
+
+def write_meshes(filename, meshes, faces, mean=None, std=None, file_format="ply", num_threads=8):
+    """
+    Writes the given meshes with the faces of the template, de-normalized with mean and std in a single vectorized
+    operation, to filename + '-' + index + '.ply' (or '.obj') with a pool of threads.
+
+    :param filename: The prefix of the files, e.g. results/run-name/prediction
+    :param meshes: The (normalized) vertices of shape [N, V, 3] or flattened [N, V * 3]
+    :param faces: The triangles of the template of shape [F, 3]
+    :param mean: The mean the meshes are de-normalized with (default is None, the meshes are not normalized)
+    :param std: The standard deviation the meshes are de-normalized with
+    :param file_format: ply (binary) or obj (default is ply)
+    :param num_threads: The number of files written in parallel (default is 8)
+    :return: The paths of the written files
+    """
+    meshes = np.asarray(meshes).reshape((len(meshes), -1, 3))
+    if mean is not None:
+        meshes = meshes * std + mean
+    encoder = MeshEncoder(faces, meshes.shape[1], file_format)
+    # at least three digits as before, more for larger exports so that the files sort in order
+    digits = max(3, len(str(len(meshes) - 1)))
+    paths = [filename + '-' + str(i).zfill(digits) + '.' + file_format for i in range(len(meshes))]
+
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    def write(i):
+        with open(paths[i], 'wb') as file:
+            file.write(encoder.encode(meshes[i]))
+
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        list(pool.map(write, range(len(meshes))))
+    return paths
@@ -0,0 +1,154 @@
+import os
+import numpy as np
+
+# the scalar types of PLY and their numpy counterparts, without byte order
+ply_types = {"char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1", "short": "i2", "int16": "i2",
+             "ushort": "u2", "uint16": "u2", "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+             "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"}
+byte_orders = {"binary_little_endian": "<", "binary_big_endian": ">", "ascii": "<"}
+
+
+class PlyHeader(object):
+    """
+    The header of a PLY file: its format, the number of bytes of the header and the elements with their count and
+    properties. Scalar properties are (name, type), list properties are (name, count type, item type).
+    """
+
+    def __init__(self, file):
+        if file.readline().strip() != b"ply":
+            raise ValueError("Not a PLY file: " + str(getattr(file, "name", file)))
+        self.format = None
+        self.elements = []
+        for line in iter(file.readline, b""):
+            words = line.decode("ascii").split()
+            if not words or words[0] in ["comment", "obj_info"]:
+                continue
+            if words[0] == "format":
+                self.format = words[1]
+            elif words[0] == "element":
+                self.elements.append((words[1], int(words[2]), []))
+            elif words[0] == "property":
+                self.elements[-1][2].append((words[4], words[2], words[3]) if words[1] == "list" else
+                                            (words[2], words[1]))
+            elif words[0] == "end_header":
+                break
+        self.size = file.tell()
+        if self.format not in byte_orders:
+            raise ValueError("Unknown PLY format " + str(self.format))
+
+    def element(self, name):
+        for element in self.elements:
+            if element[0] == name:
+                return element
+        raise ValueError("The PLY file has no " + name + " element")
+
+    def dtype(self, name):
+        """
+        The structured dtype of a binary element without list properties
+        """
+        _, _, properties = self.element(name)
+        if any(len(prop) != 2 for prop in properties):
+            raise ValueError("The " + name + " element has list properties")
+        return np.dtype([(prop[0], byte_orders[self.format] + ply_types[prop[1]]) for prop in properties])
+
+
+def read_ply_header(path):
+    """
+    Reads the header of the PLY file at the given path, see PlyHeader
+    """
+    with open(path, 'rb') as file:
+        return PlyHeader(file)
+
+
+def check_vertex_count(num_vertices, expected, path):
+    """
+    Raises a ValueError if the mesh at path does not have the expected number of vertices of the template
+    """
+    if expected is not None and num_vertices != expected:
+        raise ValueError(path + " has " + str(num_vertices) + " vertices, the template has " + str(expected))
+
+
+def check_ply(path, num_vertices=None):
+    """
+    Checks the header of a PLY file without reading its vertices: the file has to start with the vertex element of the
+    expected count, and a binary file has to be large enough to hold all of its vertices. Raises a ValueError otherwise.
+    """
+    with open(path, 'rb') as file:
+        header = PlyHeader(file)
+    if not header.elements or header.elements[0][0] != "vertex":
+        raise ValueError(path + " does not start with the vertex element")
+    count = header.elements[0][1]
+    check_vertex_count(count, num_vertices, path)
+    if header.format != "ascii" and \
+            os.path.getsize(path) < header.size + count * header.dtype("vertex").itemsize:
+        raise ValueError(path + " is truncated")
+    return header
+
+
+def read_ply_vertices(path, num_vertices=None):
+    """
+    Reads only the vertex positions of a PLY file as float32 array of shape [V, 3], the faces are never parsed. Binary
+    vertices are read in a single np.fromfile call, ascii vertices are converted by the C parser of np.loadtxt.
+
+    :param path: The path of the PLY file
+    :param num_vertices: The number of vertices of the template, which is checked against the header before reading
+                         (default is None, not checked)
+    """
+    with open(path, 'rb') as file:
+        header = PlyHeader(file)
+        if header.elements[0][0] != "vertex":
+            raise ValueError(path + " does not start with the vertex element")
+        _, count, properties = header.elements[0]
+        check_vertex_count(count, num_vertices, path)
+        names = [prop[0] for prop in properties]
+
+        if header.format == "ascii":
+            # the C parser of loadtxt stops after the vertex lines
+            columns = [names.index(axis) for axis in "xyz"]
+            return np.loadtxt(file, max_rows=count, usecols=columns, ndmin=2).astype(np.float32)
+
+        vertices = np.fromfile(file, dtype=header.dtype("vertex"), count=count)
+        if vertices.shape[0] != count:
+            raise ValueError(path + " is truncated")
+    return np.stack([vertices[axis] for axis in "xyz"], axis=1).astype(np.float32)
+
+
+def read_ply(path, num_vertices=None):
+    """
+    Reads the vertices of shape [V, 3] and the triangles of shape [F, 3] of a PLY file, e.g. to show a registered
+    mesh. The faces of binary files are read in a single call as well, assuming triangles.
+    """
+    vertices = read_ply_vertices(path, num_vertices)
+    with open(path, 'rb') as file:
+        header = PlyHeader(file)
+        _, num_faces, properties = header.element("face")
+        if header.elements[1][0] != "face" or len(properties) != 1 or len(properties[0]) != 3:
+            raise ValueError(path + " does not have a single face list after the vertices")
+        _, count_type, index_type = properties[0]
+
+        if header.format == "ascii":
+            faces = np.loadtxt(file, dtype=np.int64, skiprows=vertices.shape[0], max_rows=num_faces, ndmin=2)
+            if faces.shape[1] != 4:
+                raise ValueError(path + " has faces which are not triangles")
+            if not np.all(faces[:, 0] == 3):
+                raise ValueError(path + " has faces which are not triangles")
+            return vertices, faces[:, 1:]
+
+        file.seek(header.size + vertices.shape[0] * header.dtype("vertex").itemsize)
+        order = byte_orders[header.format]
+        face_dtype = np.dtype([('count', order + ply_types[count_type]),
+                               ('indices', order + ply_types[index_type], (3,))])
+        faces = np.fromfile(file, dtype=face_dtype, count=num_faces)
+        if faces.shape[0] != num_faces or not np.all(faces['count'] == 3):
+            raise ValueError(path + " has faces which are not triangles")
+    return vertices, faces['indices'].astype(np.int64)
+
+
+def template_vertex_count(path):
+    """
+    The number of vertices of a template mesh, read from the header of a PLY or counted in an OBJ file.
+    """
+    if path.endswith(".ply"):
+        return read_ply_header(path).element("vertex")[1]
+    with open(path, 'rb') as file:
+        return sum(1 for line in file if line.startswith(b"v "))